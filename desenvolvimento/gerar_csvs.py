@@ -1,67 +1,61 @@
-import csv
-import random
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
-
-# Lista de ativos a serem gerados
-ativos = [
-    {"nome": "Tesouro IPCA+", "classe": "Renda Fixa", "subclasse": "Tesouro Direto", "banco": "Banco do Brasil", "valor_inicial": 1000.00},
-    {"nome": "Ações Petrobras", "classe": "Renda Variável", "subclasse": "Ações", "banco": "XP Investimentos", "valor_inicial": 5000.00},
-    {"nome": "Criptomoeda Bitcoin", "classe": "Renda Variável", "subclasse": "Criptomoeda", "banco": "Binance", "valor_inicial": 30000.00},
-    {"nome": "Fundo Imobiliário XPML11", "classe": "Renda Variável", "subclasse": "FII", "banco": "Rico", "valor_inicial": 1500.00},
-    {"nome": "CDB Banco Inter", "classe": "Renda Fixa", "subclasse": "CDB", "banco": "Banco Inter", "valor_inicial": 5000.00},
-    {"nome": "Ações Vale", "classe": "Renda Variável", "subclasse": "Ações", "banco": "Clear", "valor_inicial": 7000.00},
-    {"nome": "Criptomoeda Ethereum", "classe": "Renda Variável", "subclasse": "Criptomoeda", "banco": "Binance", "valor_inicial": 1500.00},
-    {"nome": "Fundo Multimercado XP", "classe": "Renda Variável", "subclasse": "Fundos Multimercado", "banco": "XP Investimentos", "valor_inicial": 4000.00},
-    {"nome": "Tesouro Selic", "classe": "Renda Fixa", "subclasse": "Tesouro Direto", "banco": "Banco do Brasil", "valor_inicial": 2000.00},
-    {"nome": "FII HGLG11", "classe": "Renda Variável", "subclasse": "FII", "banco": "BTG Pactual", "valor_inicial": 2500.00},
-]
-
-# Definição da data de aquisição inicial (janeiro de 2023)
-data_inicio = datetime(2023, 1, 1)
-
-# Gerar ativos.csv
-with open("ativos.csv", mode="w", newline="", encoding="utf-8") as file:
-    writer = csv.writer(file, delimiter=";")
-    writer.writerow(["Nome", "Classe", "Subclasse", "Banco", "Valor Inicial", "Data de Aquisição", "Observações"])
-
-    for ativo in ativos:
-        data_aquisicao = data_inicio + timedelta(days=random.randint(0, 30))  # Distribui a aquisição ao longo do mês
-        writer.writerow([ativo["nome"], ativo["classe"], ativo["subclasse"], ativo["banco"], ativo["valor_inicial"], data_aquisicao.date(), ""])
-
-# Gerar operacoes.csv
-with open("operacoes.csv", mode="w", newline="", encoding="utf-8") as file:
-    writer = csv.writer(file, delimiter=";")
-    writer.writerow(["Ativo", "Tipo", "Data", "Valor"])
-
-    for ativo in ativos:
-        data_atual = data_inicio + relativedelta(months=1) # Começa no mês seguinte à aquisição
-        valor_atual = ativo["valor_inicial"]
-
-        while data_atual <= datetime(2025, 2, 1):
-            # Gera uma operação de atualização mensal
-            if ativo["classe"] == "Renda Fixa":
-                valor_atual *= 1 + random.uniform(0.002, 0.005)  # Crescimento estável de 0.2% a 0.5% ao mês
-            elif ativo["classe"] == "Renda Variável":
-                valor_atual *= 1 + random.uniform(-0.05, 0.07)  # Oscilação entre -5% e +7%
-            if valor_atual < 0:  # Não permite valores negativos
-                valor_atual = 0
-            
-            writer.writerow([ativo["nome"], "atualizacao", data_atual.date(), round(valor_atual, 2)])
-
-            # Adiciona algumas compras e vendas aleatórias
-            if random.random() < 0.3:  # 30% de chance de uma compra no mês
-                compra_valor = random.uniform(0.5, 1.5) * ativo["valor_inicial"]
-                writer.writerow([ativo["nome"], "compra", data_atual.date(), round(compra_valor, 2)])
-                valor_atual += compra_valor
-
-            if random.random() < 0.2:  # 20% de chance de uma venda no mês
-                venda_valor = random.uniform(0.5, 1.2) * ativo["valor_inicial"]
-                if venda_valor < valor_atual:
-                    writer.writerow([ativo["nome"], "venda", data_atual.date(), round(venda_valor, 2)])
-                    valor_atual -= venda_valor
-
-            # Avança para o próximo mês
-            data_atual += relativedelta(months=1)
-
-print("Arquivos ativos.csv e operacoes.csv gerados com sucesso!")
+"""Gera CSVs de ativos e operações sintéticos para importação no SGPI.
+
+Exemplos:
+    python gerar_csvs.py                                   # ativos.csv e operacoes.csv: 10 ativos, 2 anos
+    python gerar_csvs.py --usuarios 20 --ativos 200 --anos 10 --semente 1 --saida carga/
+"""
+import argparse
+import os
+from datetime import date
+
+from investimentos.dados_sinteticos import (
+    CABECALHO_ATIVOS, CABECALHO_OPERACOES, ParametrosGeracao, escrever_csv, gerar_carteira,
+)
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Gera CSVs de ativos e operações sintéticos.")
+    parser.add_argument("--usuarios", type=int, default=1, help="Quantidade de carteiras; com mais de uma, cada uma vai para um subdiretório usuario_N")
+    parser.add_argument("--ativos", type=int, default=10, help="Ativos por carteira")
+    parser.add_argument("--anos", type=int, default=2, help="Anos de operações mensais")
+    parser.add_argument("--inicio", type=date.fromisoformat, help="Mês de aquisição dos ativos (AAAA-MM-DD); por padrão, as operações terminam no mês atual")
+    parser.add_argument("--prob-atualizacao", type=float, default=1.0, help="Probabilidade de uma atualização em cada mês")
+    parser.add_argument("--prob-compra", type=float, default=0.3, help="Probabilidade de uma compra em cada mês")
+    parser.add_argument("--prob-venda", type=float, default=0.2, help="Probabilidade de uma venda em cada mês")
+    parser.add_argument("--semente", type=int, help="Semente dos números aleatórios, para gerar sempre os mesmos arquivos")
+    parser.add_argument("--saida", default=".", help="Diretório dos arquivos gerados")
+    return parser.parse_args()
+
+
+def main():
+    argumentos = ler_argumentos()
+    parametros = ParametrosGeracao(
+        ativos=argumentos.ativos,
+        anos=argumentos.anos,
+        inicio=argumentos.inicio,
+        prob_atualizacao=argumentos.prob_atualizacao,
+        prob_compra=argumentos.prob_compra,
+        prob_venda=argumentos.prob_venda,
+    )
+
+    total_operacoes = 0
+    for usuario in range(1, argumentos.usuarios + 1):
+        diretorio = argumentos.saida if argumentos.usuarios == 1 else os.path.join(argumentos.saida, f"usuario_{usuario}")
+        os.makedirs(diretorio, exist_ok=True)
+
+        # Cada carteira tem sua própria semente, derivada da semente informada
+        semente = None if argumentos.semente is None else f"{argumentos.semente}-{usuario}"
+        ativos, operacoes = gerar_carteira(parametros, semente)
+        total_operacoes += len(operacoes)
+
+        with open(os.path.join(diretorio, "ativos.csv"), mode="w", newline="", encoding="utf-8") as file:
+            escrever_csv(file, CABECALHO_ATIVOS, ativos)
+        with open(os.path.join(diretorio, "operacoes.csv"), mode="w", newline="", encoding="utf-8") as file:
+            escrever_csv(file, CABECALHO_OPERACOES, operacoes)
+
+    print(f"Arquivos gerados em {argumentos.saida}: {argumentos.usuarios} carteira(s), "
+          f"{argumentos.usuarios * argumentos.ativos} ativos e {total_operacoes} operações.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ativo, Operacao, ValorAtivo, RentabilidadeAtivo
+from .models import Ativo, Operacao, ValorAtivo, RentabilidadeAtivo, DadoFinanceiroMensal, Importacao
 
 @admin.register(Ativo)
 class AtivoAdmin(admin.ModelAdmin):
@@ -19,4 +19,15 @@ class ValorAtivoAdmin(admin.ModelAdmin):
 @admin.register(RentabilidadeAtivo)
 class RentabilidadeAtivoAdmin(admin.ModelAdmin):
     list_display = ('ativo', 'data_referencia', 'rentabilidade_abs', 'rentabilidade_perc')
-    search_fields = ('ativo__nome', 'data_referencia')
\ No newline at end of file
+    search_fields = ('ativo__nome', 'data_referencia')
+
+@admin.register(DadoFinanceiroMensal)
+class DadoFinanceiroMensalAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'ativo', 'mes', 'valor', 'rentabilidade')
+    search_fields = ('usuario__username', 'ativo__nome')
+
+@admin.register(Importacao)
+class ImportacaoAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'tipo', 'status', 'linhas_processadas', 'linhas_importadas', 'linhas_com_erro', 'criada_em')
+    search_fields = ('usuario__username',)
+    list_filter = ('tipo', 'status')
\ No newline at end of file
@@ -0,0 +1,207 @@
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from .carteira import indice_mes, rotulo_mes
+from .dados_sinteticos import CABECALHO_ATIVOS, CABECALHO_OPERACOES, ParametrosGeracao, csv_em_memoria, gerar_carteira
+from .importacao import importar_ativos, importar_operacoes
+from .indices import salvar_series, ultimo_mes_fechado
+from .models import Ativo, Operacao
+from .views_resumo_aux import series_dos_indices
+
+# Cache e arquivo de índices próprios, para que o benchmark não altere nem leia os dados da aplicação
+CACHES_BENCHMARK = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "benchmark"}}
+
+
+class Escala:
+    """Tamanho das carteiras de um benchmark: usuários × ativos por usuário × anos de operações."""
+
+    def __init__(self, usuarios, ativos, anos):
+        self.usuarios = usuarios
+        self.ativos = ativos
+        self.anos = anos
+
+    @classmethod
+    def de_texto(cls, texto):
+        """Lê uma escala no formato "USUARIOSxATIVOSxANOS" (ex.: "2x50x5")."""
+        partes = texto.lower().split("x")
+        if len(partes) != 3 or not all(parte.strip().isdigit() and int(parte) > 0 for parte in partes):
+            raise ValueError(f"Escala inválida: '{texto}'. Use USUARIOSxATIVOSxANOS, ex.: 2x50x5.")
+        return cls(*(int(parte) for parte in partes))
+
+    def __str__(self):
+        return f"{self.usuarios}x{self.ativos}x{self.anos}"
+
+
+class Medicao:
+    """Resultado de um cenário em uma escala: tempos de cada repetição (s), consultas ao banco
+    em uma execução e pico de memória alocada (bytes)."""
+
+    def __init__(self, escala, cenario, tempos, consultas, pico_memoria):
+        self.escala = str(escala)
+        self.cenario = cenario
+        self.tempos = tempos
+        self.consultas = consultas
+        self.pico_memoria = pico_memoria
+
+    @property
+    def mediana_ms(self):
+        return statistics.median(self.tempos) * 1000
+
+    def como_dict(self):
+        return {
+            "escala": self.escala,
+            "cenario": self.cenario,
+            "mediana_ms": round(self.mediana_ms, 3),
+            "minimo_ms": round(min(self.tempos) * 1000, 3),
+            "maximo_ms": round(max(self.tempos) * 1000, 3),
+            "consultas": self.consultas,
+            "pico_memoria_mb": round(self.pico_memoria / 2**20, 3),
+        }
+
+
+def medir(executar, repeticoes, preparar=None):
+    """Executa `executar` `repeticoes` vezes, chamando `preparar` antes de cada execução, e retorna
+    (tempos, consultas da última execução, pico de memória). O pico é medido em uma execução à parte,
+    pois o tracemalloc deixa o código mais lento."""
+    tempos = []
+    consultas = 0
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            executar()
+            tempos.append(time.perf_counter() - inicio)
+        consultas = len(capturadas)
+
+    if preparar:
+        preparar()
+    tracemalloc.start()
+    try:
+        executar()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return tempos, consultas, pico
+
+
+def series_sinteticas(inicio, fim, hoje):
+    """Séries mensais de todos os índices do registro cobrindo os meses `inicio` a `fim` (índices),
+    marcadas como atualizadas em `hoje` para que nenhuma busca externa seja agendada."""
+    mensal = {rotulo_mes(indice): 0.5 + (indice % 7) / 10 for indice in range(inicio, fim + 1)}
+    fechado = min(fim, ultimo_mes_fechado(hoje))
+    return {
+        nome: {
+            "mensal": mensal, "inicio": rotulo_mes(inicio), "fim": rotulo_mes(fechado),
+            "verificado_em": hoje.isoformat(), "verificado_inicio": rotulo_mes(inicio), "verificado_fim": rotulo_mes(fim),
+        }
+        for nome in settings.INDICES_FONTES
+    }
+
+
+def importar_carteira(usuario, ativos, operacoes):
+    importar_ativos(usuario, csv_em_memoria(CABECALHO_ATIVOS, ativos))
+    importar_operacoes(usuario, csv_em_memoria(CABECALHO_OPERACOES, operacoes))
+
+
+def requisitar(cliente, url):
+    resposta = cliente.get(url)
+    if resposta.status_code != 200:
+        raise RuntimeError(f"{url} respondeu {resposta.status_code}.")
+    return resposta
+
+
+def benchmark_da_escala(escala, repeticoes, semente, hoje):
+    """Popula o banco com as carteiras da escala, mede cada cenário e remove os dados criados."""
+    parametros = ParametrosGeracao(ativos=escala.ativos, anos=escala.anos, inicio=hoje.replace(day=1) - relativedelta(years=escala.anos))
+    carteiras = [gerar_carteira(parametros, f"{semente}-{usuario}") for usuario in range(escala.usuarios)]
+    usuarios = []
+    for numero, (ativos, operacoes) in enumerate(carteiras):
+        usuario = User.objects.create(username=f"benchmark_{escala}_{numero}")
+        importar_carteira(usuario, ativos, operacoes)
+        usuarios.append(usuario)
+
+    usuario = usuarios[0]
+    cliente = Client()
+    cliente.force_login(usuario)
+    ativo = Ativo.objects.filter(usuario=usuario).order_by("id").first()
+    meses = list(range(indice_mes(parametros.inicio), indice_mes(hoje) + 1))
+    salvar_series(series_sinteticas(meses[0], meses[-1], hoje))
+
+    # Operação no meio do histórico, cuja edição recalcula metade dos meses do ativo
+    operacoes = Operacao.objects.filter(ativo=ativo).order_by("data", "id")
+    operacao = operacoes[operacoes.count() // 2]
+
+    def editar_operacao():
+        operacao.valor += 1
+        operacao.save()
+
+    cenarios = [
+        ("Operacao.save (recálculo)", editar_operacao, None),
+        ("ResumoView", lambda: requisitar(cliente, "/"), cache.clear),
+        ("ResumoView (em cache)", lambda: requisitar(cliente, "/"), None),
+        ("ResumoAtivoView", lambda: requisitar(cliente, f"/ativo/{ativo.id}/"), cache.clear),
+        ("Gráfico de rentabilidade", lambda: requisitar(cliente, "/graficos/carteira/rentabilidade/"), cache.clear),
+        ("Acumulado dos índices", lambda: series_dos_indices(meses, meses[0]), lambda: salvar_series(series_sinteticas(meses[0], meses[-1], hoje))),
+    ]
+
+    # Cada repetição da importação usa um usuário novo, com uma carteira do mesmo tamanho
+    novos = []
+
+    def novo_usuario():
+        novos.append(User.objects.create(username=f"benchmark_{escala}_importacao_{len(novos)}"))
+
+    cenarios.append(("Importação de CSV", lambda: importar_carteira(novos[-1], *carteiras[0]), novo_usuario))
+
+    medicoes = []
+    for cenario, executar, preparar in cenarios:
+        medicoes.append(Medicao(escala, cenario, *medir(executar, repeticoes, preparar)))
+
+    User.objects.filter(pk__in=[usuario.pk for usuario in usuarios + novos]).delete()
+    return medicoes
+
+
+def executar_benchmark(escalas, repeticoes=3, semente=0, hoje=None, progresso=None):
+    """Mede, em cada escala, a importação de CSV, o recálculo de `Operacao.save`, as páginas de resumo,
+    o gráfico de rentabilidade e o acumulado dos índices. Retorna a lista de `Medicao`.
+
+    Grava e remove dados no banco atual: deve ser executado em um banco descartável (ver o comando benchmark).
+    `progresso(escala)` é chamado antes de cada escala."""
+    hoje = hoje or date.today()
+    medicoes = []
+    with tempfile.TemporaryDirectory() as diretorio:
+        with override_settings(CACHES=CACHES_BENCHMARK, INDICES_CACHE_FILE=os.path.join(diretorio, "indices.json")):
+            for escala in escalas:
+                if progresso:
+                    progresso(escala)
+                cache.clear()
+                medicoes += benchmark_da_escala(escala, repeticoes, semente, hoje)
+    return medicoes
+
+
+def comparar_medicoes(medicoes, anteriores, tolerancia):
+    """Compara as medições com as de uma execução anterior (dicts de `Medicao.como_dict`) e retorna
+    as regressões: mediana acima de (1 + tolerancia) vezes a anterior ou mais consultas ao banco."""
+    base = {(anterior["escala"], anterior["cenario"]): anterior for anterior in anteriores}
+    regressoes = []
+    for medicao in medicoes:
+        anterior = base.get((medicao.escala, medicao.cenario))
+        if anterior is None:
+            continue
+        if medicao.mediana_ms > anterior["mediana_ms"] * (1 + tolerancia):
+            regressoes.append(f"{medicao.escala} {medicao.cenario}: {medicao.mediana_ms:.1f} ms (antes {anterior['mediana_ms']:.1f} ms)")
+        if medicao.consultas > anterior["consultas"]:
+            regressoes.append(f"{medicao.escala} {medicao.cenario}: {medicao.consultas} consultas (antes {anterior['consultas']})")
+    return regressoes
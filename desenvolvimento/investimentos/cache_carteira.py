@@ -0,0 +1,48 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .perfilamento import etapa
+
+# Tempo máximo de vida dos dados em cache; a invalidação normal é feita pela troca de versão
+TEMPO_CACHE = 60 * 60 * 24
+
+
+def _chave_versao(usuario_id):
+    return f"carteira:{usuario_id}:versao"
+
+
+def versao_carteira(usuario_id):
+    """Retorna a versão atual da carteira do usuário, criando uma se ainda não existir."""
+    chave = _chave_versao(usuario_id)
+    versao = cache.get(chave)
+    if versao is None:
+        cache.add(chave, uuid4().hex, None)
+        versao = cache.get(chave)
+    return versao
+
+
+def invalidar_carteira(usuario_id):
+    """Troca a versão da carteira do usuário, tornando obsoletos todos os dados em cache dela.
+
+    A troca é feita agora e repetida quando a transação atual for confirmada, para que uma
+    leitura feita durante a transação não deixe em cache dados anteriores à gravação."""
+    def renovar():
+        cache.set(_chave_versao(usuario_id), uuid4().hex, None)
+
+    renovar()
+    transaction.on_commit(renovar)
+
+
+def em_cache(usuario_id, nome, calcular):
+    """Retorna o valor `nome` da carteira do usuário a partir do cache, chamando `calcular()`
+    e guardando o resultado quando ele não existir para a versão atual da carteira."""
+    chave = f"carteira:{usuario_id}:{versao_carteira(usuario_id)}:{nome}"
+    with etapa("cache"):
+        valor = cache.get(chave)
+    if valor is None:
+        valor = calcular()
+        with etapa("cache"):
+            cache.set(chave, valor, TEMPO_CACHE)
+    return valor
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+
+def agrupar_operacoes_por_mes(operacoes, atualizacoes_mensais=None):
+    """Organiza as atualizações, compras e vendas por mês.
+    `operacoes` é um iterável de tuplas (tipo, valor, data) ordenado por data."""
+    atualizacoes_mensais = dict(atualizacoes_mensais or {})
+    compras_vendas_mensais = defaultdict(float)
+
+    for tipo, valor, data in operacoes:
+        mes_operacao = data.replace(day=1)
+
+        if tipo == "atualizacao":
+            atualizacoes_mensais[mes_operacao] = float(valor)  # Atualizações substituem o valor do mês
+        elif tipo == "compra":
+            compras_vendas_mensais[mes_operacao] += float(valor)
+        elif tipo == "venda":
+            compras_vendas_mensais[mes_operacao] -= float(valor)
+
+    return atualizacoes_mensais, compras_vendas_mensais
+
+
+def calcular_meses(atualizacoes_mensais, compras_vendas_mensais, anterior=None):
+    """Calcula valor e rentabilidade de cada mês a partir das atualizações e compras/vendas mensais.
+    `anterior` é a tupla (mes, valor) do último mês já calculado antes desses meses, cuja
+    rentabilidade depende da atualização do mês seguinte e por isso também é recalculada."""
+    meses_ordenados = sorted(set(atualizacoes_mensais) | set(compras_vendas_mensais))
+
+    dados = []
+    if anterior is not None:
+        mes_anterior, valor_anterior = anterior
+        if meses_ordenados:
+            rentabilidade = atualizacoes_mensais.get(meses_ordenados[0], 0) - valor_anterior
+        else:
+            rentabilidade = 0.0  # Passou a ser o último mês
+        dados.append((mes_anterior, valor_anterior, rentabilidade))
+
+    for i, mes in enumerate(meses_ordenados):
+        # Valor do mês considerando atualização + compras e vendas
+        valor = atualizacoes_mensais.get(mes, 0) + compras_vendas_mensais.get(mes, 0)
+
+        # Rentabilidade: valor do mês seguinte antes da atualização - valor do mês atual atualizado
+        if i < len(meses_ordenados) - 1:
+            rentabilidade = atualizacoes_mensais.get(meses_ordenados[i + 1], 0) - valor
+        else:
+            rentabilidade = 0.0  # Último mês recebe rentabilidade 0
+
+        dados.append((mes, valor, rentabilidade))
+
+    return dados
+
+
+def calcular_dados_mensais(data_aquisicao, valor_inicial, operacoes):
+    """Calcula o valor e a rentabilidade mensal de um ativo a partir das suas operações.
+
+    `operacoes` é um iterável de tuplas (tipo, valor, data) ordenado por data.
+    Retorna uma lista ordenada de tuplas (mes, valor, rentabilidade), onde `mes` é o primeiro dia do mês."""
+
+    # O primeiro mês recebe o valor inicial como atualização
+    primeiro_mes = data_aquisicao.replace(day=1)
+    atualizacoes_mensais, compras_vendas_mensais = agrupar_operacoes_por_mes(
+        operacoes, {primeiro_mes: float(valor_inicial)}
+    )
+    return calcular_meses(atualizacoes_mensais, compras_vendas_mensais)
+
+
+def calcular_dados_mensais_a_partir_de(anterior, operacoes):
+    """Recalcula os dados mensais apenas a partir de um mês, sem reprocessar o histórico anterior.
+
+    `anterior` é a tupla (mes, valor) já gravada para o último mês antes do recálculo e
+    `operacoes` contém somente as operações do mês inicial em diante.
+    Retorna as tuplas (mes, valor, rentabilidade) do mês anterior em diante."""
+    atualizacoes_mensais, compras_vendas_mensais = agrupar_operacoes_por_mes(operacoes)
+    return calcular_meses(atualizacoes_mensais, compras_vendas_mensais, anterior)
+
+
+def calcular_lote(ativos):
+    """Calcula os dados mensais de um lote de ativos, dados como tuplas
+    (ativo_id, usuario_id, data_aquisicao, valor_inicial, operacoes), com as operações (tipo, valor, data)
+    em ordem de data. Retorna tuplas (ativo_id, usuario_id, dados mensais).
+
+    Não acessa o banco de dados, para que possa ser executada em outros processos."""
+    return [
+        (ativo_id, usuario_id, calcular_dados_mensais(data_aquisicao, valor_inicial, operacoes))
+        for ativo_id, usuario_id, data_aquisicao, valor_inicial, operacoes in ativos
+    ]
@@ -0,0 +1,146 @@
+from datetime import date
+
+import numpy as np
+
+
+def indice_mes(mes):
+    """Converte uma data para um índice inteiro de mês (meses desde o ano zero)."""
+    return mes.year * 12 + mes.month - 1
+
+
+def mes_do_indice(indice):
+    """Converte um índice de mês de volta para o primeiro dia do mês."""
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def rotulo_mes(indice):
+    """Rótulo "AAAA-MM" de um índice de mês, usado nos gráficos e tabelas."""
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+def _dividir(numerador, denominador):
+    """Divisão elemento a elemento que resulta em 0 onde o denominador é 0."""
+    return np.divide(numerador, denominador, out=np.zeros_like(numerador), where=denominador != 0)
+
+
+class Carteira:
+    """Valores e rentabilidades mensais de um conjunto de ativos, guardados em matrizes ativos × meses.
+
+    As colunas são os meses com dados de ao menos um ativo, em ordem (`meses` guarda o índice
+    inteiro de cada mês) e `presente` indica quais células têm um mês gravado para o ativo.
+    Células ausentes valem 0, de modo que somas por mês e por ativo não precisam de máscara."""
+
+    def __init__(self, ativo_ids, meses, valores, rentabilidades, presente):
+        self.ativo_ids = list(ativo_ids)
+        self.meses = meses
+        self.valores = valores
+        self.rentabilidades = rentabilidades
+        self.presente = presente
+        self._linhas = {ativo_id: linha for linha, ativo_id in enumerate(self.ativo_ids)}
+
+    @classmethod
+    def de_linhas(cls, linhas):
+        """Monta a carteira a partir de tuplas (ativo_id, mes, valor, rentabilidade) em qualquer ordem."""
+        linhas = list(linhas)
+        if not linhas:
+            return cls([], np.zeros(0, dtype=int), np.zeros((0, 0)), np.zeros((0, 0)), np.zeros((0, 0), dtype=bool))
+
+        ids, meses, valores, rentabilidades = zip(*linhas)
+        ativo_ids, linha = np.unique(np.array(ids), return_inverse=True)
+        indices_meses, coluna = np.unique(np.fromiter((indice_mes(mes) for mes in meses), dtype=int, count=len(meses)), return_inverse=True)
+
+        forma = (len(ativo_ids), len(indices_meses))
+        matriz_valores = np.zeros(forma)
+        matriz_rentabilidades = np.zeros(forma)
+        presente = np.zeros(forma, dtype=bool)
+        matriz_valores[linha, coluna] = valores
+        matriz_rentabilidades[linha, coluna] = rentabilidades
+        presente[linha, coluna] = True
+        return cls(ativo_ids.tolist(), indices_meses, matriz_valores, matriz_rentabilidades, presente)
+
+    def __contains__(self, ativo_id):
+        return ativo_id in self._linhas
+
+    def __len__(self):
+        return len(self.ativo_ids)
+
+    def selecionar(self, ativo_ids):
+        """Retorna uma carteira apenas com os ativos informados (ignorando os que não têm dados),
+        sem os meses que ficaram vazios."""
+        ids = [ativo_id for ativo_id in ativo_ids if ativo_id in self._linhas]
+        linhas = [self._linhas[ativo_id] for ativo_id in ids]
+        colunas = self.presente[linhas].any(axis=0)
+        return Carteira(
+            ids,
+            self.meses[colunas],
+            self.valores[linhas][:, colunas],
+            self.rentabilidades[linhas][:, colunas],
+            self.presente[linhas][:, colunas],
+        )
+
+    def metricas_por_ativo(self):
+        """Valor atualizado e rentabilidades (1 mês, 1 ano e total) de cada ativo.
+
+        As janelas contam os meses gravados do próprio ativo: a de 1 mês usa o penúltimo mês
+        (o último ainda não tem rentabilidade) e a de 1 ano os últimos 13 meses, e só são
+        calculadas para ativos com histórico suficiente. Retorna ativo_id -> {campo: valor}."""
+        perc = _dividir(self.rentabilidades, self.valores)
+        quantidade = self.presente.sum(axis=1)
+        # Posição de cada mês contada a partir do fim do histórico do ativo (1 = último mês)
+        posicao = np.cumsum(self.presente[:, ::-1], axis=1)[:, ::-1] * self.presente
+
+        penultimo = posicao == 2
+        ano = self.presente & (posicao <= 13)
+        tem_ano = quantidade > 12
+
+        metricas = {
+            "valor_atualizado": (self.valores * (posicao == 1)).sum(axis=1),
+            "rentabilidade_1m_abs": (self.rentabilidades * penultimo).sum(axis=1),
+            "rentabilidade_1m_perc": (perc * penultimo).sum(axis=1) * 100,
+            "rentabilidade_1a_abs": np.where(tem_ano, (self.rentabilidades * ano).sum(axis=1), 0.0),
+            "rentabilidade_1a_perc": np.where(tem_ano, (np.where(ano, 1 + perc, 1).prod(axis=1) - 1) * 100, 0.0),
+            "rentabilidade_total_abs": self.rentabilidades.sum(axis=1),
+            "rentabilidade_total_perc": (np.where(self.presente, 1 + perc, 1).prod(axis=1) - 1) * 100,
+        }
+        colunas = {campo: valores.tolist() for campo, valores in metricas.items()}
+        return {
+            ativo_id: {campo: valores[linha] for campo, valores in colunas.items()}
+            for linha, ativo_id in enumerate(self.ativo_ids)
+        }
+
+    def evolucao(self):
+        """Totais mensais da carteira: valor, rentabilidade absoluta e percentual de cada mês."""
+        valores = self.valores.sum(axis=0)
+        rentabilidades = self.rentabilidades.sum(axis=0)
+        return valores, rentabilidades, _dividir(rentabilidades, valores) * 100
+
+    def rentabilidades_da_carteira(self):
+        """Rentabilidades absolutas e percentuais da carteira em 1 mês, 1 ano e no total.
+        As janelas percentuais compõem os últimos 2 e 13 meses da carteira."""
+        _, rentabilidades, perc = self.evolucao()
+        fatores = 1 + perc / 100
+        quantidade = len(self.meses)
+        return {
+            "rentabilidade_abs_1m": float(rentabilidades[-2]) if quantidade > 1 else 0,
+            "rentabilidade_abs_1a": float(rentabilidades[-13:].sum()) if quantidade > 12 else 0,
+            "rentabilidade_abs_total": float(rentabilidades.sum()),
+            "rentabilidade_perc_1m": float((fatores[-2:].prod() - 1) * 100) if quantidade > 1 else 0,
+            "rentabilidade_perc_1a": float((fatores[-13:].prod() - 1) * 100) if quantidade > 12 else 0,
+            "rentabilidade_perc_total": float((fatores.prod() - 1) * 100) if quantidade else 0,
+        }
+
+    def curva_acumulada(self):
+        """Rentabilidade percentual acumulada da carteira ao fim de cada mês."""
+        _, _, perc = self.evolucao()
+        return (np.cumprod(1 + perc / 100) - 1) * 100
+
+    def historico_ativo(self, ativo_id):
+        """Meses, valores, rentabilidades absolutas e percentuais e rentabilidade acumulada de um ativo,
+        apenas nos meses gravados para ele."""
+        linha = self._linhas[ativo_id]
+        colunas = self.presente[linha]
+        valores = self.valores[linha, colunas]
+        rentabilidades = self.rentabilidades[linha, colunas]
+        perc = _dividir(rentabilidades, valores) * 100
+        acumulada = (np.cumprod(1 + perc / 100) - 1) * 100
+        return self.meses[colunas], valores, rentabilidades, perc, acumulada
@@ -0,0 +1,129 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from .models import Ativo, DadoFinanceiroMensal
+from .reconstrucao import TAMANHO_LOTE_RECONSTRUCAO, calcular_em_lotes
+
+# Diferença absoluta tolerada: R$ nos valores e rentabilidades, pontos percentuais na rentabilidade percentual
+TOLERANCIA = 0.01
+
+COLUNAS_ESPERADO = ["usuario_id", "ativo_id", "mes", "valor_esperado", "rentabilidade_esperada"]
+COLUNAS_GRAVADO = ["usuario_id", "ativo_id", "mes", "valor_gravado", "rentabilidade_gravada"]
+COLUNAS_ATIVO = COLUNAS_ESPERADO + COLUNAS_GRAVADO[3:] + ["situacao"]
+COLUNAS_CARTEIRA = [
+    "usuario_id", "mes", "valor_esperado", "valor_gravado", "rentabilidade_esperada", "rentabilidade_gravada",
+    "percentual_esperado", "percentual_gravado",
+]
+
+
+class RelatorioConsistencia:
+    """Resultado de uma verificação dos dados mensais gravados contra um recálculo a partir das operações.
+
+    `ativos_divergentes` tem uma linha por ativo e mês com problema, com a `situacao` "faltando" (mês
+    esperado e não gravado), "sobrando" (gravado e não esperado) ou "divergente" (valor ou rentabilidade
+    diferentes). `carteiras_divergentes` tem uma linha por usuário e mês em que os totais da carteira
+    (valor, rentabilidade absoluta e percentual) diferem dos esperados."""
+
+    def __init__(self):
+        self.usuarios = set()
+        self.ativos = 0
+        self.meses = 0
+        self.ativos_divergentes = pd.DataFrame(columns=COLUNAS_ATIVO)
+        self.carteiras_divergentes = pd.DataFrame(columns=COLUNAS_CARTEIRA)
+        self.duracao = 0.0
+
+    @property
+    def consistente(self):
+        return self.ativos_divergentes.empty and self.carteiras_divergentes.empty
+
+    def usuarios_divergentes(self):
+        ids = set(self.ativos_divergentes["usuario_id"]) | set(self.carteiras_divergentes["usuario_id"])
+        return sorted(int(usuario_id) for usuario_id in ids)
+
+
+def comparar_lote(calculados, tolerancia=TOLERANCIA):
+    """Compara os dados mensais recalculados de um lote (ver `calcular_lote`) com os gravados.
+    Retorna (linhas divergentes, totais esperados e gravados por usuário e mês)."""
+    esperado = pd.DataFrame.from_records(
+        ((usuario_id, ativo_id, mes, valor, rentabilidade) for ativo_id, usuario_id, dados in calculados for mes, valor, rentabilidade in dados),
+        columns=COLUNAS_ESPERADO,
+    )
+    gravado = pd.DataFrame.from_records(
+        DadoFinanceiroMensal.objects.filter(ativo_id__in=[ativo_id for ativo_id, _, _ in calculados])
+        .values_list("usuario_id", "ativo_id", "mes", "valor", "rentabilidade"),
+        columns=COLUNAS_GRAVADO,
+    )
+
+    # Um mês gravado para o usuário errado aparece como "faltando" no usuário certo e "sobrando" no outro
+    comparacao = esperado.merge(gravado, on=["usuario_id", "ativo_id", "mes"], how="outer", indicator=True)
+    diferente = (
+        ((comparacao["valor_esperado"] - comparacao["valor_gravado"]).abs() > tolerancia)
+        | ((comparacao["rentabilidade_esperada"] - comparacao["rentabilidade_gravada"]).abs() > tolerancia)
+    )
+    comparacao["situacao"] = np.select(
+        [comparacao["_merge"] == "left_only", comparacao["_merge"] == "right_only", diferente],
+        ["faltando", "sobrando", "divergente"],
+        default="",
+    )
+    divergentes = comparacao.loc[comparacao["situacao"] != "", COLUNAS_ATIVO]
+
+    totais = pd.concat([
+        esperado.groupby(["usuario_id", "mes"])[["valor_esperado", "rentabilidade_esperada"]].sum(),
+        gravado.groupby(["usuario_id", "mes"])[["valor_gravado", "rentabilidade_gravada"]].sum(),
+    ], axis=1)
+    return divergentes, totais
+
+
+def comparar_carteiras(totais, tolerancia=TOLERANCIA):
+    """Verifica, por usuário e mês, que o valor e a rentabilidade absoluta da carteira (soma dos ativos)
+    e a rentabilidade percentual (absoluta / valor) gravados são iguais aos esperados."""
+    totais = totais.fillna(0.0)
+    for valor, rentabilidade, percentual in [
+        ("valor_esperado", "rentabilidade_esperada", "percentual_esperado"),
+        ("valor_gravado", "rentabilidade_gravada", "percentual_gravado"),
+    ]:
+        valores = totais[valor].to_numpy()
+        totais[percentual] = np.divide(totais[rentabilidade].to_numpy(), valores, out=np.zeros_like(valores), where=valores != 0) * 100
+
+    diferente = (
+        ((totais["valor_esperado"] - totais["valor_gravado"]).abs() > tolerancia)
+        | ((totais["rentabilidade_esperada"] - totais["rentabilidade_gravada"]).abs() > tolerancia)
+        | ((totais["percentual_esperado"] - totais["percentual_gravado"]).abs() > tolerancia)
+    )
+    return totais[diferente].reset_index()[COLUNAS_CARTEIRA]
+
+
+def verificar_dados(usuarios=None, processos=None, tamanho_lote=TAMANHO_LOTE_RECONSTRUCAO, tolerancia=TOLERANCIA, progresso=None):
+    """Recalcula os dados mensais de todos os ativos dos `usuarios` (ou de todos os usuários) a partir das
+    operações e os compara com os gravados, sem alterar nada. Os ativos são verificados em lotes, com o
+    cálculo distribuído entre `processos` processos como em `reconstruir_dados`.
+
+    `progresso(relatorio)` é chamado após cada lote. Retorna um `RelatorioConsistencia`."""
+    relatorio = RelatorioConsistencia()
+    inicio = time.perf_counter()
+
+    ativos = Ativo.objects.all() if usuarios is None else Ativo.objects.filter(usuario__in=usuarios)
+    ativo_ids = list(ativos.order_by("id").values_list("id", flat=True))
+
+    divergentes, totais = [], []
+    for calculados in calcular_em_lotes(ativo_ids, processos, tamanho_lote):
+        divergentes_lote, totais_lote = comparar_lote(calculados, tolerancia)
+        if not divergentes_lote.empty:
+            divergentes.append(divergentes_lote)
+        totais.append(totais_lote)
+        relatorio.usuarios.update(usuario_id for _, usuario_id, _ in calculados)
+        relatorio.ativos += len(calculados)
+        relatorio.meses += sum(len(dados) for _, _, dados in calculados)
+        relatorio.duracao = time.perf_counter() - inicio
+        if progresso:
+            progresso(relatorio)
+
+    if divergentes:
+        relatorio.ativos_divergentes = pd.concat(divergentes, ignore_index=True).sort_values(["usuario_id", "ativo_id", "mes"])
+    if totais:
+        # Os ativos de um usuário podem estar em lotes diferentes: os totais parciais são somados por usuário e mês
+        relatorio.carteiras_divergentes = comparar_carteiras(pd.concat(totais).groupby(level=["usuario_id", "mes"]).sum(), tolerancia)
+    relatorio.duracao = time.perf_counter() - inicio
+    return relatorio
@@ -0,0 +1,95 @@
+import csv
+import io
+import random
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+# Modelos dos ativos gerados; a partir da segunda volta pela lista os nomes recebem um número
+MODELOS_ATIVOS = [
+    {"nome": "Tesouro IPCA+", "classe": "Renda Fixa", "subclasse": "Tesouro Direto", "banco": "Banco do Brasil", "valor_inicial": 1000.00},
+    {"nome": "Ações Petrobras", "classe": "Renda Variável", "subclasse": "Ações", "banco": "XP Investimentos", "valor_inicial": 5000.00},
+    {"nome": "Criptomoeda Bitcoin", "classe": "Renda Variável", "subclasse": "Criptomoeda", "banco": "Binance", "valor_inicial": 30000.00},
+    {"nome": "Fundo Imobiliário XPML11", "classe": "Renda Variável", "subclasse": "FII", "banco": "Rico", "valor_inicial": 1500.00},
+    {"nome": "CDB Banco Inter", "classe": "Renda Fixa", "subclasse": "CDB", "banco": "Banco Inter", "valor_inicial": 5000.00},
+    {"nome": "Ações Vale", "classe": "Renda Variável", "subclasse": "Ações", "banco": "Clear", "valor_inicial": 7000.00},
+    {"nome": "Criptomoeda Ethereum", "classe": "Renda Variável", "subclasse": "Criptomoeda", "banco": "Binance", "valor_inicial": 1500.00},
+    {"nome": "Fundo Multimercado XP", "classe": "Renda Variável", "subclasse": "Fundos Multimercado", "banco": "XP Investimentos", "valor_inicial": 4000.00},
+    {"nome": "Tesouro Selic", "classe": "Renda Fixa", "subclasse": "Tesouro Direto", "banco": "Banco do Brasil", "valor_inicial": 2000.00},
+    {"nome": "FII HGLG11", "classe": "Renda Variável", "subclasse": "FII", "banco": "BTG Pactual", "valor_inicial": 2500.00},
+]
+
+# Variação mensal (mínima, máxima) das atualizações de cada classe
+VARIACAO_MENSAL = {
+    "Renda Fixa": (0.002, 0.005),  # Crescimento estável de 0.2% a 0.5% ao mês
+    "Renda Variável": (-0.05, 0.07),  # Oscilação entre -5% e +7%
+}
+
+CABECALHO_ATIVOS = ["Nome", "Classe", "Subclasse", "Banco", "Valor Inicial", "Data de Aquisição", "Observações"]
+CABECALHO_OPERACOES = ["Ativo", "Tipo", "Data", "Valor"]
+
+
+class ParametrosGeracao:
+    """Tamanho e composição de uma carteira sintética: quantidade de ativos, anos de operações a partir
+    de `inicio` e probabilidade de atualização, compra e venda de cada ativo em cada mês."""
+
+    def __init__(self, ativos=10, anos=2, inicio=None, prob_atualizacao=1.0, prob_compra=0.3, prob_venda=0.2):
+        self.ativos = ativos
+        self.anos = anos
+        # Por padrão as operações terminam no mês atual
+        self.inicio = inicio or (date.today().replace(day=1) - relativedelta(years=anos))
+        self.prob_atualizacao = prob_atualizacao
+        self.prob_compra = prob_compra
+        self.prob_venda = prob_venda
+
+
+def gerar_carteira(parametros, semente=None):
+    """Gera uma carteira sintética e retorna (ativos, operacoes), listas de linhas no formato dos
+    CSVs de importação (ver CABECALHO_ATIVOS e CABECALHO_OPERACOES). A mesma semente gera sempre
+    a mesma carteira."""
+    aleatorio = random.Random(semente)
+    ativos, operacoes = [], []
+
+    for i in range(parametros.ativos):
+        modelo = MODELOS_ATIVOS[i % len(MODELOS_ATIVOS)]
+        volta = i // len(MODELOS_ATIVOS)
+        nome = modelo["nome"] if volta == 0 else f"{modelo['nome']} {volta + 1}"
+        data_aquisicao = parametros.inicio + timedelta(days=aleatorio.randint(0, 27))  # Distribui a aquisição ao longo do mês
+        ativos.append([nome, modelo["classe"], modelo["subclasse"], modelo["banco"], modelo["valor_inicial"], data_aquisicao, ""])
+
+        valor_atual = modelo["valor_inicial"]
+        variacao_minima, variacao_maxima = VARIACAO_MENSAL[modelo["classe"]]
+        # Uma data por mês, começando no mês seguinte à aquisição
+        for meses in range(1, parametros.anos * 12 + 1):
+            data_atual = parametros.inicio + relativedelta(months=meses)
+
+            if aleatorio.random() < parametros.prob_atualizacao:
+                valor_atual = max(valor_atual * (1 + aleatorio.uniform(variacao_minima, variacao_maxima)), 0)
+                operacoes.append([nome, "atualizacao", data_atual, round(valor_atual, 2)])
+
+            if aleatorio.random() < parametros.prob_compra:
+                compra_valor = aleatorio.uniform(0.5, 1.5) * modelo["valor_inicial"]
+                operacoes.append([nome, "compra", data_atual, round(compra_valor, 2)])
+                valor_atual += compra_valor
+
+            if aleatorio.random() < parametros.prob_venda:
+                venda_valor = aleatorio.uniform(0.5, 1.2) * modelo["valor_inicial"]
+                if venda_valor < valor_atual:
+                    operacoes.append([nome, "venda", data_atual, round(venda_valor, 2)])
+                    valor_atual -= venda_valor
+
+    return ativos, operacoes
+
+
+def escrever_csv(arquivo, cabecalho, linhas):
+    """Escreve as linhas em `arquivo` (aberto em modo texto) no formato dos CSVs de importação."""
+    writer = csv.writer(arquivo, delimiter=";")
+    writer.writerow(cabecalho)
+    writer.writerows(linhas)
+
+
+def csv_em_memoria(cabecalho, linhas):
+    """Retorna um arquivo binário em memória com o CSV, pronto para as funções de importação."""
+    texto = io.StringIO(newline="")
+    escrever_csv(texto, cabecalho, linhas)
+    return io.BytesIO(texto.getvalue().encode("utf-8"))
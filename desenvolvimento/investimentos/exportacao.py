@@ -0,0 +1,79 @@
+import csv
+
+from .carteira import Carteira
+from .models import DadoFinanceiroMensal, em_lotes
+
+# Quantidade de ativos (e de linhas de dados mensais) lidos do banco por vez durante a exportação
+TAMANHO_LOTE_EXPORTACAO = 500
+
+ROTULOS_FILTROS = {"nome": "Nome", "classe": "Classe", "subclasse": "Subclasse", "banco": "Banco"}
+
+CABECALHO_ATIVOS = [
+    "Nome", "Classe", "Subclasse", "Banco", "Valor Atual",
+    "Rentabilidade 1M (R$)", "Rentabilidade 1M (%)", "Rentabilidade 1A (R$)", "Rentabilidade 1A (%)",
+    "Rentabilidade Total (R$)", "Rentabilidade Total (%)", "Observações",
+]
+
+CABECALHO_HISTORICO = ["Ativo", "Mês", "Valor", "Rentabilidade (R$)", "Rentabilidade (%)"]
+
+
+class _Eco:
+    """Arquivo falso cujo `write` devolve o texto recebido, para que o csv.writer gere as linhas sem acumulá-las."""
+
+    def write(self, texto):
+        return texto
+
+
+def _formatar(valor):
+    return f"{valor:.2f}"
+
+
+def exportar_carteira(usuario, ativos, filtros):
+    """Gera, linha a linha, o CSV da carteira: os filtros aplicados, os ativos de `ativos` (queryset já
+    filtrado) com valor atual e rentabilidades, e o histórico mensal de cada um.
+
+    Nada é lido do banco antes da primeira linha; ativos e dados mensais são lidos em lotes de
+    TAMANHO_LOTE_EXPORTACAO e as métricas de cada lote são calculadas apenas com os dados mensais
+    dos seus ativos, de modo que a memória usada não cresce com a quantidade de ativos da carteira."""
+    escritor = csv.writer(_Eco(), delimiter=";")
+
+    yield escritor.writerow(["Filtros aplicados"])
+    for campo, valor in filtros.items():
+        yield escritor.writerow([ROTULOS_FILTROS.get(campo, campo), valor])
+    if not filtros:
+        yield escritor.writerow(["Nenhum"])
+
+    yield escritor.writerow([])
+    yield escritor.writerow(CABECALHO_ATIVOS)
+    for lote in em_lotes(ativos.order_by("nome", "id").iterator(chunk_size=TAMANHO_LOTE_EXPORTACAO), TAMANHO_LOTE_EXPORTACAO):
+        # As métricas de um ativo dependem apenas dos seus próprios meses
+        linhas = DadoFinanceiroMensal.objects.filter(usuario_id=usuario.id, ativo_id__in=[ativo.id for ativo in lote])
+        metricas = Carteira.de_linhas(linhas.values_list("ativo_id", "mes", "valor", "rentabilidade")).metricas_por_ativo()
+        for ativo in lote:
+            metricas_ativo = metricas.get(ativo.id)
+            if metricas_ativo is None:
+                valores = [float(ativo.valor_inicial)] + [0] * 6  # Ativo ainda sem dados mensais
+            else:
+                valores = [metricas_ativo[campo] for campo in (
+                    "valor_atualizado",
+                    "rentabilidade_1m_abs", "rentabilidade_1m_perc",
+                    "rentabilidade_1a_abs", "rentabilidade_1a_perc",
+                    "rentabilidade_total_abs", "rentabilidade_total_perc",
+                )]
+            yield escritor.writerow(
+                [ativo.nome, ativo.classe, ativo.subclasse, ativo.banco]
+                + [_formatar(valor) for valor in valores]
+                + [ativo.observacoes or ""]
+            )
+
+    yield escritor.writerow([])
+    yield escritor.writerow(["Histórico mensal"])
+    yield escritor.writerow(CABECALHO_HISTORICO)
+    historico = (
+        DadoFinanceiroMensal.objects.filter(usuario_id=usuario.id, ativo__in=ativos)
+        .order_by("ativo__nome", "ativo_id", "mes")
+        .values_list("ativo__nome", "mes", "valor", "rentabilidade")
+    )
+    for nome, mes, valor, rentabilidade in historico.iterator(chunk_size=TAMANHO_LOTE_EXPORTACAO):
+        perc = rentabilidade / valor * 100 if valor else 0
+        yield escritor.writerow([nome, f"{mes:%Y-%m}", _formatar(valor), _formatar(rentabilidade), _formatar(perc)])
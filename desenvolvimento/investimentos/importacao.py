@@ -0,0 +1,124 @@
+import codecs
+import csv
+from collections import Counter
+from datetime import datetime
+
+from .models import Ativo, Operacao, TAMANHO_LOTE
+
+# Quantidade máxima de mensagens de erro guardadas por importação
+LIMITE_ERROS = 100
+
+
+class ResultadoImportacao:
+    """Contadores e erros de uma importação de CSV."""
+
+    def __init__(self):
+        self.linhas_processadas = 0
+        self.importadas = 0
+        self.linhas_com_erro = 0
+        self.erros = []
+        self.ativos_nao_encontrados = Counter()
+
+    def registrar_erro(self, row, erro):
+        self.linhas_com_erro += 1
+        if len(self.erros) < LIMITE_ERROS:
+            self.erros.append(f"Erro ao processar linha: {row}. Erro: {erro}")
+
+    def mensagens_erro(self):
+        """Mensagens de erro guardadas, seguidas de um resumo das linhas com erro excedentes."""
+        excedentes = self.linhas_com_erro - len(self.erros)
+        if excedentes > 0:
+            return self.erros + [f"{excedentes} outras linhas com erro foram ignoradas."]
+        return self.erros
+
+    def mensagem_ativos_nao_encontrados(self):
+        """Resume em uma única mensagem as operações ignoradas por ativo inexistente."""
+        nomes = ", ".join(f"'{nome}' ({quantidade})" for nome, quantidade in sorted(self.ativos_nao_encontrados.items()))
+        return f"{sum(self.ativos_nao_encontrados.values())} operações ignoradas por ativos não encontrados: {nomes}."
+
+
+def ler_csv(arquivo, encoding="utf-8"):
+    """Retorna um leitor de CSV que decodifica o arquivo linha a linha, sem carregá-lo inteiro na memória."""
+    return csv.DictReader(codecs.iterdecode(arquivo, encoding), delimiter=";")
+
+
+def converter_valor(texto):
+    """Converte um valor monetário do CSV (ex.: "R$ 1000,50") para float."""
+    return float(texto.replace("R$", "").replace(",", ".").strip())
+
+
+def _acompanhar(resultado, progresso):
+    """Retorna o callback chamado após cada lote gravado, repassando o resultado parcial a `progresso`."""
+    def ao_gravar_lote(total):
+        resultado.importadas = total
+        if progresso:
+            progresso(resultado)
+    return ao_gravar_lote
+
+
+def importar_ativos(usuario, arquivo, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """Importa os ativos de um CSV, gravando-os em lotes de `tamanho_lote` linhas.
+    `progresso(resultado)` é chamado após cada lote gravado."""
+    resultado = ResultadoImportacao()
+
+    def ativos_validos():
+        for row in ler_csv(arquivo):
+            resultado.linhas_processadas += 1
+            try:
+                ativo = Ativo(
+                    usuario=usuario,
+                    nome=row["Nome"],
+                    classe=row["Classe"],
+                    subclasse=row["Subclasse"],
+                    banco=row["Banco"],
+                    valor_inicial=converter_valor(row["Valor Inicial"]),
+                    data_aquisicao=datetime.strptime(row["Data de Aquisição"], "%Y-%m-%d").date(),
+                    observacoes=row.get("Observações") or "",
+                )
+            except Exception as e:
+                resultado.registrar_erro(row, e)
+                continue
+            yield ativo
+
+    resultado.importadas = Ativo.objects.importar(ativos_validos(), tamanho_lote, _acompanhar(resultado, progresso))
+    return resultado
+
+
+def ler_operacoes(arquivo, ativos_por_nome, resultado):
+    """Lê as operações de um CSV e retorna tuplas (ativo_id, tipo, valor, data), usando o mapa
+    nome -> id dos ativos. Linhas inválidas e ativos inexistentes são contabilizados em `resultado`."""
+    tipos_validos = dict(Operacao.TIPO_OPERACAO)
+    for row in ler_csv(arquivo):
+        resultado.linhas_processadas += 1
+        try:
+            ativo_nome = row["Ativo"]
+            tipo = row["Tipo"]
+            data = datetime.strptime(row["Data"], "%Y-%m-%d").date()
+            valor = converter_valor(row["Valor"])
+
+            if tipo not in tipos_validos:
+                raise ValueError(f"tipo de operação '{tipo}' inválido")
+        except Exception as e:
+            resultado.registrar_erro(row, e)
+            continue
+
+        # Verifica se o ativo existe
+        ativo_id = ativos_por_nome.get(ativo_nome)
+        if ativo_id is None:
+            resultado.ativos_nao_encontrados[ativo_nome] += 1
+            continue  # Pula esta linha se o ativo não for encontrado
+
+        yield ativo_id, tipo, valor, data
+
+
+def importar_operacoes(usuario, arquivo, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """Importa as operações de um CSV, gravando-as em lotes de `tamanho_lote` linhas.
+    Cada ativo afetado é recalculado uma única vez ao final e `progresso(resultado)` é chamado após cada lote gravado."""
+    resultado = ResultadoImportacao()
+    ativos_por_nome = Ativo.objects.mapa_nomes(usuario)  # Uma única consulta para todo o arquivo
+    operacoes = (
+        Operacao(usuario=usuario, ativo_id=ativo_id, tipo=tipo, data=data, valor=valor)
+        for ativo_id, tipo, valor, data in ler_operacoes(arquivo, ativos_por_nome, resultado)
+    )
+    resultado.importadas = Operacao.objects.importar(operacoes, tamanho_lote, _acompanhar(resultado, progresso))
+    return resultado
@@ -0,0 +1,600 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import copy
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+import numpy as np
+import requests
+
+from .carteira import indice_mes, mes_do_indice, rotulo_mes
+from .perfilamento import etapa
+
+logger = logging.getLogger(__name__)
+
+# Dias após o fim de um mês até considerá-lo fechado, dando tempo para as fontes publicarem os últimos dias
+DIAS_PARA_FECHAMENTO = 5
+
+# Segundos após os quais a trava de atualização é considerada abandonada (ex.: processo encerrado no meio da busca)
+TEMPO_TRAVA_ABANDONADA = 300
+
+# Segundos até buscar de novo uma série cuja última busca falhou ou passou do tempo limite
+INTERVALO_NOVA_TENTATIVA = 600
+
+# Worker que atualiza as séries fora das requisições; uma atualização por vez em cada processo
+_atualizador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="indices")
+_atualizacao_agendada = threading.Lock()
+
+# Momento (time.monotonic) da última busca que falhou em cada série, neste processo
+_falhas = {}
+
+# Séries e curvas lidas do arquivo, reaproveitadas enquanto ele não mudar: (assinatura do arquivo, séries, curvas)
+_lidas = (None, {}, {})
+
+
+def indice_do_rotulo(rotulo):
+    """Converte um rótulo "AAAA-MM" para o índice inteiro do mês."""
+    ano, mes = rotulo.split("-")
+    return int(ano) * 12 + int(mes) - 1
+
+
+def ultimo_mes_fechado(hoje):
+    """Índice do último mês cujos valores não mudam mais nas fontes."""
+    return indice_mes(hoje - timedelta(days=DIAS_PARA_FECHAMENTO)) - 1
+
+
+def compor_taxas(taxas_por_mes):
+    """Compõe as taxas percentuais (diárias ou mensais) de cada mês em uma única taxa mensal."""
+    return {mes: (np.prod([1 + taxa / 100 for taxa in taxas]) - 1) * 100 for mes, taxas in taxas_por_mes.items()}
+
+
+def variacoes_de_fechamentos(fechamentos, inicio, fim):
+    """Variação percentual de cada mês de `inicio` a `fim` entre o fechamento do mês anterior e o do próprio mês.
+    `fechamentos` mapeia o índice do mês para o valor de fechamento."""
+    variacoes = {}
+    for mes in range(inicio, fim + 1):
+        valor_atual, valor_anterior = fechamentos.get(mes), fechamentos.get(mes - 1)
+        if valor_atual is not None and valor_anterior:
+            variacoes[rotulo_mes(mes)] = ((valor_atual / valor_anterior) - 1) * 100  # Percentual
+    return variacoes
+
+
+class Fonte:
+    """Fonte externa de um índice. As subclasses implementam `buscar`, que retorna {"AAAA-MM": percentual}
+    para os meses de `inicio` a `fim` (índices); fontes capazes de buscar várias séries em uma única
+    chamada também sobrescrevem `buscar_lote`."""
+
+    def buscar(self, inicio, fim, tempo_limite):
+        raise NotImplementedError
+
+    @classmethod
+    def buscar_lote(cls, fontes, inicio, fim, tempo_limite):
+        """Busca as séries de várias fontes desta classe no mesmo período. Retorna nome -> valores mensais;
+        séries que não puderam ser buscadas ficam fora do resultado."""
+        return {nome: fonte.buscar(inicio, fim, tempo_limite) for nome, fonte in fontes.items()}
+
+
+class FonteYahoo(Fonte):
+    """Variação percentual mensal de um ticker do Yahoo Finance (ex.: ^BVSP para o IBOVESPA).
+    Os tickers de uma atualização são baixados juntos, em uma única chamada."""
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    def buscar(self, inicio, fim, tempo_limite):
+        variacoes = self.buscar_lote({self.ticker: self}, inicio, fim, tempo_limite)
+        if self.ticker not in variacoes:
+            raise RuntimeError(f"Nenhum fechamento recebido do Yahoo Finance para {self.ticker}")
+        return variacoes[self.ticker]
+
+    @classmethod
+    def buscar_lote(cls, fontes, inicio, fim, tempo_limite):
+        """Como `Fonte.buscar_lote`, mas sem as séries cujo ticker veio sem fechamentos."""
+        import yfinance as yf
+
+        # A variação de um mês usa o fechamento do mês anterior
+        tickers = sorted({fonte.ticker for fonte in fontes.values()})
+        historico = yf.download(
+            tickers,
+            start=mes_do_indice(inicio - 1).isoformat(),
+            end=mes_do_indice(fim + 1).isoformat(),
+            interval="1mo",
+            group_by="ticker",
+            timeout=tempo_limite,
+            progress=False,
+            threads=False,
+        )
+
+        # O yfinance registra as falhas de rede no log e devolve um quadro vazio (ou um ticker sem fechamentos)
+        # em vez de levantar uma exceção; esses tickers ficam fora do resultado, como uma busca que falhou
+        baixados = set() if historico is None or historico.empty else set(historico.columns.get_level_values(0))
+        fechamentos_por_ticker = {}
+        for ticker in baixados.intersection(tickers):
+            fechamentos = historico[ticker]["Close"].dropna()
+            if not fechamentos.empty:
+                fechamentos_por_ticker[ticker] = fechamentos
+        sem_fechamentos = [ticker for ticker in tickers if ticker not in fechamentos_por_ticker]
+        if sem_fechamentos:
+            logger.warning("Nenhum fechamento recebido do Yahoo Finance para %s", ", ".join(sem_fechamentos))
+
+        variacoes = {}
+        for nome, fonte in fontes.items():
+            if fonte.ticker not in fechamentos_por_ticker:
+                continue
+            fechamentos = {}
+            for data, valor in fechamentos_por_ticker[fonte.ticker].items():
+                fechamentos.setdefault(indice_mes(data), valor)
+            variacoes[nome] = variacoes_de_fechamentos(fechamentos, inicio, fim)
+        return variacoes
+
+
+class FonteSGS(Fonte):
+    """Taxa percentual mensal de uma série do SGS do Banco Central, diária (ex.: 12 para o CDI,
+    composta no mês) ou mensal (ex.: 433 para o IPCA)."""
+
+    def __init__(self, serie):
+        self.serie = serie
+
+    def buscar(self, inicio, fim, tempo_limite):
+        data_inicio = mes_do_indice(inicio).strftime("%d/%m/%Y")
+        data_fim = (mes_do_indice(fim + 1) - timedelta(days=1)).strftime("%d/%m/%Y")
+        url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{self.serie}/dados?formato=json&dataInicial={data_inicio}&dataFinal={data_fim}"
+        resposta = requests.get(url, timeout=tempo_limite)
+        resposta.raise_for_status()
+
+        taxas_por_mes = defaultdict(list)
+        for entrada in resposta.json():
+            dia, mes, ano = entrada["data"].split("/")
+            taxas_por_mes[f"{ano}-{mes}"].append(float(entrada["valor"]))
+
+        return compor_taxas(taxas_por_mes)
+
+
+class FonteCSV(Fonte):
+    """Índice lido de um arquivo CSV local com uma coluna de data e uma de valor.
+
+    Com `tipo="variacao"`, os valores são taxas percentuais (diárias ou mensais) compostas em cada
+    mês; com `tipo="preco"`, são cotações e a variação mensal é calculada entre os fechamentos."""
+
+    def __init__(self, caminho, coluna_data="Data", coluna_valor="Valor", tipo="variacao", formato_data="%Y-%m-%d", delimitador=";"):
+        self.caminho = caminho
+        self.coluna_data = coluna_data
+        self.coluna_valor = coluna_valor
+        self.tipo = tipo
+        self.formato_data = formato_data
+        self.delimitador = delimitador
+
+    def buscar(self, inicio, fim, tempo_limite):
+        with open(self.caminho, "r", encoding="utf-8") as f:
+            linhas = sorted(
+                (datetime.strptime(row[self.coluna_data], self.formato_data).date(), float(row[self.coluna_valor].replace(",", ".")))
+                for row in csv.DictReader(f, delimiter=self.delimitador)
+            )
+
+        if self.tipo == "preco":
+            fechamentos = {indice_mes(data): valor for data, valor in linhas}  # Prevalece o último valor do mês
+            return variacoes_de_fechamentos(fechamentos, inicio, fim)
+
+        taxas_por_mes = defaultdict(list)
+        for data, valor in linhas:
+            if inicio <= indice_mes(data) <= fim:
+                taxas_por_mes[rotulo_mes(indice_mes(data))].append(valor)
+        return compor_taxas(taxas_por_mes)
+
+
+class FonteArquivo(Fonte):
+    """Valores mensais lidos de um arquivo JSON local no formato {"serie": {"AAAA-MM": percentual}},
+    para desenvolvimento e testes sem acesso às fontes externas."""
+
+    def __init__(self, caminho, serie):
+        self.caminho = caminho
+        self.serie = serie
+
+    def buscar(self, inicio, fim, tempo_limite):
+        with open(self.caminho, "r") as f:
+            valores = json.load(f).get(self.serie, {})
+        rotulo_inicio, rotulo_fim = rotulo_mes(inicio), rotulo_mes(fim)
+        return {mes: valor for mes, valor in valores.items() if rotulo_inicio <= mes <= rotulo_fim}
+
+
+def calcular_acumulado(mensal):
+    """Curva de crescimento acumulado dos valores mensais (percentuais) de uma série.
+
+    Retorna {"base": "AAAA-MM", "fatores": [...]}, onde o fator de índice i é o crescimento
+    acumulado ao fim do i-ésimo mês após o mês base (o fator do mês base é 1). Meses sem
+    valor dentro do intervalo contam como variação zero."""
+    if not mensal:
+        return None
+    meses = np.array([indice_do_rotulo(mes) for mes in mensal])
+    base = meses.min() - 1
+    taxas = np.zeros(meses.max() - base + 1)
+    taxas[meses - base] = np.fromiter(mensal.values(), dtype=float, count=len(mensal)) / 100
+    return {"base": rotulo_mes(int(base)), "fatores": np.cumprod(1 + taxas).tolist()}
+
+
+class CurvaAcumulada:
+    """Crescimento acumulado de um índice ao fim de cada mês. A rentabilidade do índice entre
+    dois meses é a razão entre os fatores desses meses, sem percorrer os meses intermediários."""
+
+    def __init__(self, base, fatores):
+        self.base = base
+        self.fatores = fatores
+
+    @classmethod
+    def da_serie(cls, serie):
+        acumulado = serie.get("acumulado") or calcular_acumulado(serie.get("mensal"))
+        if not acumulado:
+            return cls(0, np.ones(1))
+        return cls(indice_do_rotulo(acumulado["base"]), np.array(acumulado["fatores"]))
+
+    def fatores_em(self, meses):
+        """Fatores ao fim de cada mês (índices). Antes da curva o fator é 1 e depois dela é o último fator."""
+        return self.fatores[np.clip(np.asarray(meses) - self.base, 0, len(self.fatores) - 1)]
+
+    def rentabilidade(self, meses, base):
+        """Rentabilidade percentual acumulada do fim do mês `base` até o fim de cada um dos `meses`."""
+        return (self.fatores_em(meses) / self.fatores_em(base) - 1) * 100
+
+
+def fontes():
+    """Instancia as fontes do registro INDICES_FONTES, na forma
+    chave -> {"fonte": caminho da classe, "nome": nome exibido, "padrao": exibido por padrão, **parâmetros}."""
+    instancias = {}
+    for chave, configuracao in settings.INDICES_FONTES.items():
+        parametros = {campo: valor for campo, valor in configuracao.items() if campo not in ("fonte", "nome", "padrao")}
+        instancias[chave] = import_string(configuracao["fonte"])(**parametros)
+    return instancias
+
+
+def indices_disponiveis():
+    """Índices do registro como tuplas (chave, nome exibido, exibido por padrão), na ordem configurada."""
+    return [
+        (chave, configuracao.get("nome", chave), configuracao.get("padrao", False))
+        for chave, configuracao in settings.INDICES_FONTES.items()
+    ]
+
+
+def caminho_armazenamento():
+    return settings.INDICES_CACHE_FILE
+
+
+def carregar_series():
+    """Carrega as séries gravadas. Cada série guarda os valores mensais ("mensal"), o intervalo
+    de meses fechados já buscados ("inicio" e "fim"), o dia da última busca ("verificado_em"), os meses
+    buscados nesse dia ("verificado_inicio" e "verificado_fim") e a curva de crescimento acumulado ("acumulado").
+
+    O arquivo só é lido novamente quando muda; as séries retornadas são compartilhadas e não devem ser alteradas."""
+    global _lidas
+    caminho = caminho_armazenamento()
+    try:
+        estado = os.stat(caminho)
+    except FileNotFoundError:
+        return {}
+
+    assinatura = (caminho, estado.st_mtime_ns, estado.st_size)
+    if _lidas[0] == assinatura:
+        return _lidas[1]
+
+    with etapa("indices"), open(caminho, "r") as f:
+        try:
+            series = json.load(f).get("series", {})
+        except json.JSONDecodeError:
+            return {}
+    _lidas = (assinatura, series, {})
+    return series
+
+
+def versao_indices():
+    """Assinatura do arquivo das séries, que muda a cada gravação. Identifica a versão dos dados
+    derivados dos índices (ex.: ETag dos gráficos)."""
+    try:
+        estado = os.stat(caminho_armazenamento())
+    except FileNotFoundError:
+        return "0"
+    return f"{estado.st_mtime_ns}-{estado.st_size}"
+
+
+def carregar_curvas(nomes):
+    """Curvas acumuladas das séries gravadas, montadas uma única vez para cada versão do arquivo."""
+    series = carregar_series()
+    _, lidas, curvas = _lidas
+    if lidas is not series:
+        curvas = {}
+    for nome in nomes:
+        if nome not in curvas:
+            curvas[nome] = CurvaAcumulada.da_serie(series.get(nome, {}))
+    return {nome: curvas[nome] for nome in nomes}
+
+
+def salvar_series(series):
+    """Grava as séries, com suas curvas acumuladas recalculadas, em um arquivo temporário e o move
+    sobre o anterior, para que leitores em outros processos nunca vejam um arquivo gravado pela metade."""
+    series = {nome: {**serie, "acumulado": calcular_acumulado(serie.get("mensal"))} for nome, serie in series.items()}
+
+    caminho = caminho_armazenamento()
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", suffix=".tmp")
+    try:
+        with etapa("indices"), os.fdopen(descritor, "w") as f:
+            json.dump({"series": series}, f)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+
+def _criar_trava(caminho, dono):
+    """Cria o arquivo de trava apenas se ele ainda não existir; retorna False se outro processo já o criou."""
+    try:
+        descritor = os.open(caminho, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(descritor, "w") as f:
+        f.write(dono)
+    return True
+
+
+def _liberar_trava(caminho, dono):
+    """Remove a trava, a menos que ela tenha sido assumida por outro worker por parecer abandonada."""
+    try:
+        with open(caminho, "r") as f:
+            if f.read() != dono:
+                return
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def _trava_abandonada(caminho):
+    try:
+        return time.time() - os.path.getmtime(caminho) > TEMPO_TRAVA_ABANDONADA
+    except FileNotFoundError:
+        return False
+
+
+def _assumir_trava_abandonada(caminho, dono):
+    """Substitui a trava por uma de `dono` se ela estiver abandonada. Retorna True se a trava foi assumida.
+
+    Vários workers podem ver a mesma trava como abandonada ao mesmo tempo: cada um a renomeia para um
+    nome próprio e confere se o arquivo renomeado ainda é a trava abandonada que viu. Se não for
+    (outro worker já a substituiu por uma nova), a trava nova é devolvida e o worker desiste."""
+    try:
+        with open(caminho, "r") as f:
+            dono_abandonado = f.read()
+    except FileNotFoundError:
+        return False
+    if not _trava_abandonada(caminho):
+        return False
+
+    renomeada = f"{caminho}.{uuid4().hex}"
+    try:
+        os.rename(caminho, renomeada)
+    except FileNotFoundError:
+        return False  # Outro worker assumiu a trava antes
+    with open(renomeada, "r") as f:
+        assumida = f.read() == dono_abandonado
+
+    if not assumida:
+        try:
+            os.link(renomeada, caminho)  # Devolve a trava sem sobrescrever uma criada nesse intervalo
+        except FileExistsError:
+            pass
+    os.remove(renomeada)
+    return assumida and _criar_trava(caminho, dono)
+
+
+@contextmanager
+def trava_atualizacao():
+    """Trava entre processos (e threads) para que apenas um worker atualize as séries por vez.
+    Retorna True se a trava foi obtida e False se outro worker já está atualizando.
+
+    Usa um arquivo criado com O_EXCL ao lado do arquivo das séries, identificado por um dono único.
+    Uma trava mais antiga que TEMPO_TRAVA_ABANDONADA é assumida por um único worker (ver
+    `_assumir_trava_abandonada`)."""
+    caminho = caminho_armazenamento() + ".lock"
+    dono = f"{os.getpid()}:{uuid4().hex}"
+    obtida = _criar_trava(caminho, dono) or _assumir_trava_abandonada(caminho, dono)
+
+    try:
+        yield obtida
+    finally:
+        if obtida:
+            _liberar_trava(caminho, dono)
+
+
+def _verificado_hoje(serie, inicio, fim, hoje):
+    """Se os meses de `inicio` a `fim` já foram buscados hoje, com ou sem valores devolvidos pela fonte."""
+    if serie.get("verificado_em") != hoje.isoformat() or "verificado_inicio" not in serie:
+        return False
+    return indice_do_rotulo(serie["verificado_inicio"]) <= inicio and fim <= indice_do_rotulo(serie["verificado_fim"])
+
+
+def intervalos_faltantes(serie, inicio, fim, hoje):
+    """Intervalos (inicio, fim) de meses a buscar para que a série cubra de `inicio` a `fim`.
+
+    Meses fechados já cobertos nunca são buscados de novo; os demais (meses em aberto, ainda não
+    publicados ou anteriores ao início da série) são buscados no máximo uma vez por dia. Os
+    intervalos estendem a cobertura sem deixar lacunas."""
+    if "inicio" not in serie:
+        intervalos = [(inicio, fim)]
+    else:
+        coberto_inicio = indice_do_rotulo(serie["inicio"])
+        coberto_fim = indice_do_rotulo(serie["fim"])
+        intervalos = []
+        if inicio < coberto_inicio:
+            intervalos.append((inicio, coberto_inicio - 1))
+        if fim > coberto_fim:
+            intervalos.append((coberto_fim + 1, fim))
+    return [(busca_inicio, busca_fim) for busca_inicio, busca_fim in intervalos if not _verificado_hoje(serie, busca_inicio, busca_fim, hoje)]
+
+
+def incorporar_busca(serie, busca_inicio, busca_fim, valores, hoje):
+    """Incorpora à série os valores buscados para os meses de `busca_inicio` a `busca_fim`."""
+    serie.setdefault("mensal", {}).update(valores)
+
+    # Os meses buscados hoje não são buscados de novo até amanhã, mesmo que a fonte não tenha devolvido nada
+    if serie.get("verificado_em") == hoje.isoformat() and "verificado_inicio" in serie:
+        serie["verificado_inicio"] = min(serie["verificado_inicio"], rotulo_mes(busca_inicio))
+        serie["verificado_fim"] = max(serie["verificado_fim"], rotulo_mes(busca_fim))
+    else:
+        serie["verificado_inicio"], serie["verificado_fim"] = rotulo_mes(busca_inicio), rotulo_mes(busca_fim)
+    serie["verificado_em"] = hoje.isoformat()
+
+    # Apenas meses fechados e devolvidos pela fonte passam a contar como cobertos
+    if not valores:
+        return
+    cobertos_fim = min(busca_fim, ultimo_mes_fechado(hoje), max(indice_do_rotulo(mes) for mes in valores))
+    if busca_inicio > cobertos_fim:
+        return
+    if "inicio" in serie:
+        cobertos_fim = max(cobertos_fim, indice_do_rotulo(serie["fim"]))
+        busca_inicio = min(busca_inicio, indice_do_rotulo(serie["inicio"]))
+    serie["inicio"], serie["fim"] = rotulo_mes(busca_inicio), rotulo_mes(cobertos_fim)
+
+
+def atualizar_grupo(classe, fontes, series, faltantes, hoje):
+    """Busca, com uma chamada a `classe.buscar_lote` por intervalo, os meses `faltantes` das séries
+    de um grupo de fontes da mesma classe e os incorpora às séries, que são retornadas.
+
+    Séries ausentes do resultado de todas as buscas (ex.: ticker sem fechamentos) não são marcadas
+    como verificadas nem retornadas, e contam como buscas que falharam."""
+    buscadas = set()
+    for busca_inicio, busca_fim in faltantes:
+        with etapa("externo"):
+            valores = classe.buscar_lote(fontes, busca_inicio, busca_fim, settings.INDICES_TEMPO_LIMITE)
+        for nome, serie in series.items():
+            if nome in valores:
+                incorporar_busca(serie, busca_inicio, busca_fim, valores[nome], hoje)
+                buscadas.add(nome)
+    return {nome: serie for nome, serie in series.items() if nome in buscadas}
+
+
+def _periodo(inicio, fim, hoje):
+    """Converte as datas do período para índices de mês, sem passar do mês atual."""
+    return indice_mes(inicio), min(indice_mes(fim), indice_mes(hoje))
+
+
+def atualizar_indices(inicio, fim, hoje=None):
+    """Busca nas fontes, em paralelo, os meses que faltam em cada série para o período de `inicio` a `fim`.
+
+    Séries de fontes que buscam em lote (ex.: tickers do Yahoo) são buscadas em uma única chamada.
+    As buscas têm o tempo limite INDICES_TEMPO_LIMITE; séries cuja busca falhar ou não terminar
+    nesse prazo mantêm os valores já gravados e só são tentadas novamente após INTERVALO_NOVA_TENTATIVA.
+    O arquivo só é regravado se alguma série mudou. Se outro worker já estiver atualizando, retorna as séries gravadas sem buscar nada."""
+    with trava_atualizacao() as obtida:
+        if not obtida:
+            return carregar_series()
+        return _atualizar_indices(inicio, fim, hoje or date.today())
+
+
+def _atualizar_indices(inicio, fim, hoje):
+    inicio, fim = _periodo(inicio, fim, hoje)
+    series = dict(carregar_series())  # Lidas já com a trava, incluindo o que outro worker acabou de gravar
+
+    # Séries de fontes da mesma classe com os mesmos meses faltantes são buscadas juntas
+    grupos = defaultdict(dict)
+    for nome, fonte in fontes().items():
+        faltantes = intervalos_faltantes(series.get(nome, {}), inicio, fim, hoje)
+        if faltantes and not _aguardando_nova_tentativa(nome):
+            grupos[(type(fonte), tuple(faltantes))][nome] = fonte
+    if not grupos:
+        return series
+
+    executor = ThreadPoolExecutor(max_workers=len(grupos), thread_name_prefix="indices-busca")
+    buscas = {
+        executor.submit(
+            atualizar_grupo, classe, grupo, {nome: copy.deepcopy(series.get(nome, {})) for nome in grupo}, faltantes, hoje
+        ): list(grupo)
+        for (classe, faltantes), grupo in grupos.items()
+    }
+    wait(buscas, timeout=settings.INDICES_TEMPO_LIMITE)
+    executor.shutdown(wait=False, cancel_futures=True)  # Buscas que passaram do prazo são descartadas
+
+    alteradas = False
+    for busca, nomes in buscas.items():
+        atualizadas = {}
+        if not busca.done():
+            logger.warning("Tempo limite excedido ao atualizar as séries %s", ", ".join(nomes))
+        elif busca.exception():
+            logger.error("Erro ao atualizar as séries %s", ", ".join(nomes), exc_info=busca.exception())
+        else:
+            atualizadas = busca.result()
+
+        for nome in nomes:
+            if nome not in atualizadas:
+                _falhas[nome] = time.monotonic()
+                continue
+            _falhas.pop(nome, None)
+            if atualizadas[nome] != series.get(nome):
+                series[nome] = atualizadas[nome]
+                alteradas = True
+
+    # Regravar o arquivo sem mudanças invalidaria à toa as versões derivadas dele (ex.: ETag dos gráficos)
+    if alteradas:
+        salvar_series(series)
+    return series
+
+
+def _aguardando_nova_tentativa(nome):
+    """Se a última busca da série neste processo falhou há menos de INTERVALO_NOVA_TENTATIVA segundos."""
+    falha = _falhas.get(nome)
+    return falha is not None and time.monotonic() - falha < INTERVALO_NOVA_TENTATIVA
+
+
+def _atualizar_em_segundo_plano(inicio, fim):
+    try:
+        atualizar_indices(inicio, fim)
+    except Exception:
+        logger.exception("Falha ao atualizar os índices")
+    finally:
+        _atualizacao_agendada.release()
+
+
+def agendar_atualizacao(inicio, fim):
+    """Agenda a atualização das séries no worker do processo, se não houver outra já agendada."""
+    if _atualizacao_agendada.acquire(blocking=False):
+        _atualizador.submit(_atualizar_em_segundo_plano, inicio, fim)
+
+
+def _verificar_periodo(inicio, fim, hoje):
+    """Agenda a atualização em segundo plano se faltarem meses do período nas séries gravadas.
+    Retorna os índices do primeiro e do último mês do período."""
+    hoje = hoje or date.today()
+    indice_inicio, indice_fim = _periodo(inicio, fim, hoje)
+    series = carregar_series()
+    if any(
+        intervalos_faltantes(series.get(nome, {}), indice_inicio, indice_fim, hoje) and not _aguardando_nova_tentativa(nome)
+        for nome in settings.INDICES_FONTES
+    ):
+        agendar_atualizacao(inicio, fim)
+    return indice_inicio, indice_fim
+
+
+def obter_indices(inicio, fim, hoje=None):
+    """Retorna imediatamente os valores mensais gravados de cada série nos meses de `inicio` a `fim` (datas).
+
+    Se faltarem meses no período, a busca é agendada em segundo plano e os valores novos
+    aparecem nas próximas requisições."""
+    indice_inicio, indice_fim = _verificar_periodo(inicio, fim, hoje)
+    series = carregar_series()
+    rotulo_inicio, rotulo_fim = rotulo_mes(indice_inicio), rotulo_mes(indice_fim)
+    return {
+        nome: {mes: valor for mes, valor in series.get(nome, {}).get("mensal", {}).items() if rotulo_inicio <= mes <= rotulo_fim}
+        for nome in settings.INDICES_FONTES
+    }
+
+
+def obter_curvas(inicio, fim, hoje=None):
+    """Retorna imediatamente a `CurvaAcumulada` gravada de cada série, agendando a busca
+    dos meses de `inicio` a `fim` (datas) que ainda faltarem, como em `obter_indices`."""
+    _verificar_periodo(inicio, fim, hoje)
+    return carregar_curvas(list(settings.INDICES_FONTES))
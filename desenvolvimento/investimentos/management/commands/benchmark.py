@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from investimentos.benchmark import Escala, comparar_medicoes, executar_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede latência, consultas ao banco e pico de memória da importação de CSV, do recálculo das operações, "
+        "das páginas de resumo e do acumulado dos índices, com carteiras sintéticas em um banco de dados temporário."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escalas", default="1x10x2,2x50x5,5x100x10", help="Escalas USUARIOSxATIVOSxANOS separadas por vírgula.")
+        parser.add_argument("--repeticoes", type=int, default=3, help="Repetições de cada cenário.")
+        parser.add_argument("--semente", type=int, default=0, help="Semente das carteiras geradas.")
+        parser.add_argument("--saida", help="Grava os resultados neste arquivo JSON.")
+        parser.add_argument("--comparar", help="JSON de uma execução anterior; o comando falha se alguma medição piorar.")
+        parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento relativo da mediana tolerado na comparação.")
+
+    def handle(self, *args, **options):
+        try:
+            escalas = [Escala.de_texto(texto) for texto in options["escalas"].split(",")]
+        except ValueError as e:
+            raise CommandError(e)
+
+        # O benchmark grava e apaga carteiras: roda em um banco de testes, criado e removido aqui
+        setup_test_environment()
+        nome_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            medicoes = executar_benchmark(
+                escalas, options["repeticoes"], options["semente"],
+                progresso=lambda escala: self.stdout.write(f"Escala {escala}..."),
+            )
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'Escala':<12}{'Cenário':<28}{'Mediana (ms)':>14}{'Mín (ms)':>12}{'Máx (ms)':>12}{'Consultas':>11}{'Memória (MB)':>14}")
+        for medicao in medicoes:
+            dados = medicao.como_dict()
+            self.stdout.write(
+                f"{dados['escala']:<12}{dados['cenario']:<28}{dados['mediana_ms']:>14.1f}{dados['minimo_ms']:>12.1f}"
+                f"{dados['maximo_ms']:>12.1f}{dados['consultas']:>11}{dados['pico_memoria_mb']:>14.2f}"
+            )
+
+        if options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8") as f:
+                json.dump([medicao.como_dict() for medicao in medicoes], f, ensure_ascii=False, indent=2)
+
+        if options["comparar"]:
+            with open(options["comparar"], encoding="utf-8") as f:
+                regressoes = comparar_medicoes(medicoes, json.load(f), options["tolerancia"])
+            if regressoes:
+                raise CommandError("Regressões encontradas:\n" + "\n".join(regressoes))
+            self.stdout.write(self.style.SUCCESS("Nenhuma regressão em relação à execução anterior."))
@@ -0,0 +1,58 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from investimentos.benchmark import Escala
+from investimentos.dados_sinteticos import ParametrosGeracao
+from investimentos.models import TAMANHO_LOTE
+from investimentos.populacao import carteiras_sinteticas, popular
+
+CSVS = settings.BASE_DIR / "csvs"
+
+
+class Command(BaseCommand):
+    help = (
+        "Recria o usuário de demonstração com os ativos e as operações dos CSVs de exemplo ou, com --escala, "
+        "vários usuários com carteiras sintéticas (ex.: para benchmarks). Os dados são gravados em lotes e "
+        "as rentabilidades calculadas uma única vez ao final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuario", default="dummy", help="Nome do usuário; com --escala, prefixo dos usuários (dummy_1, dummy_2, ...).")
+        parser.add_argument("--senha", default="du123456", help="Senha dos usuários criados.")
+        parser.add_argument("--ativos", default=CSVS / "ativos.csv", help="CSV de ativos.")
+        parser.add_argument("--operacoes", default=CSVS / "operacoes.csv", help="CSV de operações.")
+        parser.add_argument("--escala", help="Gera carteiras sintéticas USUARIOSxATIVOSxANOS (ex.: 20x250x12) em vez de ler os CSVs.")
+        parser.add_argument("--semente", type=int, default=0, help="Semente das carteiras sintéticas.")
+        parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE, help="Linhas por inserção em lote.")
+        parser.add_argument("--processos", type=int, help="Processos do cálculo das rentabilidades; por padrão, um por CPU.")
+
+    def handle(self, *args, **options):
+        if options["processos"] is not None and options["processos"] < 1:
+            raise CommandError("--processos deve ser ao menos 1.")
+
+        with ExitStack() as arquivos:
+            if options["escala"]:
+                try:
+                    escala = Escala.de_texto(options["escala"])
+                except ValueError as e:
+                    raise CommandError(e)
+                parametros = ParametrosGeracao(ativos=escala.ativos, anos=escala.anos)
+                nomes = [f"{options['usuario']}_{numero}" for numero in range(1, escala.usuarios + 1)]
+                carteiras = zip(nomes, carteiras_sinteticas(parametros, escala.usuarios, options["semente"]))
+            else:
+                try:
+                    csvs = (arquivos.enter_context(open(options["ativos"], "rb")), arquivos.enter_context(open(options["operacoes"], "rb")))
+                except OSError as e:
+                    raise CommandError(f"Erro ao abrir os CSVs: {e}")
+                carteiras = [(options["usuario"], csvs)]
+
+            resultado = popular(carteiras, options["senha"], options["tamanho_lote"], options["processos"], progresso=self.stdout.write)
+
+        for erro in resultado.erros:
+            self.stderr.write(erro)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resultado.usuarios)} usuários, {resultado.ativos} ativos, {resultado.operacoes} operações e "
+            f"{resultado.meses} meses em {resultado.duracao:.1f} s ({resultado.por_segundo(resultado.operacoes):.0f} operações/s)."
+        ))
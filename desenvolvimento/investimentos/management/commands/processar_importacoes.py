@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from investimentos.models import Importacao
+from investimentos.tarefas import processar_importacao, recuperar_importacoes_abandonadas
+
+
+class Command(BaseCommand):
+    help = (
+        "Processa as importações de CSV pendentes (ex.: enviadas antes de um reinício do servidor) e marca com "
+        "erro as interrompidas no meio do processamento, reconstruindo os dados mensais dos usuários afetados."
+    )
+
+    def handle(self, *args, **options):
+        abandonadas = recuperar_importacoes_abandonadas()
+        if abandonadas:
+            self.stdout.write(self.style.WARNING(f"{abandonadas} importações interrompidas marcadas com erro."))
+
+        pendentes = Importacao.objects.filter(status=Importacao.PENDENTE).order_by("criada_em").values_list("pk", flat=True)
+        processadas = 0
+        for importacao_id in list(pendentes):
+            if processar_importacao(importacao_id):
+                processadas += 1
+                importacao = Importacao.objects.get(pk=importacao_id)
+                self.stdout.write(f"{importacao}: {importacao.linhas_importadas} linhas importadas.")
+        self.stdout.write(self.style.SUCCESS(f"{processadas} importações processadas."))
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from investimentos.reconstrucao import TAMANHO_LOTE_RECONSTRUCAO, reconstruir_dados
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula os dados mensais (valores e rentabilidades) de todos os ativos a partir das operações, "
+        "ex.: após mudanças no esquema, correções no cálculo das rentabilidades ou restauração de um backup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("usuarios", nargs="*", help="Nomes dos usuários a reconstruir; por padrão, todos.")
+        parser.add_argument("--processos", type=int, help="Processos de cálculo; por padrão, um por CPU.")
+        parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_RECONSTRUCAO, help="Ativos por lote de trabalho.")
+
+    def handle(self, *args, **options):
+        if options["processos"] is not None and options["processos"] < 1:
+            raise CommandError("--processos deve ser ao menos 1.")
+
+        usuarios = None
+        if options["usuarios"]:
+            usuarios = list(User.objects.filter(username__in=options["usuarios"]))
+            inexistentes = set(options["usuarios"]) - {usuario.username for usuario in usuarios}
+            if inexistentes:
+                raise CommandError(f"Usuários não encontrados: {', '.join(sorted(inexistentes))}.")
+
+        def progresso(resultado):
+            self.stdout.write(f"{resultado.ativos} ativos reconstruídos ({resultado.por_segundo(resultado.ativos):.0f} ativos/s)...")
+
+        resultado = reconstruir_dados(usuarios, options["processos"], options["tamanho_lote"], progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(resultado.usuarios)} usuários, {resultado.ativos} ativos, {resultado.operacoes} operações e "
+            f"{resultado.meses} meses em {resultado.duracao:.1f} s: "
+            f"{resultado.por_segundo(resultado.ativos):.0f} ativos/s, {resultado.por_segundo(resultado.operacoes):.0f} operações/s."
+        ))
@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from investimentos.consistencia import TOLERANCIA, verificar_dados
+from investimentos.reconstrucao import TAMANHO_LOTE_RECONSTRUCAO, reconstruir_dados
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara os dados mensais gravados com um recálculo a partir das operações e verifica os totais das "
+        "carteiras (valor, rentabilidade absoluta e percentual). Falha se houver divergências, para uso em "
+        "verificações periódicas (ex.: cron noturno)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("usuarios", nargs="*", help="Nomes dos usuários a verificar; por padrão, todos.")
+        parser.add_argument("--processos", type=int, help="Processos de cálculo; por padrão, um por CPU.")
+        parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE_RECONSTRUCAO, help="Ativos por lote de trabalho.")
+        parser.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="Diferença absoluta tolerada (R$ ou pontos percentuais).")
+        parser.add_argument("--limite", type=int, default=20, help="Divergências exibidas de cada tipo.")
+        parser.add_argument("--saida", help="Grava todas as divergências dos ativos neste CSV.")
+        parser.add_argument("--corrigir", action="store_true", help="Reconstrói os dados mensais dos usuários com divergências.")
+
+    def handle(self, *args, **options):
+        if options["processos"] is not None and options["processos"] < 1:
+            raise CommandError("--processos deve ser ao menos 1.")
+
+        usuarios = None
+        if options["usuarios"]:
+            usuarios = list(User.objects.filter(username__in=options["usuarios"]))
+            inexistentes = set(options["usuarios"]) - {usuario.username for usuario in usuarios}
+            if inexistentes:
+                raise CommandError(f"Usuários não encontrados: {', '.join(sorted(inexistentes))}.")
+
+        relatorio = verificar_dados(usuarios, options["processos"], options["tamanho_lote"], options["tolerancia"])
+        self.stdout.write(
+            f"{len(relatorio.usuarios)} usuários, {relatorio.ativos} ativos e {relatorio.meses} meses verificados "
+            f"em {relatorio.duracao:.1f} s."
+        )
+        if relatorio.consistente:
+            self.stdout.write(self.style.SUCCESS("Nenhuma divergência encontrada."))
+            return
+
+        ativos, carteiras = relatorio.ativos_divergentes, relatorio.carteiras_divergentes
+        if not ativos.empty:
+            self.stdout.write(f"{len(ativos)} meses de ativos divergentes ({ativos['situacao'].value_counts().to_dict()}):")
+            self.stdout.write(ativos.head(options["limite"]).to_string(index=False))
+        if not carteiras.empty:
+            self.stdout.write(f"{len(carteiras)} meses de carteiras com totais divergentes:")
+            self.stdout.write(carteiras.head(options["limite"]).to_string(index=False))
+        if options["saida"]:
+            ativos.to_csv(options["saida"], sep=";", index=False)
+            self.stdout.write(f"Divergências gravadas em {options['saida']}.")
+
+        divergentes = relatorio.usuarios_divergentes()
+        if options["corrigir"]:
+            resultado = reconstruir_dados(User.objects.filter(pk__in=divergentes), options["processos"], options["tamanho_lote"])
+            self.stdout.write(self.style.SUCCESS(f"Dados mensais de {len(resultado.usuarios)} usuários reconstruídos."))
+            return
+        raise CommandError(f"Divergências nos dados mensais de {len(divergentes)} usuários.")
@@ -0,0 +1,121 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:09
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _calcular_dados_mensais(data_aquisicao, valor_inicial, operacoes):
+    """Cópia do cálculo de investimentos.calculos na época desta migração, para que ela grave sempre
+    os mesmos dados, independente de mudanças posteriores no código da aplicação.
+    Retorna tuplas (mes, valor, rentabilidade) em ordem de mês."""
+    atualizacoes_mensais = {data_aquisicao.replace(day=1): float(valor_inicial)}
+    compras_vendas_mensais = defaultdict(float)
+
+    for tipo, valor, data in operacoes:
+        mes_operacao = data.replace(day=1)
+        if tipo == "atualizacao":
+            atualizacoes_mensais[mes_operacao] = float(valor)
+        elif tipo == "compra":
+            compras_vendas_mensais[mes_operacao] += float(valor)
+        elif tipo == "venda":
+            compras_vendas_mensais[mes_operacao] -= float(valor)
+
+    meses_ordenados = sorted(set(atualizacoes_mensais) | set(compras_vendas_mensais))
+    dados = []
+    for i, mes in enumerate(meses_ordenados):
+        valor = atualizacoes_mensais.get(mes, 0) + compras_vendas_mensais.get(mes, 0)
+        if i < len(meses_ordenados) - 1:
+            rentabilidade = atualizacoes_mensais.get(meses_ordenados[i + 1], 0) - valor
+        else:
+            rentabilidade = 0.0
+        dados.append((mes, valor, rentabilidade))
+    return dados
+
+
+def popular_dados_mensais(apps, schema_editor):
+    """Calcula os dados mensais de todos os ativos existentes a partir das operações."""
+    Ativo = apps.get_model("investimentos", "Ativo")
+    Operacao = apps.get_model("investimentos", "Operacao")
+    DadoFinanceiroMensal = apps.get_model("investimentos", "DadoFinanceiroMensal")
+
+    for ativo in Ativo.objects.all().iterator():
+        operacoes = (
+            Operacao.objects.filter(ativo=ativo)
+            .order_by("data", "id")
+            .values_list("tipo", "valor", "data")
+        )
+        dados = _calcular_dados_mensais(ativo.data_aquisicao, ativo.valor_inicial, operacoes)
+        DadoFinanceiroMensal.objects.bulk_create(
+            DadoFinanceiroMensal(
+                usuario_id=ativo.usuario_id,
+                ativo=ativo,
+                mes=mes,
+                valor=valor,
+                rentabilidade=rentabilidade,
+            )
+            for mes, valor, rentabilidade in dados
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investimentos", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DadoFinanceiroMensal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mes", models.DateField(verbose_name="Mês de Referência")),
+                ("valor", models.FloatField()),
+                ("rentabilidade", models.FloatField()),
+                (
+                    "ativo",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dados_mensais",
+                        to="investimentos.ativo",
+                    ),
+                ),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "dado financeiro mensal",
+                "verbose_name_plural": "dados financeiros mensais",
+                "db_table": "dados_financeiros_mensais",
+                "indexes": [
+                    models.Index(
+                        fields=["usuario", "ativo", "mes"],
+                        name="dado_mensal_usuario_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("ativo", "mes"), name="dado_mensal_ativo_mes_unico"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(popular_dados_mensais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investimentos", "0002_dados_financeiros_mensais"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Importacao",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[("ativos", "Ativos"), ("operacoes", "Operações")],
+                        max_length=15,
+                    ),
+                ),
+                ("arquivo", models.FileField(upload_to="importacoes/%Y/%m/")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("processando", "Processando"),
+                            ("concluida", "Concluída"),
+                            ("erro", "Erro"),
+                        ],
+                        default="pendente",
+                        max_length=15,
+                    ),
+                ),
+                ("linhas_processadas", models.PositiveIntegerField(default=0)),
+                ("linhas_importadas", models.PositiveIntegerField(default=0)),
+                ("linhas_com_erro", models.PositiveIntegerField(default=0)),
+                ("erros", models.JSONField(blank=True, default=list)),
+                ("criada_em", models.DateTimeField(auto_now_add=True)),
+                ("concluida_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "usuario",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Usuário",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "importação",
+                "verbose_name_plural": "importações",
+                "db_table": "importacoes",
+            },
+        ),
+    ]
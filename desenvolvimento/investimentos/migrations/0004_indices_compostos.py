@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investimentos", "0003_importacoes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ativo",
+            index=models.Index(
+                fields=["usuario", "nome"], name="ativo_usuario_nome_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ativo",
+            index=models.Index(
+                fields=["usuario", "classe", "subclasse"],
+                name="ativo_usuario_classe_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ativo",
+            index=models.Index(
+                fields=["usuario", "banco"], name="ativo_usuario_banco_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ativo",
+            index=models.Index(
+                fields=["usuario", "data_aquisicao"], name="ativo_usuario_data_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="operacao",
+            index=models.Index(
+                fields=["ativo", "data"], name="operacao_ativo_data_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="operacao",
+            index=models.Index(
+                fields=["ativo", "tipo", "data"], name="operacao_ativo_tipo_data_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="operacao",
+            index=models.Index(
+                fields=["usuario", "data"], name="operacao_usuario_data_idx"
+            ),
+        ),
+    ]
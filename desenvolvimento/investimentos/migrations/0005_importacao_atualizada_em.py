@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investimentos", "0004_indices_compostos"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importacao",
+            name="atualizada_em",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
-from collections import defaultdict
-import json
-import os
-
-CAMINHO_JSON = "dados_financeiros.json"
+from django.db import connections, router, transaction
+from django.db.models import Count
+from collections import Counter
+from itertools import islice
+from .cache_carteira import em_cache, invalidar_carteira
+from .calculos import calcular_dados_mensais, calcular_dados_mensais_a_partir_de
+from .carteira import Carteira
 
 CLASSES_ATIVO = [
     ('Renda Fixa', 'Renda Fixa'),
@@ -19,6 +21,83 @@ SUBCLASSES_POR_CLASSE = {
 # Gerar SUBCLASSES automaticamente a partir de SUBCLASSES_POR_CLASSE
 SUBCLASSES = [(subclasse, subclasse) for _, sub_classes in SUBCLASSES_POR_CLASSE.items() for subclasse in sub_classes]
 
+# Quantidade de linhas gravadas por inserção em lote nas importações
+TAMANHO_LOTE = 1000
+
+
+def em_lotes(iteravel, tamanho):
+    """Divide um iterável em listas de até `tamanho` itens, sem materializá-lo por inteiro."""
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+
+def inserir_linhas(modelo, campos, linhas, tamanho_lote=TAMANHO_LOTE):
+    """Insere as tuplas de `linhas` (valores na ordem de `campos`) direto na tabela de `modelo`, em lotes,
+    sem instanciar os modelos. Bem mais rápido que `bulk_create` em cargas grandes, mas sem `save()`,
+    sinais nem conversões: os valores já devem ser números, textos ou datas. Cada lote é gravado em
+    sua própria transação; retorna a quantidade inserida."""
+    conexao = connections[router.db_for_write(modelo)]
+    colunas = ", ".join(conexao.ops.quote_name(modelo._meta.get_field(campo).column) for campo in campos)
+    sql = f"INSERT INTO {conexao.ops.quote_name(modelo._meta.db_table)} ({colunas}) VALUES ({', '.join(['%s'] * len(campos))})"
+    total = 0
+    for lote in em_lotes(linhas, tamanho_lote):
+        # Uma transação por lote: em modo autocommit cada linha seria confirmada separadamente
+        with transaction.atomic(using=conexao.alias), conexao.cursor() as cursor:
+            cursor.executemany(sql, lote)
+        total += len(lote)
+    return total
+
+
+class AtivoManager(models.Manager):
+    def mapa_nomes(self, usuario):
+        """Retorna o dicionário nome -> id dos ativos do usuário, carregado em uma única consulta.
+        Em nomes repetidos prevalece o ativo mais antigo, como em `.first()`."""
+        mapa = {}
+        for nome, ativo_id in self.filter(usuario=usuario).order_by("id").values_list("nome", "id"):
+            mapa.setdefault(nome, ativo_id)
+        return mapa
+
+    def facetas(self, usuario):
+        """Opções dos filtros de classe, subclasse e banco, com a quantidade de ativos do usuário em cada uma.
+        Calculadas em uma única consulta agrupada e servidas do cache enquanto os ativos do usuário não mudarem.
+        Estrutura: {"classes": [(valor, quantidade)], "subclasses": [...], "bancos": [...]}, em ordem de valor."""
+        def calcular():
+            contagens = {"classes": Counter(), "subclasses": Counter(), "bancos": Counter()}
+            grupos = self.filter(usuario=usuario).values_list("classe", "subclasse", "banco").annotate(quantidade=Count("id")).order_by()
+            for classe, subclasse, banco, quantidade in grupos:
+                contagens["classes"][classe] += quantidade
+                contagens["subclasses"][subclasse] += quantidade
+                contagens["bancos"][banco] += quantidade
+            return {campo: sorted(contagem.items()) for campo, contagem in contagens.items()}
+
+        return em_cache(usuario.id, "facetas", calcular)
+
+    def importar(self, ativos, tamanho_lote=TAMANHO_LOTE, ao_gravar_lote=None):
+        """Insere os ativos em lotes, criando também o valor inicial e o primeiro mês dos dados mensais
+        que `Ativo.save()` criaria. `ativos` pode ser um gerador; retorna a quantidade inserida.
+
+        Cada lote é gravado em sua própria transação e `ao_gravar_lote(total)` é chamado em seguida;
+        para tudo ou nada, envolva a chamada em `transaction.atomic()`."""
+        total = 0
+        for lote in em_lotes(ativos, tamanho_lote):
+            with transaction.atomic():
+                self.bulk_create(lote)
+                ValorAtivo.objects.bulk_create(
+                    ValorAtivo(ativo=ativo, data=ativo.data_aquisicao, valor=ativo.valor_inicial) for ativo in lote
+                )
+                DadoFinanceiroMensal.objects.bulk_create(
+                    DadoFinanceiroMensal(usuario_id=ativo.usuario_id, ativo=ativo, mes=mes, valor=valor, rentabilidade=rentabilidade)
+                    for ativo in lote
+                    for mes, valor, rentabilidade in calcular_dados_mensais(ativo.data_aquisicao, ativo.valor_inicial, [])
+                )
+            invalidar_carteira(lote[0].usuario_id)
+            total += len(lote)
+            if ao_gravar_lote:
+                ao_gravar_lote(total)
+        return total
+
+
 class Ativo(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuário")
     nome = models.CharField(max_length=100, verbose_name="Nome do Ativo")
@@ -29,20 +108,67 @@ class Ativo(models.Model):
     data_aquisicao = models.DateField(verbose_name="Data de Aquisição")
     observacoes = models.TextField(blank=True, null=True, default="", verbose_name="Observações")
 
+    objects = AtivoManager()
+
     class Meta:
         db_table = "ativos"  # Define explicitamente o nome da tabela
         verbose_name = "ativos"  # Nome singular para o admin
         verbose_name_plural = "ativos"  # Nome plural para o admin
+        # Listagens e filtros sempre partem do usuário
+        indexes = [
+            models.Index(fields=["usuario", "nome"], name="ativo_usuario_nome_idx"),
+            models.Index(fields=["usuario", "classe", "subclasse"], name="ativo_usuario_classe_idx"),
+            models.Index(fields=["usuario", "banco"], name="ativo_usuario_banco_idx"),
+            models.Index(fields=["usuario", "data_aquisicao"], name="ativo_usuario_data_idx"),
+        ]
 
     def save(self, *args, **kwargs):
+            # Normaliza a data (ex.: texto vindo da importação de CSV) antes de calcular os dados mensais
+            self.data_aquisicao = self._meta.get_field('data_aquisicao').to_python(self.data_aquisicao)
             super().save(*args, **kwargs)
             ValorAtivo.objects.get_or_create(ativo=self, data=self.data_aquisicao, defaults={'valor': self.valor_inicial})
+            # Valor inicial e data de aquisição alimentam o primeiro mês dos dados mensais
+            DadoFinanceiroMensal.objects.recalcular(self)
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        invalidar_carteira(self.usuario_id)
+        return resultado
 
     def __str__(self):
         return f"{self.nome}"
 
 
 
+class OperacaoManager(models.Manager):
+    def importar(self, operacoes, tamanho_lote=TAMANHO_LOTE, ao_gravar_lote=None):
+        """Insere as operações em lotes e recalcula os dados mensais de cada ativo afetado uma única vez,
+        a partir do mês da operação mais antiga importada para ele.
+        `operacoes` pode ser um gerador; retorna a quantidade inserida.
+
+        Cada lote é gravado em sua própria transação e `ao_gravar_lote(total)` é chamado em seguida;
+        para tudo ou nada, envolva a chamada em `transaction.atomic()`. Mesmo que um lote falhe,
+        os ativos dos lotes já gravados são recalculados."""
+        primeiras_datas = {}
+        total = 0
+
+        try:
+            for lote in em_lotes(operacoes, tamanho_lote):
+                with transaction.atomic():
+                    self.bulk_create(lote)
+                for operacao in lote:
+                    if operacao.ativo_id not in primeiras_datas or operacao.data < primeiras_datas[operacao.ativo_id]:
+                        primeiras_datas[operacao.ativo_id] = operacao.data
+                total += len(lote)
+                if ao_gravar_lote:
+                    ao_gravar_lote(total)
+        finally:
+            for ativo in Ativo.objects.filter(pk__in=primeiras_datas):
+                DadoFinanceiroMensal.objects.recalcular(ativo, a_partir_de=primeiras_datas[ativo.pk])
+
+        return total
+
+
 class Operacao(models.Model):
     TIPO_OPERACAO = [
         ('compra', 'Compra'),
@@ -56,100 +182,54 @@ class Operacao(models.Model):
     data = models.DateField()
     ativo = models.ForeignKey(Ativo, on_delete=models.CASCADE, related_name='operacoes')
 
+    objects = OperacaoManager()
+
     class Meta:
         db_table = "operacoes"
         verbose_name = "operação"
         verbose_name_plural = "operações"
-
-    def atualizar_valores_e_rentabilidades(self):
-        """Recalcula os valores do ativo e as rentabilidades simultaneamente e armazena tudo em um JSON.
-        Estrutura do JSON: usuario -> ativo -> valores[mês], rentabilidades[mês]"""
-
-        # Carregar JSON existente para evitar sobrescrita
-        if os.path.exists(CAMINHO_JSON):
-            with open(CAMINHO_JSON, "r", encoding="utf-8") as f:
-                try:
-                    dados_financeiros = json.load(f)
-                except json.JSONDecodeError:
-                    dados_financeiros = {}
-        else:
-            dados_financeiros = {}
-
-        usuario = str(self.usuario.id)
-        ativo = str(self.ativo.id)
-
-        # Criar estrutura para o usuário e ativo, caso não existam
-        if usuario not in dados_financeiros:
-            dados_financeiros[usuario] = {}
-
-        if ativo not in dados_financeiros[usuario]:
-            dados_financeiros[usuario][ativo] = {"valor": {}, "rentabilidade": {}}
-
-        # Dicionários para armazenar valores mensais
-        atualizacoes_mensais = defaultdict(float)
-        compras_vendas_mensais = defaultdict(float)
-        rentabilidade_mensal = defaultdict(float)
-
-        primeiro_mes = self.ativo.data_aquisicao.replace(day=1)
-
-        # O primeiro mês recebe o valor inicial como atualização
-        atualizacoes_mensais[primeiro_mes] = float(self.ativo.valor_inicial)
-
-        # Coletar todas as atualizações, compras e vendas organizadas por mês
-        operacoes = Operacao.objects.filter(ativo=self.ativo, usuario=self.usuario).order_by("data")
-
-        for operacao in operacoes:
-            mes_operacao = operacao.data.replace(day=1)
-
-            if operacao.tipo == "atualizacao":
-                atualizacoes_mensais[mes_operacao] = float(operacao.valor)  # Atualizações substituem o valor do mês
-            elif operacao.tipo == "compra":
-                compras_vendas_mensais[mes_operacao] += float(operacao.valor)
-            elif operacao.tipo == "venda":
-                compras_vendas_mensais[mes_operacao] -= float(operacao.valor)
-
-        # Lista ordenada de meses para processamento
-        meses_ordenados = sorted(set(atualizacoes_mensais.keys()) | set(compras_vendas_mensais.keys()))
-
-        valores_por_mes = {}
-
-        # Calcular valores mensais e rentabilidades simultaneamente
-        for i in range(len(meses_ordenados)):
-            mes_operacao = meses_ordenados[i]
-
-            # Define o valor mensal considerando atualização + compras e vendas
-            atualizacoes_mensais[mes_operacao] = atualizacoes_mensais.get(mes_operacao, 0)
-            compras_vendas_mensais[mes_operacao] = compras_vendas_mensais.get(mes_operacao, 0)
-
-            valores_por_mes[mes_operacao] = atualizacoes_mensais[mes_operacao] + compras_vendas_mensais[mes_operacao]
-
-            # Calcular rentabilidade: valor do mês seguinte antes da atualização - valor do mês atual atualizado
-            if i < len(meses_ordenados) - 1:
-                mes_proximo = meses_ordenados[i + 1]
-                rentabilidade_mensal[mes_operacao] = atualizacoes_mensais[mes_proximo] - valores_por_mes[mes_operacao]
-            else:
-                rentabilidade_mensal[mes_operacao] = 0.0  # Último mês recebe rentabilidade 0
-
-            # Salvar valores e rentabilidades no JSON, garantindo que os dados sejam mantidos
-            dados_financeiros[usuario][ativo]["valor"][mes_operacao.strftime("%Y-%m")] = valores_por_mes[mes_operacao]
-            dados_financeiros[usuario][ativo]["rentabilidade"][mes_operacao.strftime("%Y-%m")] = rentabilidade_mensal[mes_operacao]
-
-        # Salvar JSON atualizado no arquivo
-        try:
-            with open(CAMINHO_JSON, "w", encoding="utf-8") as json_file:
-                json.dump(dados_financeiros, json_file, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"DEBUG: Erro ao salvar JSON de dados financeiros: {e}")
+        indexes = [
+            # Recálculo dos dados mensais: operações de um ativo em ordem de data
+            models.Index(fields=["ativo", "data"], name="operacao_ativo_data_idx"),
+            # Última atualização de cada ativo no resumo
+            models.Index(fields=["ativo", "tipo", "data"], name="operacao_ativo_tipo_data_idx"),
+            # Operações do usuário em ordem de data
+            models.Index(fields=["usuario", "data"], name="operacao_usuario_data_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda ativo e data originais para que uma edição recalcule a partir do mês afetado
+        carregados = dict(zip(field_names, values))
+        instance._original = (carregados.get("ativo_id"), carregados.get("data"))
+        return instance
+
+    def atualizar_valores_e_rentabilidades(self, a_partir_de=None):
+        """Recalcula os valores do ativo e as rentabilidades mensais a partir do mês de `a_partir_de`
+        (ou de todo o histórico) e os grava na tabela de dados mensais."""
+        DadoFinanceiroMensal.objects.recalcular(self.ativo, a_partir_de=a_partir_de)
 
     def save(self, *args, **kwargs):
-        """Salva a operação e atualiza os valores do ativo e rentabilidades."""
+        """Salva a operação e atualiza os valores do ativo e rentabilidades a partir do mês alterado."""
+        self.data = self._meta.get_field('data').to_python(self.data)
+        ativo_original, data_original = getattr(self, "_original", (None, None))
         super().save(*args, **kwargs)
-        self.atualizar_valores_e_rentabilidades()
+
+        a_partir_de = self.data
+        if ativo_original is not None and ativo_original != self.ativo_id:
+            # A operação mudou de ativo: o ativo antigo também precisa ser recalculado
+            DadoFinanceiroMensal.objects.recalcular(Ativo.objects.get(pk=ativo_original), a_partir_de=data_original)
+        elif data_original is not None:
+            a_partir_de = min(a_partir_de, data_original)
+
+        self.atualizar_valores_e_rentabilidades(a_partir_de=a_partir_de)
+        self._original = (self.ativo_id, self.data)
 
     def delete(self, *args, **kwargs):
-        """Deleta a operação e recalcula os valores do ativo e rentabilidades."""
+        """Deleta a operação e recalcula os valores do ativo e rentabilidades a partir do mês da operação."""
         super().delete(*args, **kwargs)
-        self.atualizar_valores_e_rentabilidades()
+        self.atualizar_valores_e_rentabilidades(a_partir_de=self.data)
 
     def __str__(self):
         return f"{self.tipo.capitalize()} - R$ {self.valor} ({self.ativo.nome})"
@@ -182,7 +262,144 @@ class RentabilidadeAtivo(models.Model):
     def __str__(self):
         return f"{self.ativo.nome} - {self.data_referencia}: {self.rentabilidade_perc}%"
 
-        
 
+class DadoFinanceiroMensalManager(models.Manager):
+    def recalcular(self, ativo, a_partir_de=None):
+        """Recalcula os dados mensais de um ativo e retorna as tuplas (mes, valor, rentabilidade) gravadas.
+
+        Com `a_partir_de`, apenas o mês dessa data em diante é recalculado: o último mês já gravado
+        antes dele serve de semente e só tem sua rentabilidade atualizada. Sem semente disponível
+        (ativo nunca calculado ou alteração no primeiro mês), recalcula todo o histórico."""
+        operacoes = Operacao.objects.filter(ativo=ativo).order_by("data", "id")
+
+        if a_partir_de is not None:
+            mes_inicial = a_partir_de.replace(day=1)
+            anterior = None
+            if mes_inicial > ativo.data_aquisicao.replace(day=1):
+                anterior = (
+                    self.filter(ativo=ativo, mes__lt=mes_inicial)
+                    .order_by("-mes")
+                    .values_list("mes", "valor")
+                    .first()
+                )
+            if anterior is not None:
+                operacoes = operacoes.filter(data__gte=mes_inicial).values_list("tipo", "valor", "data")
+                dados = calcular_dados_mensais_a_partir_de(anterior, operacoes)
+                self.gravar(ativo, dados, a_partir_de=anterior[0])
+                return dados
+
+        dados = calcular_dados_mensais(ativo.data_aquisicao, ativo.valor_inicial, operacoes.values_list("tipo", "valor", "data"))
+        self.gravar(ativo, dados)
+        return dados
+
+    def gravar(self, ativo, dados, a_partir_de=None):
+        """Substitui os dados mensais de um ativo, mantendo intactas as linhas dos demais ativos.
+        `dados` é uma lista de tuplas (mes, valor, rentabilidade); com `a_partir_de`, apenas os
+        meses a partir dessa data são substituídos."""
+        with transaction.atomic():
+            # Remove meses que deixaram de existir (ex.: operação excluída)
+            obsoletos = self.filter(ativo=ativo)
+            if a_partir_de is not None:
+                obsoletos = obsoletos.filter(mes__gte=a_partir_de)
+            obsoletos.exclude(mes__in=[mes for mes, _, _ in dados]).delete()
+            self.bulk_create(
+                [
+                    DadoFinanceiroMensal(usuario_id=ativo.usuario_id, ativo=ativo, mes=mes, valor=valor, rentabilidade=rentabilidade)
+                    for mes, valor, rentabilidade in dados
+                ],
+                update_conflicts=True,
+                unique_fields=["ativo", "mes"],
+                update_fields=["valor", "rentabilidade"],
+            )
+        invalidar_carteira(ativo.usuario_id)
+
+    def do_usuario(self, usuario, ativos=None):
+        """Retorna os dados mensais do usuário agrupados por ativo.
+        Estrutura: ativo_id -> {"valor": {mes: valor}, "rentabilidade": {mes: rentabilidade}}, com meses em ordem."""
+        linhas = self.filter(usuario_id=usuario.id)
+        if ativos is not None:
+            linhas = linhas.filter(ativo__in=ativos)
+
+        dados_financeiros = {}
+        for ativo_id, mes, valor, rentabilidade in linhas.order_by("ativo_id", "mes").values_list("ativo_id", "mes", "valor", "rentabilidade"):
+            dados_ativo = dados_financeiros.setdefault(ativo_id, {"valor": {}, "rentabilidade": {}})
+            dados_ativo["valor"][mes] = valor
+            dados_ativo["rentabilidade"][mes] = rentabilidade
+        return dados_financeiros
+
+    def da_carteira(self, usuario):
+        """Retorna a `Carteira` com os dados mensais de todos os ativos do usuário,
+        servida do cache enquanto a carteira não mudar."""
+        linhas = self.filter(usuario_id=usuario.id).values_list("ativo_id", "mes", "valor", "rentabilidade")
+        return em_cache(usuario.id, "carteira", lambda: Carteira.de_linhas(linhas))
+
+
+class DadoFinanceiroMensal(models.Model):
+    """Valor e rentabilidade de um ativo em um mês, derivados das operações."""
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuário")
+    ativo = models.ForeignKey(Ativo, on_delete=models.CASCADE, related_name='dados_mensais')
+    mes = models.DateField(verbose_name="Mês de Referência")
+    valor = models.FloatField()
+    rentabilidade = models.FloatField()
+
+    objects = DadoFinanceiroMensalManager()
 
+    class Meta:
+        db_table = "dados_financeiros_mensais"
+        verbose_name = "dado financeiro mensal"
+        verbose_name_plural = "dados financeiros mensais"
+        constraints = [
+            models.UniqueConstraint(fields=["ativo", "mes"], name="dado_mensal_ativo_mes_unico"),
+        ]
+        indexes = [
+            models.Index(fields=["usuario", "ativo", "mes"], name="dado_mensal_usuario_idx"),
+        ]
 
+    def __str__(self):
+        return f"{self.ativo.nome} - {self.mes:%Y-%m}: R$ {self.valor:.2f}"
+
+
+class Importacao(models.Model):
+    """Importação de CSV enviada pelo usuário e processada em segundo plano."""
+    ATIVOS = "ativos"
+    OPERACOES = "operacoes"
+    TIPO_IMPORTACAO = [
+        (ATIVOS, 'Ativos'),
+        (OPERACOES, 'Operações'),
+    ]
+
+    PENDENTE = "pendente"
+    PROCESSANDO = "processando"
+    CONCLUIDA = "concluida"
+    ERRO = "erro"
+    STATUS_IMPORTACAO = [
+        (PENDENTE, 'Pendente'),
+        (PROCESSANDO, 'Processando'),
+        (CONCLUIDA, 'Concluída'),
+        (ERRO, 'Erro'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuário")
+    tipo = models.CharField(max_length=15, choices=TIPO_IMPORTACAO)
+    arquivo = models.FileField(upload_to="importacoes/%Y/%m/")
+    status = models.CharField(max_length=15, choices=STATUS_IMPORTACAO, default=PENDENTE)
+    linhas_processadas = models.PositiveIntegerField(default=0)
+    linhas_importadas = models.PositiveIntegerField(default=0)
+    linhas_com_erro = models.PositiveIntegerField(default=0)
+    erros = models.JSONField(default=list, blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    # Atualizada pelo worker ao assumir a importação e a cada lote gravado (ver processar_importacoes)
+    atualizada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "importacoes"
+        verbose_name = "importação"
+        verbose_name_plural = "importações"
+
+    @property
+    def em_andamento(self):
+        return self.status in (self.PENDENTE, self.PROCESSANDO)
+
+    def __str__(self):
+        return f"Importação de {self.get_tipo_display()} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+# Quantidade padrão de linhas por página das listagens
+TAMANHO_PAGINA = 50
+
+# Faixa dos ids aceitos nos cursores (inteiro de 64 bits com sinal, como nos bancos de dados)
+PK_MINIMO, PK_MAXIMO = -2**63, 2**63 - 1
+
+
+def codificar_cursor(valor, pk):
+    """Codifica a posição (valor da ordenação, id) de uma linha para uso na URL."""
+    texto = json.dumps([str(valor), pk])
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, campo):
+    """Decodifica um cursor gerado por `codificar_cursor`, convertendo o valor para o tipo do `campo`.
+    Retorna None se o cursor for inválido."""
+    try:
+        valor, pk = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        valor = campo.to_python(valor)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+        return None
+    # None não pode ser usado nos filtros, e um id que não seja inteiro de 64 bits (ex.: 1e400, que o JSON
+    # lê como infinito) causaria OverflowError ao montar a consulta
+    if valor is None or type(pk) is not int or not PK_MINIMO <= pk <= PK_MAXIMO:
+        return None
+    return valor, pk
+
+
+class PaginaKeyset:
+    """Página de uma listagem paginada por busca, com as URLs das páginas vizinhas (ou None)."""
+
+    def __init__(self, itens, url_anterior, url_proxima):
+        self.itens = itens
+        self.url_anterior = url_anterior
+        self.url_proxima = url_proxima
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def has_other_pages(self):
+        return bool(self.url_anterior or self.url_proxima)
+
+
+class PaginacaoKeysetMixin:
+    """Paginação por busca (keyset) para ListViews, com ordenação e filtro de período no servidor.
+
+    A página seguinte é obtida a partir da última linha exibida, filtrando por (campo da ordenação, id)
+    em vez de usar OFFSET, de modo que o custo de cada página não cresce com o tamanho da tabela.
+    Parâmetros da URL: "ordem" (chave de `ordenacoes`, com "-" para ordem decrescente), "de" e "ate"
+    (período sobre `campo_data`) e "apos"/"antes" (cursores das páginas vizinhas)."""
+
+    paginate_by = TAMANHO_PAGINA
+    ordenacoes = {}  # Valor do parâmetro "ordem" -> campo do modelo
+    ordem_padrao = None
+    campo_data = None
+
+    def get_ordem(self):
+        ordem = self.request.GET.get("ordem", "")
+        return ordem if ordem.lstrip("-") in self.ordenacoes else self.ordem_padrao
+
+    def filtrar_periodo(self, queryset):
+        """Aplica os filtros "de" e "ate" sobre `campo_data`, ignorando datas inválidas."""
+        for parametro, lookup in (("de", "gte"), ("ate", "lte")):
+            try:
+                data = parse_date(self.request.GET.get(parametro, ""))
+            except ValueError:
+                data = None
+            if data:
+                queryset = queryset.filter(**{f"{self.campo_data}__{lookup}": data})
+        return queryset
+
+    def url_com_cursor(self, parametro, item, campo):
+        parametros = self.request.GET.copy()
+        parametros.pop("apos", None)
+        parametros.pop("antes", None)
+        parametros[parametro] = codificar_cursor(getattr(item, campo), item.pk)
+        return "?" + parametros.urlencode()
+
+    def paginate_queryset(self, queryset, page_size):
+        ordem = self.get_ordem()
+        decrescente = ordem.startswith("-")
+        campo = self.ordenacoes[ordem.lstrip("-")]
+        modelo_campo = queryset.model._meta.get_field(campo)
+
+        apos = decodificar_cursor(self.request.GET.get("apos", ""), modelo_campo)
+        antes = None if apos else decodificar_cursor(self.request.GET.get("antes", ""), modelo_campo)
+
+        # Para voltar uma página, percorre a ordem inversa a partir da primeira linha exibida
+        inverter = antes is not None
+        para_frente = decrescente == inverter
+        sinal = "" if para_frente else "-"
+        queryset = queryset.order_by(f"{sinal}{campo}", f"{sinal}pk")
+
+        cursor = apos or antes
+        if cursor:
+            valor, pk = cursor
+            lookup = "gt" if para_frente else "lt"
+            queryset = queryset.filter(Q(**{f"{campo}__{lookup}": valor}) | Q(**{campo: valor, f"pk__{lookup}": pk}))
+
+        # Uma linha a mais indica se existe outra página na mesma direção
+        itens = list(queryset[: page_size + 1])
+        tem_mais = len(itens) > page_size
+        itens = itens[:page_size]
+        if inverter:
+            itens.reverse()
+
+        tem_anterior = tem_mais if inverter else cursor is not None
+        tem_proxima = True if inverter else tem_mais
+        pagina = PaginaKeyset(
+            itens,
+            self.url_com_cursor("antes", itens[0], campo) if itens and tem_anterior else None,
+            self.url_com_cursor("apos", itens[-1], campo) if itens and tem_proxima else None,
+        )
+        return None, pagina, itens, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["ordem"] = self.get_ordem()
+        return context
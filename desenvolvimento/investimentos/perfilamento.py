@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+# Perfil da requisição em andamento no contexto atual (None fora de requisições perfiladas)
+_perfil_atual = ContextVar("perfil_atual", default=None)
+
+# Últimas PERFILAMENTO_HISTORICO requisições perfiladas neste processo, das mais antigas às mais recentes
+_historico = None
+_trava_historico = threading.Lock()
+
+
+class PerfilRequisicao:
+    """Tempos de uma requisição: total, consultas SQL e etapas medidas com `etapa` (em segundos)."""
+
+    def __init__(self, metodo, caminho):
+        self.metodo = metodo
+        self.caminho = caminho
+        self.rota = caminho
+        self.status = None
+        self.inicio = time.time()
+        self.total = 0.0
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.etapas = {}  # Nome -> [tempo, quantidade de medições]
+
+    def adicionar(self, nome, duracao):
+        acumulado = self.etapas.setdefault(nome, [0.0, 0])
+        acumulado[0] += duracao
+        acumulado[1] += 1
+
+    @property
+    def total_ms(self):
+        return self.total * 1000
+
+    @property
+    def tempo_sql_ms(self):
+        return self.tempo_sql * 1000
+
+    def etapas_ms(self):
+        return [(nome, duracao * 1000) for nome, (duracao, _) in self.etapas.items()]
+
+    def server_timing(self):
+        """Valor do cabeçalho Server-Timing, com as durações em milissegundos."""
+        metricas = [f'sql;dur={self.tempo_sql * 1000:.1f};desc="{self.consultas} consultas"']
+        metricas += [f"{nome};dur={duracao * 1000:.1f}" for nome, (duracao, _) in self.etapas.items()]
+        metricas.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(metricas)
+
+
+@contextmanager
+def etapa(nome):
+    """Soma ao perfil da requisição atual o tempo gasto no bloco, sob `nome`. Fora de uma requisição
+    perfilada (ex.: perfilamento desligado ou tarefas em segundo plano) não mede nada."""
+    perfil = _perfil_atual.get()
+    if perfil is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        perfil.adicionar(nome, time.perf_counter() - inicio)
+
+
+def registrar(perfil):
+    global _historico
+    with _trava_historico:
+        if _historico is None:
+            _historico = deque(maxlen=settings.PERFILAMENTO_HISTORICO)
+        _historico.append(perfil)
+
+
+def requisicoes_registradas():
+    with _trava_historico:
+        return list(_historico or [])
+
+
+def limpar_historico():
+    global _historico
+    with _trava_historico:
+        _historico = None
+
+
+def estatisticas_por_rota(perfis):
+    """Agrupa os perfis por método e rota, das rotas mais lentas (maior tempo máximo) às mais rápidas.
+    Tempos em milissegundos."""
+    rotas = {}
+    for perfil in perfis:
+        rotas.setdefault((perfil.metodo, perfil.rota), []).append(perfil)
+
+    estatisticas = []
+    for (metodo, rota), lista in rotas.items():
+        totais = sorted(perfil.total * 1000 for perfil in lista)
+        estatisticas.append({
+            "metodo": metodo,
+            "rota": rota,
+            "quantidade": len(lista),
+            "media": sum(totais) / len(totais),
+            "p95": totais[min(len(totais) - 1, int(len(totais) * 0.95))],
+            "maximo": totais[-1],
+            "consultas": sum(perfil.consultas for perfil in lista) / len(lista),
+            "sql": sum(perfil.tempo_sql for perfil in lista) * 1000 / len(lista),
+        })
+    return sorted(estatisticas, key=lambda rota: rota["maximo"], reverse=True)
+
+
+class PerfilamentoMiddleware:
+    """Mede o tempo total de cada requisição, as consultas SQL (quantidade e tempo) e as etapas marcadas
+    com `etapa` (arquivo de índices, cache da carteira, buscas externas e renderização dos templates).
+
+    Os tempos são enviados no cabeçalho Server-Timing e guardados em memória para a página de
+    perfilamento. Ativado pela configuração PERFILAMENTO; desligado, o middleware não é carregado."""
+
+    def __init__(self, get_response):
+        if not settings.PERFILAMENTO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        perfil = PerfilRequisicao(request.method, request.path)
+        token = _perfil_atual.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self.medir_consulta):
+                response = self.get_response(request)
+        finally:
+            perfil.total = time.perf_counter() - inicio
+            _perfil_atual.reset(token)
+
+        # Agrupa as requisições pela rota (ex.: "/ativo/<int:pk>/") em vez do caminho
+        if request.resolver_match is not None:
+            perfil.rota = "/" + request.resolver_match.route
+        perfil.status = response.status_code
+        response["Server-Timing"] = perfil.server_timing()
+        registrar(perfil)
+        return response
+
+    def medir_consulta(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            perfil = _perfil_atual.get()
+            if perfil is not None:
+                perfil.consultas += 1
+                perfil.tempo_sql += time.perf_counter() - inicio
+
+    def process_template_response(self, request, response):
+        # A renderização acontece logo depois deste método; o callback marca o fim dela
+        perfil = _perfil_atual.get()
+        inicio = time.perf_counter()
+
+        def fim_da_renderizacao(response):
+            if perfil is not None:
+                perfil.adicionar("template", time.perf_counter() - inicio)
+
+        response.add_post_render_callback(fim_da_renderizacao)
+        return response
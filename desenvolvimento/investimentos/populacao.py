@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth.models import User
+
+from .dados_sinteticos import CABECALHO_ATIVOS, CABECALHO_OPERACOES, csv_em_memoria, gerar_carteira
+from .importacao import ResultadoImportacao, importar_ativos, ler_operacoes
+from .models import Ativo, Operacao, TAMANHO_LOTE, inserir_linhas
+from .reconstrucao import reconstruir_dados
+
+
+class ResultadoPopulacao:
+    """Contadores e duração (s) de uma população do banco."""
+
+    def __init__(self):
+        self.usuarios = []
+        self.ativos = 0
+        self.operacoes = 0
+        self.meses = 0
+        self.erros = []
+        self.duracao = 0.0
+
+    def por_segundo(self, quantidade):
+        return quantidade / self.duracao if self.duracao else 0.0
+
+
+def recriar_usuario(nome, senha):
+    """Exclui o usuário `nome`, se existir, com todos os seus dados, e o cria novamente com `senha`."""
+    User.objects.filter(username=nome).delete()
+    usuario = User(username=nome, first_name=nome.capitalize(), last_name="User")
+    usuario.set_password(senha)
+    usuario.save()
+    return usuario
+
+
+def carteiras_sinteticas(parametros, quantidade, semente=None):
+    """Gera `quantidade` carteiras sintéticas e retorna seus CSVs de (ativos, operações) em memória.
+    Cada carteira tem sua própria semente, derivada de `semente`, como em gerar_csvs.py."""
+    for numero in range(1, quantidade + 1):
+        ativos, operacoes = gerar_carteira(parametros, None if semente is None else f"{semente}-{numero}")
+        yield csv_em_memoria(CABECALHO_ATIVOS, ativos), csv_em_memoria(CABECALHO_OPERACOES, operacoes)
+
+
+def carregar_operacoes(usuario, arquivo, tamanho_lote=TAMANHO_LOTE):
+    """Grava as operações de um CSV direto na tabela, em lotes, sem recalcular os dados mensais
+    dos ativos (ver `reconstruir_dados`). Valida as linhas como `importar_operacoes`."""
+    resultado = ResultadoImportacao()
+    linhas = (
+        (usuario.id, ativo_id, tipo, valor, data)
+        for ativo_id, tipo, valor, data in ler_operacoes(arquivo, Ativo.objects.mapa_nomes(usuario), resultado)
+    )
+    resultado.importadas = inserir_linhas(Operacao, ["usuario", "ativo", "tipo", "valor", "data"], linhas, tamanho_lote)
+    return resultado
+
+
+def popular(carteiras, senha, tamanho_lote=TAMANHO_LOTE, processos=None, progresso=None):
+    """Recria os usuários de `carteiras` (pares nome -> (CSV de ativos, CSV de operações), arquivos binários)
+    e grava seus ativos e operações em lotes, sem recalcular nada durante a carga. Os dados mensais
+    de todos os usuários são calculados uma única vez ao final, com `reconstruir_dados`.
+
+    `progresso(mensagem)` é chamado após a carga de cada usuário e ao fim do cálculo. Retorna um `ResultadoPopulacao`."""
+    resultado = ResultadoPopulacao()
+    inicio = time.perf_counter()
+
+    for nome, (arquivo_ativos, arquivo_operacoes) in carteiras:
+        usuario = recriar_usuario(nome, senha)
+        ativos = importar_ativos(usuario, arquivo_ativos, tamanho_lote)
+        operacoes = carregar_operacoes(usuario, arquivo_operacoes, tamanho_lote)
+
+        resultado.usuarios.append(usuario)
+        resultado.ativos += ativos.importadas
+        resultado.operacoes += operacoes.importadas
+        resultado.erros += [f"{nome}: {erro}" for erro in ativos.mensagens_erro() + operacoes.mensagens_erro()]
+        if operacoes.ativos_nao_encontrados:
+            resultado.erros.append(f"{nome}: {operacoes.mensagem_ativos_nao_encontrados()}")
+        if progresso:
+            progresso(f"{nome}: {ativos.importadas} ativos e {operacoes.importadas} operações carregados.")
+
+    reconstrucao = reconstruir_dados(resultado.usuarios, processos)
+    resultado.meses = reconstrucao.meses
+    resultado.duracao = time.perf_counter() - inicio
+    if progresso:
+        progresso(f"{reconstrucao.meses} meses calculados em {reconstrucao.duracao:.1f} s.")
+    return resultado
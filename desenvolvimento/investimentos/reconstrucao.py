@@ -0,0 +1,124 @@
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+
+from .cache_carteira import invalidar_carteira
+from .calculos import calcular_lote
+from .models import Ativo, DadoFinanceiroMensal, Operacao, em_lotes, inserir_linhas
+
+# Ativos por lote de trabalho enviado aos processos
+TAMANHO_LOTE_RECONSTRUCAO = 200
+
+
+class ResultadoReconstrucao:
+    """Contadores e duração (s) de uma reconstrução dos dados mensais."""
+
+    def __init__(self):
+        self.usuarios = set()
+        self.ativos = 0
+        self.operacoes = 0
+        self.meses = 0
+        self.duracao = 0.0
+
+    def por_segundo(self, quantidade):
+        return quantidade / self.duracao if self.duracao else 0.0
+
+
+def carregar_lote(ativo_ids):
+    """Lê do banco os ativos e as operações de um lote, no formato de `calcular_lote`."""
+    operacoes = defaultdict(list)
+    consulta = (
+        Operacao.objects.filter(ativo_id__in=ativo_ids)
+        .order_by("ativo_id", "data", "id")
+        .values_list("ativo_id", "tipo", "valor", "data")
+    )
+    for ativo_id, tipo, valor, data in consulta:
+        operacoes[ativo_id].append((tipo, float(valor), data))
+
+    ativos = Ativo.objects.filter(id__in=ativo_ids).order_by("id").values_list("id", "usuario_id", "data_aquisicao", "valor_inicial")
+    return [
+        (ativo_id, usuario_id, data_aquisicao, float(valor_inicial), operacoes[ativo_id])
+        for ativo_id, usuario_id, data_aquisicao, valor_inicial in ativos
+    ]
+
+
+def gravar_lote(calculados):
+    """Substitui, em uma transação, os dados mensais dos ativos de um lote pelos recalculados."""
+    with transaction.atomic():
+        DadoFinanceiroMensal.objects.filter(ativo_id__in=[ativo_id for ativo_id, _, _ in calculados]).delete()
+        inserir_linhas(
+            DadoFinanceiroMensal,
+            ["usuario", "ativo", "mes", "valor", "rentabilidade"],
+            (
+                (usuario_id, ativo_id, mes, valor, rentabilidade)
+                for ativo_id, usuario_id, dados in calculados
+                for mes, valor, rentabilidade in dados
+            ),
+        )
+
+
+def _em_paralelo(executor, funcao, itens, limite):
+    """Como `executor.map`, mas com no máximo `limite` itens enviados e ainda sem resultado,
+    para que os lotes lidos do banco não se acumulem na memória."""
+    pendentes = deque()
+    for item in itens:
+        pendentes.append(executor.submit(funcao, item))
+        if len(pendentes) >= limite:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+
+def calcular_em_lotes(ativo_ids, processos=None, tamanho_lote=TAMANHO_LOTE_RECONSTRUCAO, ao_carregar=None):
+    """Lê os ativos em lotes de `tamanho_lote` e gera, na mesma ordem, os dados mensais de cada lote
+    recalculados a partir das operações (ver `calcular_lote`). O cálculo é distribuído entre `processos`
+    processos (por padrão, um por CPU; com 1, tudo roda no processo atual).
+    `ao_carregar(lote)` é chamado com cada lote lido do banco."""
+    def carregar(ids):
+        lote = carregar_lote(ids)
+        if ao_carregar:
+            ao_carregar(lote)
+        return lote
+
+    lotes = map(carregar, em_lotes(ativo_ids, tamanho_lote))
+    processos = processos or os.cpu_count() or 1
+    if processos == 1:
+        yield from map(calcular_lote, lotes)
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            yield from _em_paralelo(executor, calcular_lote, lotes, limite=2 * processos)
+
+
+def reconstruir_dados(usuarios=None, processos=None, tamanho_lote=TAMANHO_LOTE_RECONSTRUCAO, progresso=None):
+    """Recalcula do zero os dados mensais de todos os ativos dos `usuarios` (ou de todos os usuários)
+    a partir das operações, substituindo os gravados.
+
+    O processo atual lê os lotes de ativos do banco e grava os resultados em lote; o cálculo é
+    distribuído entre `processos` processos (ver `calcular_em_lotes`).
+    `progresso(resultado)` é chamado após cada lote gravado. Retorna um `ResultadoReconstrucao`."""
+    resultado = ResultadoReconstrucao()
+    inicio = time.perf_counter()
+
+    ativos = Ativo.objects.all() if usuarios is None else Ativo.objects.filter(usuario__in=usuarios)
+    ativo_ids = list(ativos.order_by("id").values_list("id", flat=True))
+
+    def contar_operacoes(lote):
+        resultado.operacoes += sum(len(operacoes) for _, _, _, _, operacoes in lote)
+
+    for calculados in calcular_em_lotes(ativo_ids, processos, tamanho_lote, ao_carregar=contar_operacoes):
+        gravar_lote(calculados)
+        resultado.usuarios.update(usuario_id for _, usuario_id, _ in calculados)
+        resultado.ativos += len(calculados)
+        resultado.meses += sum(len(dados) for _, _, dados in calculados)
+        resultado.duracao = time.perf_counter() - inicio
+        if progresso:
+            progresso(resultado)
+
+    # Os dados em cache das carteiras reconstruídas ficam obsoletos
+    for usuario_id in resultado.usuarios:
+        invalidar_carteira(usuario_id)
+    resultado.duracao = time.perf_counter() - inicio
+    return resultado
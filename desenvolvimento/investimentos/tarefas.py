@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .importacao import importar_ativos, importar_operacoes
+from .models import Importacao
+from .reconstrucao import reconstruir_dados
+
+logger = logging.getLogger(__name__)
+
+# Tempo sem gravar um lote após o qual uma importação em processamento é considerada abandonada
+# (ex.: worker encerrado por um reinício ou por falta de memória)
+TEMPO_IMPORTACAO_ABANDONADA = timedelta(minutes=15)
+
+# Um único worker por processo: as importações de um mesmo processo são executadas em fila,
+# sem disputar a gravação no banco de dados com as requisições web
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="importacao")
+
+
+def agendar_importacao(importacao):
+    """Envia a importação para o worker local assim que a transação atual for confirmada."""
+    transaction.on_commit(lambda: _executor.submit(_executar_em_thread, importacao.pk))
+
+
+def _executar_em_thread(importacao_id):
+    try:
+        processar_importacao(importacao_id)
+    except Exception:
+        logger.exception("Falha ao processar a importação %s", importacao_id)
+    finally:
+        connection.close()  # Cada thread abre sua própria conexão com o banco
+
+
+def processar_importacao(importacao_id):
+    """Executa uma importação pendente, atualizando o progresso no banco a cada lote gravado.
+    Retorna False se a importação já tiver sido assumida por outro worker."""
+    assumida = Importacao.objects.filter(pk=importacao_id, status=Importacao.PENDENTE).update(
+        status=Importacao.PROCESSANDO, atualizada_em=timezone.now()
+    )
+    if not assumida:
+        return False
+
+    importacao = Importacao.objects.select_related("usuario").get(pk=importacao_id)
+    importar = importar_ativos if importacao.tipo == Importacao.ATIVOS else importar_operacoes
+
+    def progresso(resultado):
+        Importacao.objects.filter(pk=importacao_id).update(
+            linhas_processadas=resultado.linhas_processadas,
+            linhas_importadas=resultado.importadas,
+            linhas_com_erro=resultado.linhas_com_erro,
+            atualizada_em=timezone.now(),
+        )
+
+    try:
+        with importacao.arquivo.open("rb") as arquivo:
+            resultado = importar(importacao.usuario, arquivo, progresso=progresso)
+    except Exception as e:
+        logger.exception("Erro na importação %s", importacao_id)
+        importacao.refresh_from_db(fields=["linhas_processadas", "linhas_importadas", "linhas_com_erro"])
+        importacao.status = Importacao.ERRO
+        importacao.erros = [f"Erro ao processar o CSV: {e}"]
+    else:
+        importacao.status = Importacao.CONCLUIDA
+        importacao.linhas_processadas = resultado.linhas_processadas
+        importacao.linhas_importadas = resultado.importadas
+        importacao.linhas_com_erro = resultado.linhas_com_erro
+        importacao.erros = resultado.mensagens_erro()
+        if resultado.ativos_nao_encontrados:
+            importacao.erros.append(resultado.mensagem_ativos_nao_encontrados())
+        if resultado.linhas_processadas == 0:
+            importacao.erros.append("O arquivo CSV está vazio ou mal formatado.")
+        importacao.arquivo.delete(save=False)  # O arquivo só é mantido para inspeção em caso de erro
+
+    importacao.concluida_em = timezone.now()
+    importacao.save()
+    return True
+
+
+def recuperar_importacoes_abandonadas(agora=None):
+    """Marca com erro as importações em processamento sem lotes gravados há mais de
+    TEMPO_IMPORTACAO_ABANDONADA e retorna quantas foram marcadas.
+
+    Elas não são reprocessadas, pois os lotes já gravados seriam importados de novo. Os dados mensais
+    dos usuários afetados são reconstruídos, já que o recálculo ao fim da importação não chegou a rodar."""
+    limite = (agora or timezone.now()) - TEMPO_IMPORTACAO_ABANDONADA
+    # Sem atualizada_em: assumidas antes de o campo existir
+    abandonadas = Importacao.objects.filter(Q(atualizada_em__lt=limite) | Q(atualizada_em__isnull=True), status=Importacao.PROCESSANDO)
+    marcadas, usuarios = 0, set()
+    for importacao in abandonadas.select_related("usuario"):
+        marcada = abandonadas.filter(pk=importacao.pk).update(
+            status=Importacao.ERRO,
+            concluida_em=timezone.now(),
+            erros=importacao.erros + [
+                f"O processamento foi interrompido após {importacao.linhas_importadas} linhas importadas, que foram mantidas. "
+                "Envie novamente apenas as linhas restantes do arquivo."
+            ],
+        )
+        # Um worker que terminou entre a consulta e a atualização mantém o seu resultado
+        if marcada:
+            marcadas += 1
+            usuarios.add(importacao.usuario)
+            logger.warning("Importação %s abandonada durante o processamento", importacao.pk)
+
+    if usuarios:
+        reconstruir_dados(list(usuarios), processos=1)
+    return marcadas
@@ -1,3 +1,1125 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .benchmark import Escala, comparar_medicoes, executar_benchmark
+from .cache_carteira import versao_carteira
+from .calculos import calcular_dados_mensais
+from .carteira import Carteira, indice_mes, rotulo_mes
+from .consistencia import verificar_dados
+from .dados_sinteticos import ParametrosGeracao, gerar_carteira
+from .importacao import importar_ativos, importar_operacoes
+from .indices import (
+    TEMPO_TRAVA_ABANDONADA, CurvaAcumulada, Fonte, FonteArquivo, FonteCSV, atualizar_indices, calcular_acumulado,
+    carregar_curvas, _trava_abandonada, carregar_series, obter_indices, trava_atualizacao, versao_indices,
+)
+from .models import Ativo, Operacao, DadoFinanceiroMensal, Importacao
+from .paginacao import codificar_cursor
+from .perfilamento import limpar_historico, requisicoes_registradas
+from .populacao import popular
+from .reconstrucao import reconstruir_dados
+from .tarefas import processar_importacao
+from .views import AtivoListView, OperacaoListView
+
+
+CSVS = Path(__file__).resolve().parent.parent / "csvs"
+
+
+def ler_csv(nome):
+    with open(CSVS / nome, encoding="utf-8") as f:
+        return list(csv.DictReader(f, delimiter=";"))
+
+
+class CsvsDeExemploMixin:
+    """Usuário com os ativos dos CSVs de exemplo e comparação dos dados mensais gravados com um recálculo completo."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username="teste")
+        self.criar_ativos()
+
+    def criar_ativos(self):
+        Ativo.objects.filter(usuario=self.usuario).delete()
+        for row in ler_csv("ativos.csv"):
+            Ativo.objects.create(
+                usuario=self.usuario,
+                nome=row["Nome"],
+                classe=row["Classe"],
+                subclasse=row["Subclasse"],
+                banco=row["Banco"],
+                valor_inicial=row["Valor Inicial"],
+                data_aquisicao=row["Data de Aquisição"],
+            )
+        self.ativos = {ativo.nome: ativo for ativo in Ativo.objects.filter(usuario=self.usuario)}
+
+    def importar(self, nome_csv):
+        for row in ler_csv(nome_csv):
+            Operacao.objects.create(
+                usuario=self.usuario,
+                ativo=self.ativos[row["Ativo"]],
+                tipo=row["Tipo"],
+                data=datetime.strptime(row["Data"], "%Y-%m-%d").date(),
+                valor=row["Valor"],
+            )
+
+    def assertDadosEquivalentes(self):
+        """Os dados gravados devem ser idênticos aos de um recálculo completo de cada ativo."""
+        for ativo in Ativo.objects.filter(usuario=self.usuario):
+            operacoes = Operacao.objects.filter(ativo=ativo).order_by("data", "id").values_list("tipo", "valor", "data")
+            esperado = calcular_dados_mensais(ativo.data_aquisicao, ativo.valor_inicial, operacoes)
+            gravado = list(DadoFinanceiroMensal.objects.filter(ativo=ativo).order_by("mes").values_list("mes", "valor", "rentabilidade"))
+            self.assertEqual([mes for mes, _, _ in gravado], [mes for mes, _, _ in esperado], ativo.nome)
+            for (mes, valor, rentabilidade), (_, valor_esperado, rentabilidade_esperada) in zip(gravado, esperado):
+                self.assertAlmostEqual(valor, valor_esperado, places=6, msg=f"{ativo.nome} {mes}")
+                self.assertAlmostEqual(rentabilidade, rentabilidade_esperada, places=6, msg=f"{ativo.nome} {mes}")
+
+
+class RecalculoIncrementalTests(CsvsDeExemploMixin, TestCase):
+    """Compara o recálculo incremental com o recálculo completo do histórico sobre os CSVs de exemplo."""
+
+    def test_importacao_dos_csvs(self):
+        for nome_csv in ["operacoes_short.csv", "op_IPCA.csv", "op_PTR4.csv"]:
+            with self.subTest(csv=nome_csv):
+                self.criar_ativos()
+                self.importar(nome_csv)
+                self.assertDadosEquivalentes()
+
+    def test_edicoes_e_exclusoes(self):
+        self.importar("operacoes.csv")
+        ativo = self.ativos["Ações Petrobras"]
+        operacoes = list(Operacao.objects.filter(ativo=ativo).order_by("data", "id"))
+
+        # Correção de valor no meio do histórico
+        operacao = operacoes[len(operacoes) // 2]
+        operacao.valor = 1234.56
+        operacao.save()
+        self.assertDadosEquivalentes()
+
+        # Mudança de data para um mês anterior
+        operacao = Operacao.objects.get(pk=operacoes[-3].pk)
+        operacao.data = date(2023, 4, 15)
+        operacao.save()
+        self.assertDadosEquivalentes()
+
+        # Mudança de ativo
+        operacao = Operacao.objects.get(pk=operacoes[-5].pk)
+        operacao.ativo = self.ativos["Tesouro Selic"]
+        operacao.save()
+        self.assertDadosEquivalentes()
+
+        # Exclusão que remove um mês inteiro e operação anterior à aquisição
+        for operacao in Operacao.objects.filter(ativo=ativo, data__month=6, data__year=2024):
+            operacao.delete()
+        Operacao.objects.create(usuario=self.usuario, ativo=ativo, tipo="compra", data=date(2022, 11, 3), valor=100)
+        self.assertDadosEquivalentes()
+
+    def test_correcao_do_ultimo_mes_recalcula_dois_meses(self):
+        self.importar("op_IPCA.csv")
+        ativo = self.ativos["Tesouro IPCA+"]
+        ultima = Operacao.objects.filter(ativo=ativo, tipo="atualizacao").latest("data")
+        penultimo_mes = DadoFinanceiroMensal.objects.filter(ativo=ativo).order_by("-mes")[1].mes
+
+        ultima.valor += 10
+        ultima.save()
+
+        dados = DadoFinanceiroMensal.objects.recalcular(ativo, a_partir_de=ultima.data)
+        self.assertEqual([mes for mes, _, _ in dados], [penultimo_mes, ultima.data.replace(day=1)])
+        self.assertDadosEquivalentes()
+
+
+class ImportacaoTests(CsvsDeExemploMixin, TestCase):
+    """As importações de CSV devem gravar em lotes, em segundo plano, com os mesmos dados mensais de um recálculo completo."""
+
+    def test_importacao_em_segundo_plano_pela_view(self):
+        self.client.force_login(self.usuario)
+        arquivo = SimpleUploadedFile("operacoes.csv", (CSVS / "operacoes.csv").read_bytes())
+
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            resposta = self.client.post("/importar-operacoes/", {"csv_file": arquivo})
+            importacao = Importacao.objects.get(usuario=self.usuario)
+            self.assertRedirects(resposta, f"/importacao/{importacao.pk}/")
+            self.assertEqual(importacao.status, Importacao.PENDENTE)
+
+            # O worker é acionado no commit da transação; aqui a importação é processada diretamente
+            self.assertTrue(processar_importacao(importacao.pk))
+            self.assertFalse(processar_importacao(importacao.pk))
+
+        importacao.refresh_from_db()
+        self.assertEqual(importacao.status, Importacao.CONCLUIDA)
+        self.assertEqual(importacao.linhas_importadas, len(ler_csv("operacoes.csv")))
+        self.assertEqual(Operacao.objects.filter(usuario=self.usuario).count(), importacao.linhas_importadas)
+        self.assertDadosEquivalentes()
+        self.assertContains(self.client.get(f"/importacao/{importacao.pk}/"), "Concluída")
+
+    def test_importacao_interrompida_no_processamento(self):
+        # Worker encerrado depois de gravar alguns lotes, antes do recálculo final dos dados mensais
+        linhas = ler_csv("operacoes.csv")[:100]
+        Operacao.objects.bulk_create(
+            Operacao(usuario=self.usuario, ativo=self.ativos[row["Ativo"]], tipo=row["Tipo"], data=row["Data"], valor=row["Valor"])
+            for row in linhas
+        )
+        agora = timezone.now()
+        interrompida = Importacao.objects.create(
+            usuario=self.usuario, tipo=Importacao.OPERACOES, arquivo="operacoes.csv", status=Importacao.PROCESSANDO,
+            linhas_importadas=len(linhas), atualizada_em=agora - timedelta(hours=1),
+        )
+        em_andamento = Importacao.objects.create(
+            usuario=self.usuario, tipo=Importacao.OPERACOES, arquivo="operacoes.csv", status=Importacao.PROCESSANDO,
+            atualizada_em=agora,
+        )
+
+        call_command("processar_importacoes", stdout=io.StringIO())
+
+        interrompida.refresh_from_db()
+        self.assertEqual(interrompida.status, Importacao.ERRO)
+        self.assertIn("interrompido após 100 linhas importadas", interrompida.erros[0])
+        self.assertEqual(Importacao.objects.get(pk=em_andamento.pk).status, Importacao.PROCESSANDO)
+        # As operações gravadas são mantidas, sem duplicatas, e os dados mensais refletem todas elas
+        self.assertEqual(Operacao.objects.filter(usuario=self.usuario).count(), len(linhas))
+        self.assertDadosEquivalentes()
+
+    def test_importacao_em_lotes_pequenos(self):
+        conteudo = (CSVS / "operacoes.csv").read_bytes() + "Ativo Inexistente;compra;2024-01-01;10\n".encode()
+        arquivo = SimpleUploadedFile("operacoes.csv", conteudo)
+
+        resultado = importar_operacoes(self.usuario, arquivo, tamanho_lote=50)
+
+        self.assertEqual(resultado.importadas, len(ler_csv("operacoes.csv")))
+        self.assertEqual(resultado.ativos_nao_encontrados, {"Ativo Inexistente": 1})
+        self.assertDadosEquivalentes()
+
+    def test_importacao_de_ativos_cria_primeiro_mes(self):
+        Ativo.objects.filter(usuario=self.usuario).delete()
+        arquivo = SimpleUploadedFile("ativos.csv", (CSVS / "ativos.csv").read_bytes())
+
+        resultado = importar_ativos(self.usuario, arquivo, tamanho_lote=3)
+
+        self.assertEqual(resultado.importadas, len(ler_csv("ativos.csv")))
+        self.assertEqual(DadoFinanceiroMensal.objects.filter(usuario=self.usuario).count(), resultado.importadas)
+        self.ativos = {ativo.nome: ativo for ativo in Ativo.objects.filter(usuario=self.usuario)}
+        self.importar("op_IPCA.csv")
+        self.assertDadosEquivalentes()
+
+
+class ReconstrucaoTests(CsvsDeExemploMixin, TestCase):
+    """A reconstrução em paralelo deve corrigir os dados mensais dos usuários selecionados, e apenas deles."""
+
+    def test_reconstrucao_dos_dados_mensais(self):
+        self.importar("operacoes.csv")
+        outro = User.objects.create(username="outro")
+        ativo_outro = Ativo.objects.create(
+            usuario=outro, nome="CDB", classe="Renda Fixa", subclasse="CDB", banco="Banco",
+            valor_inicial=1000, data_aquisicao=date(2023, 1, 10),
+        )
+
+        # Dados mensais corrompidos: valores errados, meses faltando e meses a mais
+        DadoFinanceiroMensal.objects.update(valor=0, rentabilidade=0)
+        DadoFinanceiroMensal.objects.filter(usuario=self.usuario, mes__month=6).delete()
+        DadoFinanceiroMensal.objects.create(usuario=self.usuario, ativo=self.ativos["Ações Vale"], mes=date(2030, 1, 1), valor=1, rentabilidade=1)
+        versao = versao_carteira(self.usuario.id)
+
+        for processos in (1, 2):
+            with self.subTest(processos=processos):
+                resultado = reconstruir_dados([self.usuario], processos=processos, tamanho_lote=3)
+                self.assertDadosEquivalentes()
+                self.assertEqual(resultado.usuarios, {self.usuario.id})
+                self.assertEqual(resultado.ativos, len(self.ativos))
+                self.assertEqual(resultado.operacoes, Operacao.objects.filter(usuario=self.usuario).count())
+                self.assertEqual(resultado.meses, DadoFinanceiroMensal.objects.filter(usuario=self.usuario).count())
+
+        self.assertNotEqual(versao_carteira(self.usuario.id), versao)
+        # Usuários fora da seleção não são alterados
+        self.assertEqual(list(DadoFinanceiroMensal.objects.filter(ativo=ativo_outro).values_list("valor", flat=True)), [0])
+
+
+class PopulacaoTests(CsvsDeExemploMixin, TestCase):
+    """A população do banco deve recriar os usuários e calcular os dados mensais uma única vez, ao final."""
+
+    def test_populacao_em_lotes(self):
+        usuario_anterior = self.usuario.pk
+        with open(CSVS / "ativos.csv", "rb") as ativos, open(CSVS / "operacoes.csv", "rb") as operacoes:
+            resultado = popular([("teste", (ativos, operacoes))], "senha123", tamanho_lote=50, processos=1)
+
+        # O usuário é recriado, com a senha informada, e os dados mensais calculados ao final
+        self.usuario = User.objects.get(username="teste")
+        self.assertNotEqual(self.usuario.pk, usuario_anterior)
+        self.assertTrue(self.usuario.check_password("senha123"))
+        self.assertEqual(resultado.operacoes, len(ler_csv("operacoes.csv")))
+        self.assertEqual(Operacao.objects.filter(usuario=self.usuario).count(), resultado.operacoes)
+        self.assertEqual(resultado.meses, DadoFinanceiroMensal.objects.filter(usuario=self.usuario).count())
+        self.assertEqual(resultado.erros, [])
+        self.assertDadosEquivalentes()
+
+        call_command("popular", escala="2x3x1", processos=1, stdout=io.StringIO())
+        for nome in ("dummy_1", "dummy_2"):
+            self.usuario = User.objects.get(username=nome)
+            self.assertEqual(Ativo.objects.filter(usuario=self.usuario).count(), 3)
+            self.assertDadosEquivalentes()
+
+
+class VerificacaoDadosTests(CsvsDeExemploMixin, TestCase):
+    """A verificação deve apontar cada mês divergente, faltando ou sobrando e os totais de carteira afetados."""
+
+    def test_verificacao_dos_dados_mensais(self):
+        self.importar("operacoes.csv")
+        self.assertTrue(verificar_dados([self.usuario], processos=1, tamanho_lote=3).consistente)
+
+        petrobras, vale = self.ativos["Ações Petrobras"], self.ativos["Ações Vale"]
+        DadoFinanceiroMensal.objects.filter(ativo=petrobras, mes=date(2024, 3, 1)).update(valor=F("valor") + 5)
+        DadoFinanceiroMensal.objects.filter(ativo=vale, mes=date(2024, 6, 1)).delete()
+        DadoFinanceiroMensal.objects.create(usuario=self.usuario, ativo=vale, mes=date(2030, 1, 1), valor=1, rentabilidade=0)
+
+        relatorio = verificar_dados([self.usuario], processos=1, tamanho_lote=3)
+        self.assertEqual(
+            relatorio.ativos_divergentes[["ativo_id", "mes", "situacao"]].values.tolist(),
+            sorted([
+                [petrobras.id, date(2024, 3, 1), "divergente"],
+                [vale.id, date(2024, 6, 1), "faltando"],
+                [vale.id, date(2030, 1, 1), "sobrando"],
+            ]),
+        )
+        # Os totais da carteira divergem nos meses afetados
+        self.assertEqual(
+            set(relatorio.carteiras_divergentes["mes"]), {date(2024, 3, 1), date(2024, 6, 1), date(2030, 1, 1)}
+        )
+        self.assertEqual(relatorio.usuarios_divergentes(), [self.usuario.id])
+
+        with self.assertRaises(CommandError):
+            call_command("verificar_dados", "teste", processos=1, stdout=io.StringIO())
+        call_command("verificar_dados", "teste", processos=1, corrigir=True, stdout=io.StringIO())
+        self.assertTrue(verificar_dados([self.usuario], processos=1).consistente)
+        self.assertDadosEquivalentes()
+
+
+class AtivosDeTesteMixin:
+    """Usuário logado com ativos de renda fixa atualizados mensalmente ao longo de 2023."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username="teste")
+        self.client.force_login(self.usuario)
+
+    def criar_ativos(self, quantidade):
+        Ativo.objects.importar(
+            Ativo(
+                usuario=self.usuario,
+                nome=f"Ativo {i}",
+                classe="Renda Fixa",
+                subclasse="CDB",
+                banco=f"Banco {i % 3}",
+                valor_inicial=1000,
+                data_aquisicao=date(2023, 1, 10),
+            )
+            for i in range(quantidade)
+        )
+        Operacao.objects.importar(
+            Operacao(usuario=self.usuario, ativo=ativo, tipo="atualizacao", data=date(2023, mes, 1), valor=1000 + mes)
+            for ativo in Ativo.objects.filter(usuario=self.usuario)
+            for mes in range(2, 13)
+        )
+
+    def contar_consultas(self, url="/"):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, len(consultas)
+
+
+@override_settings(INDICES_CACHE_FILE=str(Path(tempfile.gettempdir()) / "indices_inexistente.json"))
+@mock.patch("investimentos.indices.agendar_atualizacao")
+class ResumoViewTests(AtivosDeTesteMixin, TestCase):
+    """A página de resumo deve ser montada com um número fixo de consultas, independente da quantidade de ativos."""
+
+    # Sessão, usuário, ativos, dados mensais e opções de filtro
+    ORCAMENTO_CONSULTAS = 5
+
+    def test_consultas_nao_crescem_com_os_ativos(self, _):
+        self.criar_ativos(3)
+        _, poucos_ativos = self.contar_consultas()
+
+        self.criar_ativos(40)
+        resposta, muitos_ativos = self.contar_consultas()
+
+        self.assertEqual(poucos_ativos, muitos_ativos)
+        self.assertLessEqual(muitos_ativos, self.ORCAMENTO_CONSULTAS)
+        self.assertEqual(len(resposta.context["resumo"]["ativos"]), 43)
+        self.assertEqual(resposta.context["resumo"]["ativos"][0].ultima_atualizacao, date(2023, 12, 1))
+
+    def test_filtros_mantem_o_orcamento(self, _):
+        self.criar_ativos(10)
+        resposta, consultas = self.contar_consultas("/?banco=Banco 1")
+
+        self.assertLessEqual(consultas, self.ORCAMENTO_CONSULTAS)
+        self.assertEqual(len(resposta.context["resumo"]["ativos"]), 3)
+        self.assertAlmostEqual(resposta.context["resumo"]["patrimonio_total"], 3 * 1012)
+
+    def assertPatrimonio(self, resposta, valor):
+        self.assertContains(resposta, f"<strong>Patrimônio Total:</strong> R$ {valor:.2f}".replace(".", ","))
+
+    def test_cache_da_carteira_invalidado_pelas_gravacoes(self, _):
+        self.criar_ativos(3)
+        _, sem_cache = self.contar_consultas()
+        resposta, com_cache = self.contar_consultas()
+        # Trechos renderizados servidos do cache: nem ativos, nem dados mensais, nem opções de filtro são lidos
+        self.assertEqual(com_cache, sem_cache - 3)
+        self.assertPatrimonio(resposta, 3 * 1012)
+        self.assertContains(resposta, "Ativo 2</a>")
+
+        # Outros filtros são trechos diferentes
+        resposta, _ = self.contar_consultas("/?banco=Banco 1")
+        self.assertPatrimonio(resposta, 1012)
+
+        # Correção da última atualização de um ativo
+        operacao = Operacao.objects.filter(usuario=self.usuario, data=date(2023, 12, 1)).first()
+        operacao.valor = 2000
+        operacao.save()
+        resposta, _ = self.contar_consultas()
+        self.assertPatrimonio(resposta, 2 * 1012 + 2000)
+
+        # Edição de um ativo sem mudança de valores
+        ativo = Ativo.objects.get(usuario=self.usuario, nome="Ativo 2")
+        ativo.nome = "Ativo Renomeado"
+        ativo.save()
+        resposta, _ = self.contar_consultas()
+        self.assertContains(resposta, "Ativo Renomeado</a>")
+
+        # Exclusão de um ativo e de uma operação
+        operacao.ativo.delete()
+        resposta, _ = self.contar_consultas()
+        self.assertPatrimonio(resposta, 2 * 1012)
+        self.assertEqual(len(resposta.context["resumo"]["ativos"]), 2)
+        Operacao.objects.filter(usuario=self.usuario, data=date(2023, 12, 1)).first().delete()
+        resposta, _ = self.contar_consultas()
+        self.assertPatrimonio(resposta, 1012 + 1011)
+
+    def test_historico_do_ativo_em_cache(self, _):
+        self.criar_ativos(1)
+        ativo = Ativo.objects.get(usuario=self.usuario)
+        url = f"/ativo/{ativo.id}/"
+        _, sem_cache = self.contar_consultas(url)
+        resposta, com_cache = self.contar_consultas(url)
+        self.assertEqual(com_cache, sem_cache - 1)  # Dados mensais não são lidos
+        self.assertContains(resposta, "R$ 1011,00")
+
+        operacao = Operacao.objects.get(ativo=ativo, data=date(2023, 11, 1))
+        operacao.valor = 1500
+        operacao.save()
+        resposta, _ = self.contar_consultas(url)
+        self.assertContains(resposta, "R$ 1500,00")
+
+
+@override_settings(INDICES_CACHE_FILE=str(Path(tempfile.gettempdir()) / "indices_inexistente.json"))
+@mock.patch("investimentos.indices.agendar_atualizacao")
+class OpcoesFiltroTests(AtivosDeTesteMixin, TestCase):
+    """As opções de filtro devem vir com as quantidades de ativos de uma única consulta, em cache até que um ativo mude."""
+
+    def test_opcoes_de_filtro_com_quantidades_em_uma_consulta(self, _):
+        self.criar_ativos(5)
+        with CaptureQueriesContext(connection) as consultas:
+            facetas = Ativo.objects.facetas(self.usuario)
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(facetas, {
+            "classes": [("Renda Fixa", 5)],
+            "subclasses": [("CDB", 5)],
+            "bancos": [("Banco 0", 2), ("Banco 1", 2), ("Banco 2", 1)],
+        })
+
+        # As opções das listagens vêm do cache até que um ativo mude
+        for url in ("/listar-ativos/", "/listar-operacoes/"):
+            self.assertEqual(self.client.get(url).context["bancos_disponiveis"], facetas["bancos"])
+        ativo = Ativo.objects.get(usuario=self.usuario, nome="Ativo 2")
+        ativo.banco = "Banco 0"
+        ativo.save()
+        self.assertEqual(Ativo.objects.facetas(self.usuario)["bancos"], [("Banco 0", 3), ("Banco 1", 2)])
+        ativo.delete()
+        self.assertEqual(Ativo.objects.facetas(self.usuario)["bancos"], [("Banco 0", 2), ("Banco 1", 2)])
+
+
+@override_settings(INDICES_CACHE_FILE=str(Path(tempfile.gettempdir()) / "indices_inexistente.json"))
+@mock.patch("investimentos.indices.agendar_atualizacao")
+class ExportacaoCsvTests(AtivosDeTesteMixin, TestCase):
+    """A exportação da carteira filtrada deve ser transmitida em partes, com as métricas calculadas por lote de ativos."""
+
+    def test_exportacao_csv_com_filtros(self, _):
+        self.criar_ativos(4)
+        resposta = self.client.get("/exportar-csv/?banco=Banco 1")
+        self.assertTrue(resposta.streaming)
+        self.assertEqual(resposta["Content-Type"], "text/csv; charset=utf-8")
+
+        # A primeira linha sai antes de qualquer leitura no banco
+        conteudo = iter(resposta.streaming_content)
+        with CaptureQueriesContext(connection) as consultas:
+            primeira = next(conteudo)
+        self.assertEqual(len(consultas), 0)
+        linhas = list(csv.reader((primeira + b"".join(conteudo)).decode().splitlines(), delimiter=";"))
+
+        self.assertEqual(linhas[:3], [["Filtros aplicados"], ["Banco", "Banco 1"], []])
+        cabecalho = linhas.index(["Nome", "Classe", "Subclasse", "Banco", "Valor Atual",
+                                  "Rentabilidade 1M (R$)", "Rentabilidade 1M (%)", "Rentabilidade 1A (R$)", "Rentabilidade 1A (%)",
+                                  "Rentabilidade Total (R$)", "Rentabilidade Total (%)", "Observações"])
+        self.assertEqual(linhas[cabecalho + 1][:5], ["Ativo 1", "Renda Fixa", "CDB", "Banco 1", "1012.00"])
+        self.assertEqual(linhas[cabecalho + 1][9], "12.00")
+
+        historico = linhas[linhas.index(["Histórico mensal"]) + 2:]
+        self.assertEqual(len(historico), 12)  # 12 meses de 2023 para o único ativo do banco
+        self.assertEqual(historico[-1], ["Ativo 1", "2023-12", "1012.00", "0.00", "0.00"])
+
+    def test_exportacao_csv_em_lotes_de_ativos(self, _):
+        self.criar_ativos(5)
+        de_linhas = Carteira.de_linhas
+        with mock.patch("investimentos.exportacao.TAMANHO_LOTE_EXPORTACAO", 2), \
+                mock.patch.object(Carteira, "de_linhas", side_effect=de_linhas) as montar:
+            conteudo = b"".join(self.client.get("/exportar-csv/").streaming_content).decode()
+
+        # As métricas de cada lote usam apenas os dados mensais dos seus ativos, nunca a carteira inteira
+        self.assertEqual([len({linha[0] for linha in chamada.args[0]}) for chamada in montar.call_args_list], [2, 2, 1])
+        linhas = list(csv.reader(conteudo.splitlines(), delimiter=";"))
+        ativos = [linha for linha in linhas if linha[:1] and linha[0].startswith("Ativo ") and len(linha) == 12]
+        self.assertEqual([linha[4] for linha in ativos], ["1012.00"] * 5)
+        self.assertEqual([linha[9] for linha in ativos], ["12.00"] * 5)
+
+
+@override_settings(INDICES_CACHE_FILE=str(Path(tempfile.gettempdir()) / "indices_inexistente.json"))
+@mock.patch("investimentos.indices.agendar_atualizacao")
+class GraficosTests(AtivosDeTesteMixin, TestCase):
+    """Os gráficos devem ser servidos em JSON com todos os índices de referência e revalidados pelo ETag."""
+
+    def test_todos_os_indices_de_referencia_no_grafico(self, _):
+        self.criar_ativos(2)
+        resposta, _ = self.contar_consultas()
+        self.assertContains(resposta, 'id="indiceSP500"')
+
+        grafico = self.client.get("/graficos/carteira/rentabilidade/").json()
+        self.assertEqual(len(grafico["dados"]), 11)
+        indices = grafico["indices"]
+        self.assertEqual([indice["chave"] for indice in indices], ["CDI", "IBOVESPA", "SELIC", "IPCA", "IFIX", "SP500"])
+        self.assertEqual([indice["chave"] for indice in indices if indice["padrao"]], ["CDI", "IBOVESPA"])
+        self.assertTrue(all(len(indice["dados"]) == 11 for indice in indices))
+
+    def test_graficos_revalidados_pelo_etag(self, _):
+        self.criar_ativos(3)
+        url = "/graficos/carteira/evolucao/"
+
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["dados"], [3000.0] + [3 * (1000 + mes) for mes in range(2, 13)])
+        etag = resposta["ETag"]
+
+        # Sem mudanças na carteira, a revalidação responde 304 sem ler os dados mensais
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+        self.assertFalse(any("dados_financeiros_mensais" in consulta["sql"] for consulta in consultas))
+
+        # Filtros e gráficos diferentes têm ETags diferentes
+        self.assertNotEqual(self.client.get(url + "?banco=Banco 1")["ETag"], etag)
+        self.assertNotEqual(self.client.get("/graficos/carteira/composicao/")["ETag"], etag)
+
+        # Uma gravação muda a versão da carteira e o gráfico é recalculado
+        operacao = Operacao.objects.filter(usuario=self.usuario, data=date(2023, 12, 1)).first()
+        operacao.valor = 2000
+        operacao.save()
+        resposta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["dados"][-1], 2 * 1012 + 2000)
+
+        # Gráficos de um ativo do usuário; ativos de outros usuários e gráficos inexistentes não são encontrados
+        grafico = self.client.get(f"/graficos/ativo/{operacao.ativo_id}/rentabilidade/").json()
+        self.assertEqual(len(grafico["labels"]), 12)
+        self.assertEqual(len(grafico["dados"]), 11)
+        outro = Ativo.objects.create(
+            usuario=User.objects.create(username="outro"), nome="Outro", classe="Renda Fixa", subclasse="CDB",
+            banco="Banco", valor_inicial=1000, data_aquisicao=date(2023, 1, 10),
+        )
+        self.assertEqual(self.client.get(f"/graficos/ativo/{outro.id}/evolucao/").status_code, 404)
+        self.assertEqual(self.client.get("/graficos/carteira/inexistente/").status_code, 404)
+
+
+class ListagemPaginadaTests(TestCase):
+    """As listagens de operações e ativos devem ser paginadas por busca, sem repetir nem pular linhas."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create(username="teste")
+        self.client.force_login(self.usuario)
+        self.ativo = Ativo.objects.create(
+            usuario=self.usuario, nome="CDB", classe="Renda Fixa", subclasse="CDB", banco="Banco",
+            valor_inicial=1000, data_aquisicao=date(2023, 1, 10),
+        )
+        # Várias operações na mesma data, para que o id desempate a ordenação
+        Operacao.objects.importar(
+            Operacao(usuario=self.usuario, ativo=self.ativo, tipo="atualizacao", data=date(2023, 2 + i // 3, 1), valor=1000 + i)
+            for i in range(10)
+        )
+
+    def percorrer(self, caminho, consulta="", parametro="apos"):
+        """Segue os links da paginação a partir de `caminho` + `consulta`, retornando os ids de cada página."""
+        paginas = []
+        while consulta is not None:
+            resposta = self.client.get(caminho + consulta)
+            paginas.append([objeto.pk for objeto in resposta.context["object_list"]])
+            pagina = resposta.context["page_obj"]
+            consulta = pagina.url_proxima if parametro == "apos" else pagina.url_anterior
+        return paginas, resposta
+
+    @mock.patch.object(OperacaoListView, "paginate_by", 3)
+    def test_paginas_de_operacoes(self):
+        esperado = list(Operacao.objects.order_by("-data", "-pk").values_list("pk", flat=True))
+        paginas, ultima = self.percorrer("/listar-operacoes/")
+        self.assertEqual([len(pagina) for pagina in paginas], [3, 3, 3, 1])
+        self.assertEqual(sum(paginas, []), esperado)
+
+        # Voltando a partir da última página, as mesmas páginas na ordem inversa
+        voltando, primeira = self.percorrer("/listar-operacoes/", ultima.context["page_obj"].url_anterior, parametro="antes")
+        self.assertEqual(voltando, paginas[-2::-1])
+        self.assertIsNone(primeira.context["page_obj"].url_anterior)
+
+        # Ordenação crescente por valor, com filtro de período
+        paginas, _ = self.percorrer("/listar-operacoes/", "?ordem=valor&de=2023-03-01&ate=2023-04-30")
+        valores = [Operacao.objects.get(pk=pk).valor for pk in sum(paginas, [])]
+        self.assertEqual(valores, [1003, 1004, 1005, 1006, 1007, 1008])
+
+    @mock.patch.object(OperacaoListView, "paginate_by", 3)
+    def test_consultas_por_pagina_nao_crescem(self):
+        self.client.get("/listar-operacoes/")  # Opções de filtro já em cache nas duas páginas medidas
+        with CaptureQueriesContext(connection) as primeira:
+            resposta = self.client.get("/listar-operacoes/")
+        with CaptureQueriesContext(connection) as seguinte:
+            self.client.get("/listar-operacoes/" + resposta.context["page_obj"].url_proxima)
+        self.assertEqual(len(primeira), len(seguinte))
+        self.assertFalse(any("OFFSET" in consulta["sql"] for consulta in seguinte.captured_queries))
+
+    @mock.patch.object(AtivoListView, "paginate_by", 1)
+    def test_paginas_de_ativos_e_cursor_invalido(self):
+        Ativo.objects.create(
+            usuario=self.usuario, nome="Ação", classe="Renda Variável", subclasse="Ações", banco="Banco",
+            valor_inicial=500, data_aquisicao=date(2023, 3, 1),
+        )
+        paginas, _ = self.percorrer("/listar-ativos/", "?ordem=-data")
+        self.assertEqual([nome for pagina in paginas for nome in Ativo.objects.filter(pk__in=pagina).values_list("nome", flat=True)], ["Ação", "CDB"])
+
+        # Cursores inválidos, inclusive com id acima de 64 bits, não inteiro ou valor nulo, levam à primeira página
+        cursores = ["invalido", codificar_cursor("2023-03-01", 2**63), codificar_cursor("2023-03-01", -2**64)]
+        cursores += [base64.urlsafe_b64encode(texto.encode()).decode() for texto in ('[null, 1]', '["2023-03-01", 1e400]', '["2023-03-01", 1.5]')]
+        for ordem in ("-data", "nome"):
+            for cursor in cursores:
+                resposta = self.client.get(f"/listar-ativos/?ordem={ordem}&apos={cursor}")
+                self.assertEqual(resposta.status_code, 200, cursor)
+                self.assertEqual(len(resposta.context["ativos"]), 1, cursor)
+                self.assertFalse(resposta.context["page_obj"].url_anterior, cursor)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN é específico do SQLite")
+class PlanoConsultasTests(TestCase):
+    """As consultas das páginas e do recálculo devem usar índices mesmo com muitos dados,
+    sem percorrer tabelas inteiras."""
+
+    TABELAS = ("ativos", "operacoes", "dados_financeiros_mensais")
+    PAGINAS = [
+        "/", "/?banco=Banco 1", "/listar-operacoes/", "/listar-operacoes/?classe=Renda Fixa&ordem=valor&de=2021-01-01",
+        "/listar-operacoes/?tipo=atualizacao", "/listar-ativos/", "/listar-ativos/?ordem=-data",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        usuarios = [User.objects.create(username=f"usuario{i}") for i in range(5)]
+        Ativo.objects.bulk_create(
+            Ativo(usuario=usuario, nome=f"Ativo {i}", classe="Renda Fixa", subclasse="CDB", banco=f"Banco {i % 4}",
+                  valor_inicial=1000, data_aquisicao=date(2020, 1, 1))
+            for usuario in usuarios
+            for i in range(60)
+        )
+        ativos = list(Ativo.objects.all())
+        Operacao.objects.bulk_create(
+            Operacao(usuario_id=ativo.usuario_id, ativo=ativo, tipo="atualizacao", data=date(2020 + mes // 12, mes % 12 + 1, 1), valor=1000 + mes)
+            for ativo in ativos
+            for mes in range(48)
+        )
+        DadoFinanceiroMensal.objects.bulk_create(
+            DadoFinanceiroMensal(usuario_id=ativo.usuario_id, ativo=ativo, mes=date(2020 + mes // 12, mes % 12 + 1, 1), valor=1000, rentabilidade=0)
+            for ativo in ativos
+            for mes in range(48)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")  # Estatísticas para o planejador, como em um banco em uso
+        cls.usuario = usuarios[2]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def planos(self, consultas):
+        """Plano de execução de cada SELECT capturado: lista de (sql, etapas do plano)."""
+        planos = []
+        with connection.cursor() as cursor:
+            for consulta in consultas.captured_queries:
+                if consulta["sql"].startswith("SELECT"):
+                    cursor.execute("EXPLAIN QUERY PLAN " + consulta["sql"])
+                    planos.append((consulta["sql"], [linha[3] for linha in cursor.fetchall()]))
+        return planos
+
+    def assertSemVarredura(self, planos):
+        for sql, etapas in planos:
+            for etapa in etapas:
+                self.assertIsNone(re.match(rf"SCAN ({'|'.join(self.TABELAS)})\b", etapa), f"{etapa}\n{sql}")
+
+    @mock.patch("investimentos.indices.agendar_atualizacao")
+    def test_paginas_sem_varredura_de_tabelas(self, _):
+        ativo = Ativo.objects.filter(usuario=self.usuario).first()
+        with CaptureQueriesContext(connection) as consultas:
+            for url in self.PAGINAS + [f"/ativo/{ativo.pk}/"]:
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.assertSemVarredura(self.planos(consultas))
+
+    def test_recalculo_le_operacoes_em_ordem_pelo_indice(self):
+        ativo = Ativo.objects.filter(usuario=self.usuario).first()
+        with CaptureQueriesContext(connection) as consultas:
+            DadoFinanceiroMensal.objects.recalcular(ativo, a_partir_de=date(2022, 1, 1))
+
+        planos = self.planos(consultas)
+        self.assertSemVarredura(planos)
+        etapas_operacoes = [etapas for sql, etapas in planos if 'FROM "operacoes"' in sql]
+        self.assertTrue(etapas_operacoes)
+        for etapas in etapas_operacoes:
+            self.assertIn("operacao_ativo_data_idx", etapas[0])
+            self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", etapas)
+
+
+@override_settings(INDICES_CACHE_FILE=str(Path(tempfile.gettempdir()) / "indices_inexistente.json"))
+@mock.patch("investimentos.indices.agendar_atualizacao")
+class PerfilamentoTests(TestCase):
+    """O middleware de perfilamento só atua quando ligado e expõe os tempos no Server-Timing."""
+
+    def setUp(self):
+        cache.clear()
+        limpar_historico()
+        self.usuario = User.objects.create(username="teste")
+        self.client.force_login(self.usuario)
+        self.ativo = Ativo.objects.create(
+            usuario=self.usuario, nome="CDB", classe="Renda Fixa", subclasse="CDB", banco="Banco",
+            valor_inicial=1000, data_aquisicao=date(2023, 1, 10),
+        )
+
+    def test_desligado_por_padrao(self, _):
+        resposta = self.client.get("/")
+        self.assertNotIn("Server-Timing", resposta)
+        self.assertEqual(requisicoes_registradas(), [])
+
+    @override_settings(PERFILAMENTO=True)
+    def test_server_timing_e_pagina_de_estatisticas(self, _):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get("/")
+        metricas = dict(metrica.split(";", 1) for metrica in resposta["Server-Timing"].split(", "))
+        self.assertEqual(list(metricas)[0], "sql")
+        self.assertIn(f'desc="{len(consultas)} consultas"', metricas["sql"])
+        self.assertIn("cache", metricas)
+        self.assertIn("template", metricas)
+        self.assertIn("total", metricas)
+
+        self.client.get(f"/ativo/{self.ativo.id}/")
+        self.client.get(f"/ativo/{self.ativo.id}/")
+        self.assertEqual([perfil.rota for perfil in requisicoes_registradas()], ["/", "/ativo/<int:pk>/", "/ativo/<int:pk>/"])
+
+        # Apenas administradores veem as estatísticas
+        self.assertEqual(self.client.get("/perfilamento/").status_code, 403)
+        self.usuario.is_staff = True
+        self.usuario.save()
+        resposta = self.client.get("/perfilamento/")
+        rotas = {(rota["rota"], rota["quantidade"]) for rota in resposta.context["rotas"]}
+        self.assertIn(("/ativo/<int:pk>/", 2), rotas)
+        self.assertContains(resposta, "/ativo/&lt;int:pk&gt;/")
+
+
+class BenchmarkTests(TestCase):
+    """Gerador de carteiras sintéticas e benchmark de ponta a ponta em escala mínima."""
+
+    def test_carteira_sintetica_reproduzivel(self):
+        parametros = ParametrosGeracao(ativos=12, anos=2, inicio=date(2020, 1, 1), prob_compra=0, prob_venda=0)
+        ativos, operacoes = gerar_carteira(parametros, semente=7)
+
+        self.assertEqual(gerar_carteira(parametros, semente=7), (ativos, operacoes))
+        self.assertEqual(len({ativo[0] for ativo in ativos}), 12)
+        self.assertEqual(ativos[10][0], "Tesouro IPCA+ 2")
+        self.assertEqual(len(operacoes), 12 * 24)
+        self.assertEqual({operacao[1] for operacao in operacoes}, {"atualizacao"})
+        self.assertEqual(max(operacao[2] for operacao in operacoes), date(2022, 1, 1))
+
+    def test_benchmark_em_escala_minima(self):
+        medicoes = executar_benchmark([Escala.de_texto("1x2x1")], repeticoes=2)
+
+        self.assertEqual(len(medicoes), 7)
+        resumo = next(medicao for medicao in medicoes if medicao.cenario == "ResumoView")
+        self.assertEqual(len(resumo.tempos), 2)
+        self.assertGreater(resumo.consultas, 0)
+        self.assertGreater(resumo.pico_memoria, 0)
+        # Os dados criados pelo benchmark são removidos
+        self.assertFalse(User.objects.exists())
+
+        anteriores = [{**medicao.como_dict(), "consultas": medicao.consultas - 1} for medicao in medicoes]
+        self.assertEqual(len(comparar_medicoes(medicoes, anteriores, tolerancia=100)), 7)
+        with self.assertRaises(ValueError):
+            Escala.de_texto("2x50")
+
+
+class CarteiraTests(SimpleTestCase):
+    """Métricas da carteira em matriz, com ativos que começam em meses diferentes e meses sem dados."""
+
+    def setUp(self):
+        self.carteira = Carteira.de_linhas([
+            (2, date(2023, 4, 1), 60, 0),
+            (1, date(2023, 1, 1), 100, 10),
+            (1, date(2023, 2, 1), 110, 10),
+            (1, date(2023, 3, 1), 120, 0),
+            (2, date(2023, 2, 1), 50, 10),
+        ])
+
+    def test_metricas_por_ativo(self):
+        metricas = self.carteira.metricas_por_ativo()
+
+        self.assertEqual(metricas[1]["valor_atualizado"], 120)
+        self.assertEqual(metricas[1]["rentabilidade_1m_abs"], 10)
+        self.assertAlmostEqual(metricas[1]["rentabilidade_1m_perc"], 10 / 110 * 100)
+        self.assertAlmostEqual(metricas[1]["rentabilidade_total_perc"], 20)
+        self.assertEqual(metricas[1]["rentabilidade_1a_abs"], 0)  # Menos de 13 meses de histórico
+        # O mês sem dados do ativo 2 não entra nas janelas
+        self.assertEqual(metricas[2]["valor_atualizado"], 60)
+        self.assertAlmostEqual(metricas[2]["rentabilidade_1m_perc"], 20)
+        self.assertAlmostEqual(metricas[2]["rentabilidade_total_perc"], 20)
+
+    def test_evolucao_da_carteira(self):
+        valores, rentabilidades, perc = self.carteira.evolucao()
+
+        self.assertEqual([rotulo_mes(mes) for mes in self.carteira.meses], ["2023-01", "2023-02", "2023-03", "2023-04"])
+        self.assertEqual(valores.tolist(), [100, 160, 120, 60])
+        self.assertEqual(rentabilidades.tolist(), [10, 20, 0, 0])
+        self.assertEqual(perc.tolist(), [10, 12.5, 0, 0])
+        self.assertEqual(self.carteira.curva_acumulada().round(6).tolist(), [10, 23.75, 23.75, 23.75])
+        self.assertAlmostEqual(self.carteira.rentabilidades_da_carteira()["rentabilidade_perc_total"], 23.75)
+
+    def test_selecao_remove_meses_vazios(self):
+        carteira = self.carteira.selecionar([2, 3])
+
+        self.assertEqual(carteira.ativo_ids, [2])
+        self.assertEqual([rotulo_mes(mes) for mes in carteira.meses], ["2023-02", "2023-04"])
+        _, valores, _, _, acumulada = carteira.historico_ativo(2)
+        self.assertEqual(valores.tolist(), [50, 60])
+        self.assertEqual(acumulada.round(6).tolist(), [20, 20])
+
+
+class FonteTeste(Fonte):
+    """Fonte de índices que registra as buscas e devolve 1% em todos os meses."""
+    buscas = []
+    espera = 0
+
+    def __init__(self, serie):
+        self.serie = serie
+
+    def buscar(self, inicio, fim, tempo_limite):
+        time.sleep(self.espera)
+        self.buscas.append((self.serie, rotulo_mes(inicio), rotulo_mes(fim)))
+        return {rotulo_mes(mes): 1.0 for mes in range(inicio, fim + 1)}
+
+
+class FonteLoteTeste(FonteTeste):
+    """Fonte de índices que busca várias séries em uma única chamada, registrando cada lote."""
+    lotes = []
+
+    @classmethod
+    def buscar_lote(cls, fontes, inicio, fim, tempo_limite):
+        cls.lotes.append((sorted(fontes), rotulo_mes(inicio), rotulo_mes(fim)))
+        return super().buscar_lote(fontes, inicio, fim, tempo_limite)
+
+
+FONTES_TESTE = {
+    "CDI": {"fonte": "investimentos.tests.FonteTeste", "serie": "CDI"},
+    "IBOVESPA": {"fonte": "investimentos.tests.FonteTeste", "serie": "IBOVESPA"},
+}
+
+
+class IndicesTests(SimpleTestCase):
+    """O armazenamento de índices deve buscar nas fontes apenas os meses que ainda não tem,
+    sem que as requisições esperem pelas fontes."""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        configuracao = override_settings(
+            INDICES_CACHE_FILE=str(Path(self.diretorio.name) / "indices.json"),
+            INDICES_FONTES=FONTES_TESTE,
+            INDICES_TEMPO_LIMITE=1,
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        FonteTeste.buscas = []
+
+        # Atualizações em segundo plano não devem sobreviver ao teste que as agendou
+        agendar = mock.patch("investimentos.indices.agendar_atualizacao")
+        self.agendar = agendar.start()
+        self.addCleanup(agendar.stop)
+        falhas = mock.patch.dict("investimentos.indices._falhas", clear=True)
+        falhas.start()
+        self.addCleanup(falhas.stop)
+
+    def atualizar(self, inicio, fim, hoje):
+        FonteTeste.buscas.clear()
+        atualizar_indices(inicio, fim, hoje=hoje)
+        return sorted(FonteTeste.buscas)
+
+    def test_busca_apenas_meses_faltantes(self):
+        def buscas(inicio, fim):
+            return [("CDI", inicio, fim), ("IBOVESPA", inicio, fim)]
+
+        self.assertEqual(self.atualizar(date(2023, 1, 1), date(2024, 3, 1), hoje=date(2024, 3, 20)), buscas("2023-01", "2024-03"))
+        self.assertEqual(carregar_series()["CDI"]["fim"], "2024-02")  # O mês atual ainda está em aberto
+
+        # No mesmo dia nada é buscado novamente
+        self.assertEqual(self.atualizar(date(2023, 1, 1), date(2024, 3, 1), hoje=date(2024, 3, 20)), [])
+
+        # No dia seguinte, apenas o mês em aberto
+        self.assertEqual(self.atualizar(date(2023, 1, 1), date(2024, 3, 1), hoje=date(2024, 3, 21)), buscas("2024-03", "2024-03"))
+
+        # Um período anterior busca apenas os meses antes da cobertura
+        self.assertEqual(self.atualizar(date(2022, 6, 1), date(2023, 6, 1), hoje=date(2024, 3, 21)), buscas("2022-06", "2022-12"))
+
+        # Após a virada do mês, o mês anterior é fechado e não é mais buscado
+        self.assertEqual(self.atualizar(date(2023, 1, 1), date(2024, 4, 1), hoje=date(2024, 4, 10)), buscas("2024-03", "2024-04"))
+        self.assertEqual(self.atualizar(date(2023, 1, 1), date(2024, 4, 1), hoje=date(2024, 4, 11)), buscas("2024-04", "2024-04"))
+
+    def test_meses_fechados_sem_valores_buscados_uma_vez_por_dia(self):
+        # Série que só começa em 2023 e cujo último mês fechado (fevereiro de 2024) ainda não foi publicado
+        caminho = Path(self.diretorio.name) / "fixture.json"
+        meses = range(indice_mes(date(2023, 1, 1)), indice_mes(date(2024, 2, 1)))
+        caminho.write_text(json.dumps({"IPCA": {rotulo_mes(mes): 0.5 for mes in meses}}))
+        fonte = {"fonte": "investimentos.indices.FonteArquivo", "caminho": str(caminho), "serie": "IPCA"}
+
+        def buscas():
+            return sorted((rotulo_mes(chamada.args[1]), rotulo_mes(chamada.args[2])) for chamada in buscar.call_args_list)
+
+        with override_settings(INDICES_FONTES={"IPCA": fonte}), \
+                mock.patch.object(FonteArquivo, "buscar", autospec=True, side_effect=FonteArquivo.buscar) as buscar:
+            atualizar_indices(date(2023, 1, 1), date(2024, 2, 1), hoje=date(2024, 3, 8))
+            self.assertEqual(carregar_series()["IPCA"]["fim"], "2024-01")
+
+            # Meses antes do início da série e o mês não publicado, ambos fechados, não voltam a ser buscados hoje
+            buscar.reset_mock()
+            for _ in range(3):
+                atualizar_indices(date(2022, 1, 1), date(2024, 2, 1), hoje=date(2024, 3, 8))
+                self.assertEqual(obter_indices(date(2022, 1, 1), date(2024, 2, 1), hoje=date(2024, 3, 8))["IPCA"]["2023-01"], 0.5)
+            self.assertEqual(buscas(), [("2022-01", "2022-12")])
+            self.agendar.assert_not_called()
+
+            # No dia seguinte, são buscados novamente
+            buscar.reset_mock()
+            atualizar_indices(date(2022, 1, 1), date(2024, 2, 1), hoje=date(2024, 3, 9))
+            self.assertEqual(buscas(), [("2022-01", "2022-12"), ("2024-02", "2024-02")])
+
+    def test_requisicao_usa_valores_gravados_e_agenda_atualizacao(self):
+        indices = obter_indices(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+        self.assertEqual(indices, {"CDI": {}, "IBOVESPA": {}})
+        self.agendar.assert_called_once_with(date(2023, 1, 1), date(2023, 6, 1))
+
+        atualizar_indices(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+        self.agendar.reset_mock()
+        indices = obter_indices(date(2023, 3, 1), date(2023, 4, 1), hoje=date(2024, 3, 20))
+        self.assertEqual(indices["CDI"], {"2023-03": 1.0, "2023-04": 1.0})
+        self.agendar.assert_not_called()
+
+        self.assertEqual(FonteTeste.buscas, [("CDI", "2023-01", "2023-06"), ("IBOVESPA", "2023-01", "2023-06")])
+
+    def test_falhas_e_atrasos_nas_fontes_mantem_valores_gravados(self):
+        atualizar_indices(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+        lenta = {"fonte": "investimentos.tests.FonteTeste", "serie": "IBOVESPA"}
+        indisponivel = {"fonte": "investimentos.indices.FonteArquivo", "caminho": "/inexistente.json", "serie": "CDI"}
+
+        with override_settings(INDICES_FONTES={"CDI": indisponivel, "IBOVESPA": lenta}, INDICES_TEMPO_LIMITE=0.1), \
+                mock.patch.object(FonteTeste, "espera", 0.5), self.assertLogs("investimentos.indices") as logs:
+            inicio = time.monotonic()
+            atualizar_indices(date(2022, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+            self.assertLess(time.monotonic() - inicio, 0.4)
+
+        self.assertEqual(len(logs.records), 2)
+        series = carregar_series()
+        self.assertEqual((series["CDI"]["inicio"], series["IBOVESPA"]["inicio"]), ("2023-01", "2023-01"))
+
+    def test_yahoo_sem_fechamentos_e_tratado_como_falha(self):
+        yahoo = {"fonte": "investimentos.indices.FonteYahoo"}
+        fontes = {"IBOVESPA": {**yahoo, "ticker": "^BVSP"}, "IFIX": {**yahoo, "ticker": "IFIX.SA"}}
+        datas = pd.to_datetime(["2022-12-01", "2023-01-01", "2023-02-01"])
+        fechamentos = pd.DataFrame({("^BVSP", "Close"): [100.0, 110.0, 99.0], ("IFIX.SA", "Close"): [float("nan")] * 3}, index=datas)
+
+        with override_settings(INDICES_FONTES=fontes):
+            # Em falhas de rede o yfinance apenas registra o erro e devolve um quadro vazio
+            with mock.patch("yfinance.download", return_value=pd.DataFrame()), self.assertLogs("investimentos.indices"):
+                atualizar_indices(date(2023, 1, 1), date(2023, 2, 1), hoje=date(2024, 3, 20))
+            self.assertEqual(carregar_series(), {})  # Nada gravado, nem a data da verificação
+
+            # A busca é repetida no mesmo dia; o ticker sem fechamentos não impede a atualização do outro
+            with mock.patch("yfinance.download", return_value=fechamentos) as download, self.assertLogs("investimentos.indices"), \
+                    mock.patch("investimentos.indices.INTERVALO_NOVA_TENTATIVA", 0):
+                atualizar_indices(date(2023, 1, 1), date(2023, 2, 1), hoje=date(2024, 3, 20))
+            download.assert_called_once()
+
+        series = carregar_series()
+        self.assertEqual({mes: round(valor, 6) for mes, valor in series["IBOVESPA"]["mensal"].items()}, {"2023-01": 10, "2023-02": -10})
+        self.assertEqual(series["IBOVESPA"]["verificado_em"], "2024-03-20")
+        self.assertNotIn("IFIX", series)  # Buscado de novo após o intervalo entre tentativas
+
+    def test_falha_nao_regrava_e_aguarda_nova_tentativa(self):
+        atualizar_indices(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+        versao = versao_indices()
+        indisponivel = {"fonte": "investimentos.indices.FonteArquivo", "caminho": "/inexistente.json", "serie": "CDI"}
+
+        with override_settings(INDICES_FONTES={"CDI": indisponivel}), \
+                mock.patch.object(FonteArquivo, "buscar", autospec=True, side_effect=FonteArquivo.buscar) as buscar:
+            with self.assertLogs("investimentos.indices"):
+                atualizar_indices(date(2022, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+            self.assertEqual(versao_indices(), versao)  # Nada mudou e o arquivo não foi regravado
+
+            # Até o fim do intervalo, a série não é buscada nem agendada de novo
+            atualizar_indices(date(2022, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+            obter_indices(date(2022, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+            self.assertEqual(buscar.call_count, 1)
+            self.agendar.assert_not_called()
+
+            with mock.patch("investimentos.indices.INTERVALO_NOVA_TENTATIVA", 0), self.assertLogs("investimentos.indices"):
+                atualizar_indices(date(2022, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+            self.assertEqual(buscar.call_count, 2)
+
+        self.assertEqual(carregar_series()["CDI"]["inicio"], "2023-01")
+
+    def test_fonte_arquivo(self):
+        caminho = Path(self.diretorio.name) / "fixture.json"
+        caminho.write_text(json.dumps({"CDI": {"2022-12": 1.1, "2023-01": 1.2, "2023-02": 0.9}}))
+        fonte = {"fonte": "investimentos.indices.FonteArquivo", "caminho": str(caminho), "serie": "CDI"}
+
+        with override_settings(INDICES_FONTES={"CDI": fonte}):
+            atualizar_indices(date(2023, 1, 1), date(2023, 3, 1), hoje=date(2024, 3, 20))
+            indices = obter_indices(date(2023, 1, 1), date(2023, 3, 1), hoje=date(2024, 3, 20))
+
+        self.assertEqual(indices, {"CDI": {"2023-01": 1.2, "2023-02": 0.9}})
+        self.assertEqual(carregar_series()["CDI"]["fim"], "2023-02")
+        # O mês que falta no arquivo já foi buscado hoje e só é agendado de novo amanhã
+        self.agendar.assert_not_called()
+        obter_indices(date(2023, 1, 1), date(2023, 3, 1), hoje=date(2024, 3, 21))
+        self.agendar.assert_called_once_with(date(2023, 1, 1), date(2023, 3, 1))
+
+    def test_fontes_da_mesma_classe_buscadas_em_lote(self):
+        lote = {"fonte": "investimentos.tests.FonteLoteTeste"}
+        fontes = {"CDI": {**lote, "serie": "CDI"}, "IFIX": {**lote, "serie": "IFIX"}, "IPCA": {**FONTES_TESTE["CDI"], "serie": "IPCA"}}
+        FonteLoteTeste.lotes = []
+
+        with override_settings(INDICES_FONTES=fontes):
+            atualizar_indices(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+            # As duas séries do lote têm os mesmos meses faltantes e continuam sendo buscadas juntas
+            atualizar_indices(date(2022, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+
+        self.assertEqual(FonteLoteTeste.lotes, [(["CDI", "IFIX"], "2023-01", "2023-06"), (["CDI", "IFIX"], "2022-01", "2022-12")])
+        self.assertEqual({nome: serie["inicio"] for nome, serie in carregar_series().items()}, {"CDI": "2022-01", "IFIX": "2022-01", "IPCA": "2022-01"})
+
+    def test_fonte_csv(self):
+        caminho = Path(self.diretorio.name) / "indice.csv"
+        caminho.write_text("Data;Fechamento;Taxa\n2022-12-30;100;0,5\n2023-01-15;104;0,5\n2023-01-31;110;0,5\n2023-02-28;99;1\n")
+
+        precos = FonteCSV(str(caminho), coluna_valor="Fechamento", tipo="preco")
+        variacoes = precos.buscar(indice_mes(date(2023, 1, 1)), indice_mes(date(2023, 3, 1)), tempo_limite=1)
+        self.assertEqual({mes: round(valor, 6) for mes, valor in variacoes.items()}, {"2023-01": 10, "2023-02": -10})
+
+        taxas = FonteCSV(str(caminho), coluna_valor="Taxa").buscar(indice_mes(date(2023, 1, 1)), indice_mes(date(2023, 2, 1)), tempo_limite=1)
+        self.assertEqual({mes: round(valor, 6) for mes, valor in taxas.items()}, {"2023-01": 1.0025, "2023-02": 1})
+
+    def test_apenas_um_worker_atualiza_por_vez(self):
+        inicio, fim, hoje = date(2023, 1, 1), date(2023, 6, 1), date(2024, 3, 20)
+        workers = [threading.Thread(target=atualizar_indices, args=(inicio, fim, hoje)) for _ in range(8)]
+
+        with mock.patch.object(FonteTeste, "espera", 0.2):
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(sorted(FonteTeste.buscas), [("CDI", "2023-01", "2023-06"), ("IBOVESPA", "2023-01", "2023-06")])
+        self.assertEqual(len(carregar_series()["CDI"]["mensal"]), 6)
+        self.assertEqual(os.listdir(self.diretorio.name), ["indices.json"])  # Sem travas ou temporários
+
+    def test_trava_ocupada_e_trava_abandonada(self):
+        with trava_atualizacao() as obtida:
+            self.assertTrue(obtida)
+            self.assertEqual(self.atualizar(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20)), [])
+
+            # Um worker encerrado no meio da atualização não impede as próximas
+            antiga = time.time() - TEMPO_TRAVA_ABANDONADA - 1
+            os.utime(Path(self.diretorio.name) / "indices.json.lock", (antiga, antiga))
+            self.assertEqual(len(self.atualizar(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))), 2)
+
+    def test_trava_abandonada_assumida_por_um_unico_worker(self):
+        caminho = Path(self.diretorio.name) / "indices.json.lock"
+        caminho.write_text("worker encerrado")
+        antiga = time.time() - TEMPO_TRAVA_ABANDONADA - 1
+        os.utime(caminho, (antiga, antiga))
+
+        largada = threading.Barrier(16)
+        obtidas = []
+        def verificar_devagar(caminho):
+            # Todos os workers veem a trava antiga como abandonada antes que qualquer um a assuma
+            abandonada = _trava_abandonada(caminho)
+            time.sleep(0.05)
+            return abandonada
+
+        def assumir():
+            largada.wait()
+            with trava_atualizacao() as obtida:
+                obtidas.append(obtida)
+                time.sleep(0.3)  # Mantém a trava enquanto os demais tentam assumi-la
+
+        workers = [threading.Thread(target=assumir) for _ in range(16)]
+        with mock.patch("investimentos.indices._trava_abandonada", verificar_devagar):
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(obtidas.count(True), 1)
+        self.assertEqual(os.listdir(self.diretorio.name), [])  # Nenhuma trava ou trava renomeada esquecida
+
+    def test_curvas_acumuladas(self):
+        atualizar_indices(date(2023, 1, 1), date(2023, 6, 1), hoje=date(2024, 3, 20))
+        curva = carregar_curvas(["CDI"])["CDI"]
+
+        self.assertEqual(carregar_series()["CDI"]["acumulado"]["base"], "2022-12")
+        # Rentabilidade de fevereiro a abril: 3 meses de 1%
+        self.assertAlmostEqual(curva.rentabilidade([indice_mes(date(2023, 4, 1))], indice_mes(date(2023, 1, 1)))[0], (1.01 ** 3 - 1) * 100)
+        # Antes e depois da curva a variação é zero
+        seis_meses = round((1.01 ** 6 - 1) * 100, 6)
+        meses = [indice_mes(date(2022, 6, 1)), indice_mes(date(2023, 6, 1)), indice_mes(date(2024, 1, 1))]
+        self.assertEqual(curva.rentabilidade(meses, indice_mes(date(2022, 1, 1))).round(6).tolist(), [0, seis_meses, seis_meses])
+        # A curva é montada uma única vez enquanto o arquivo não muda
+        self.assertIs(carregar_curvas(["CDI"])["CDI"], curva)
+
+    def test_acumulado_com_meses_sem_valor(self):
+        acumulado = calcular_acumulado({"2023-03": 10.0, "2023-01": 10.0})
+        self.assertEqual(acumulado["base"], "2022-12")
+        self.assertEqual([round(fator, 6) for fator in acumulado["fatores"]], [1, 1.1, 1.1, 1.21])
+        curva = CurvaAcumulada.da_serie({"acumulado": acumulado})
+        self.assertAlmostEqual(curva.rentabilidade([indice_mes(date(2023, 3, 1))], indice_mes(date(2023, 1, 1)))[0], 10)
@@ -1,7 +1,10 @@
 from django.urls import path
 from .views import AtivoCreateView, AtivoListView, AtivoUpdateView, AtivoDeleteView, ImportarAtivosView
 from .views import OperacaoCreateView, OperacaoListView, OperacaoUpdateView, OperacaoDeleteView, ImportarOperacoesView
-from .views import ResumoView, ResumoAtivoView
+from .views import ResumoView, ResumoAtivoView, ExportarResumoView
+from .views import ImportacaoStatusView
+from .views import GraficoCarteiraView, GraficoAtivoView
+from .views import PerfilamentoView
 
 urlpatterns = [
     path('criar-ativo/', AtivoCreateView.as_view(), name='criar_ativo'),
@@ -15,7 +18,13 @@ urlpatterns = [
     path('editar-operacao/<int:pk>/', OperacaoUpdateView.as_view(), name='editar_operacao'),
     path('deletar-operacao/<int:pk>/', OperacaoDeleteView.as_view(), name='deletar_operacao'),
     path("importar-operacoes/", ImportarOperacoesView.as_view(), name="importar_operacoes"),
+    path("importacao/<int:pk>/", ImportacaoStatusView.as_view(), name="status_importacao"),
 
     path('', ResumoView.as_view(), name='resumo'),
     path('ativo/<int:pk>/', ResumoAtivoView.as_view(), name='resumo_ativo'),
+    path('exportar-csv/', ExportarResumoView.as_view(), name='exportar_resumo'),
+    path('graficos/carteira/<str:grafico>/', GraficoCarteiraView.as_view(), name='grafico_carteira'),
+    path('graficos/ativo/<int:pk>/<str:grafico>/', GraficoAtivoView.as_view(), name='grafico_ativo'),
+
+    path('perfilamento/', PerfilamentoView.as_view(), name='perfilamento'),
 ]
\ No newline at end of file
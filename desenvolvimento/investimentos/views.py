@@ -1,3 +1,6 @@
 from .views_ativos import *
 from .views_operacao import *
-from .views_resumo import *
\ No newline at end of file
+from .views_resumo import *
+from .views_importacao import *
+from .views_graficos import *
+from .views_perfilamento import *
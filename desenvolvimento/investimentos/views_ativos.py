@@ -1,18 +1,21 @@
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import Ativo, SUBCLASSES_POR_CLASSE
+from .models import Ativo, Importacao, SUBCLASSES_POR_CLASSE
 from .forms import AtivoForm, UploadCSVForm
 from django.contrib import messages
 from django.shortcuts import redirect
-import csv
-import io
+from .tarefas import agendar_importacao
+from .paginacao import PaginacaoKeysetMixin
 import json
 
-class AtivoListView(LoginRequiredMixin, ListView):
+class AtivoListView(LoginRequiredMixin, PaginacaoKeysetMixin, ListView):
     model = Ativo
     template_name = 'listar_ativos.html' 
     context_object_name = 'ativos'
+    ordenacoes = {"nome": "nome", "data": "data_aquisicao", "valor": "valor_inicial"}
+    ordem_padrao = "nome"
+    campo_data = "data_aquisicao"
 
     def get_queryset(self):
         # Mostra apenas operações do usuário logado
@@ -24,17 +27,17 @@ class AtivoListView(LoginRequiredMixin, ListView):
         # Aplica os filtros somente se houver valores preenchidos
         filtros = {f"{k}__icontains": v for k, v in self.request.GET.items() if v and k in filtros_validos}
         
-        return queryset.filter(**filtros)
+        return self.filtrar_periodo(queryset.filter(**filtros))
     
     def get_context_data(self, **kwargs):
         """ Adiciona as opções de filtro ao contexto """
         context = super().get_context_data(**kwargs)
-        usuario_ativos = Ativo.objects.filter(usuario=self.request.user)
 
-        # Obtém valores únicos de Classe, Subclasse e Banco
-        context['classes_disponiveis'] = usuario_ativos.values_list('classe', flat=True).distinct()
-        context['subclasses_disponiveis'] = usuario_ativos.values_list('subclasse', flat=True).distinct()
-        context['bancos_disponiveis'] = usuario_ativos.values_list('banco', flat=True).distinct()
+        # Opções dos filtros de Classe, Subclasse e Banco, com a quantidade de ativos de cada uma
+        facetas = Ativo.objects.facetas(self.request.user)
+        context["classes_disponiveis"] = facetas["classes"]
+        context["subclasses_disponiveis"] = facetas["subclasses"]
+        context["bancos_disponiveis"] = facetas["bancos"]
 
         return context
     
@@ -120,49 +123,9 @@ class ImportarAtivosView(LoginRequiredMixin, FormView):
             messages.error(self.request, "O arquivo deve estar no formato CSV.")
             return redirect("importar_ativos")
 
-        try:
-            # Lê e processa o CSV
-            decoded_file = csv_file.read().decode("utf-8")
-            reader = list(csv.DictReader(io.StringIO(decoded_file), delimiter=";"))  # Convertendo para lista
-
-            if not reader:
-                messages.error(self.request, "O arquivo CSV está vazio ou mal formatado.")
-                return redirect("importar_ativos")
-
-            ativos_importados = 0
-            for row in reader:
-                try:
-                    nome = row["Nome"]
-                    classe = row["Classe"]
-                    subclasse = row["Subclasse"]
-                    banco = row["Banco"]
-                    valor_inicial = float(row["Valor Inicial"].replace("R$", "").replace(",", ".").strip())
-                    data_aquisicao = row["Data de Aquisição"]
-
-                    # Criar o ativo no banco de dados
-                    Ativo.objects.create(
-                        usuario=self.request.user,
-                        nome=nome,
-                        classe=classe,
-                        subclasse=subclasse,
-                        banco=banco,
-                        valor_inicial=valor_inicial,
-                        data_aquisicao=data_aquisicao
-                    )
-                    ativos_importados += 1
-                except Exception as e:
-                    messages.error(self.request, f"Erro ao processar linha: {row}. Erro: {e}")
-
-            if ativos_importados > 0:
-                messages.success(self.request, f"{ativos_importados} ativos importados com sucesso!")
-            else:
-                messages.warning(self.request, "Nenhum ativo foi importado.")
-
-        except Exception as e:
-            messages.error(self.request, f"Erro ao processar o CSV: {e}")
-
-        # Consumir mensagens antes do redirecionamento
-        list(messages.get_messages(self.request))
+        # Guarda o arquivo e processa a importação em segundo plano
+        importacao = Importacao.objects.create(usuario=self.request.user, tipo=Importacao.ATIVOS, arquivo=csv_file)
+        agendar_importacao(importacao)
 
-        return super().form_valid(form)
+        return redirect("status_importacao", pk=importacao.pk)
 
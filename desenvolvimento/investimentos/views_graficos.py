@@ -0,0 +1,91 @@
+import hashlib
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.generic import View
+
+from .cache_carteira import versao_carteira
+from .indices import versao_indices
+from .models import Ativo, DadoFinanceiroMensal
+from .views_resumo_aux import (
+    aplicar_metricas, filtrar_ativos, filtros_do_resumo, grafico_composicao, grafico_evolucao,
+    grafico_rentabilidade_ativo, grafico_rentabilidade_carteira,
+)
+
+
+class GraficoView(LoginRequiredMixin, View):
+    """Dados de um gráfico em JSON, carregados pelas páginas depois do HTML.
+
+    O ETag combina a versão da carteira do usuário, a versão das séries de índices e a URL
+    (gráfico e filtros): enquanto nada disso muda, o navegador revalida o gráfico e recebe
+    um 304, sem que os dados sejam calculados."""
+
+    graficos = ()  # Gráficos disponíveis; cada um é montado pelo método dados_<gráfico>
+
+    def get_etag(self):
+        usuario_id = self.request.user.id
+        partes = [usuario_id, versao_carteira(usuario_id), versao_indices(), self.request.get_full_path()]
+        return quote_etag(hashlib.sha1(":".join(map(str, partes)).encode()).hexdigest())
+
+    def get(self, request, *args, grafico, **kwargs):
+        if grafico not in self.graficos:
+            raise Http404("Gráfico inexistente.")
+
+        etag = self.get_etag()
+        resposta = get_conditional_response(request, etag=etag)
+        if resposta is None:
+            resposta = JsonResponse(getattr(self, f"dados_{grafico}")(*args, **kwargs))
+        resposta["ETag"] = etag
+        patch_cache_control(resposta, private=True, no_cache=True)  # Sempre revalidado com o servidor
+        return resposta
+
+
+class GraficoCarteiraView(GraficoView):
+    """Gráficos do resumo da carteira, com os mesmos filtros da página."""
+
+    graficos = ("evolucao", "rentabilidade", "composicao")
+
+    def ativos(self):
+        return filtrar_ativos(Ativo.objects.filter(usuario=self.request.user), filtros_do_resumo(self.request.GET))
+
+    def carteira(self, ativo_ids):
+        return DadoFinanceiroMensal.objects.da_carteira(self.request.user).selecionar(ativo_ids)
+
+    def dados_evolucao(self):
+        carteira = self.carteira(self.ativos().values_list("id", flat=True))
+        valores, _, _ = carteira.evolucao()
+        return grafico_evolucao(carteira.meses, valores)
+
+    def dados_rentabilidade(self):
+        return grafico_rentabilidade_carteira(self.carteira(self.ativos().values_list("id", flat=True)))
+
+    def dados_composicao(self):
+        ativos = list(self.ativos())
+        aplicar_metricas(ativos, self.carteira(ativo.id for ativo in ativos))
+        return grafico_composicao(ativos)
+
+
+class GraficoAtivoView(GraficoView):
+    """Gráficos do resumo de um ativo do usuário."""
+
+    graficos = ("evolucao", "rentabilidade")
+
+    def get(self, request, *args, pk, **kwargs):
+        get_object_or_404(Ativo, pk=pk, usuario=request.user)
+        return super().get(request, *args, pk=pk, **kwargs)
+
+    def dados_evolucao(self, pk):
+        carteira = DadoFinanceiroMensal.objects.da_carteira(self.request.user)
+        if pk not in carteira:
+            return {"labels": [], "dados": []}
+        meses, valores, _, _, _ = carteira.historico_ativo(pk)
+        return grafico_evolucao(meses, valores)
+
+    def dados_rentabilidade(self, pk):
+        carteira = DadoFinanceiroMensal.objects.da_carteira(self.request.user)
+        if pk not in carteira:
+            return {"labels": [], "dados": [], "indices": []}
+        return grafico_rentabilidade_ativo(carteira, pk)
@@ -0,0 +1,21 @@
+from django.views.generic import DetailView
+from django.contrib.auth.mixins import LoginRequiredMixin
+from .models import Importacao
+
+class ImportacaoStatusView(LoginRequiredMixin, DetailView):
+    model = Importacao
+    template_name = "status_importacao.html"
+    context_object_name = "importacao"
+
+    def get_queryset(self):
+        """Garante que o usuário só acompanha as próprias importações"""
+        return Importacao.objects.filter(usuario=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Página de destino após a importação, conforme o tipo
+        if self.object.tipo == Importacao.ATIVOS:
+            context["url_lista"] = "listar_ativos"
+        else:
+            context["url_lista"] = "listar_operacoes"
+        return context
@@ -1,22 +1,25 @@
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import Ativo, Operacao
+from .models import Ativo, Operacao, Importacao
 from .forms import OperacaoForm, UploadCSVForm
 from django.contrib import messages
 from django.shortcuts import redirect
-import csv
-import io
-from datetime import datetime
+from .tarefas import agendar_importacao
+from .paginacao import PaginacaoKeysetMixin
 
-class OperacaoListView(LoginRequiredMixin, ListView):
+class OperacaoListView(LoginRequiredMixin, PaginacaoKeysetMixin, ListView):
     model = Operacao
     template_name = 'listar_operacoes.html'
     context_object_name = 'operacoes'
+    ordenacoes = {"data": "data", "valor": "valor", "tipo": "tipo"}
+    ordem_padrao = "-data"
+    campo_data = "data"
 
     def get_queryset(self):
         # Mostra apenas operações do usuário logado
-        queryset = Operacao.objects.filter(ativo__usuario=self.request.user)
+        queryset = Operacao.objects.filter(ativo__usuario=self.request.user).select_related("ativo")
+        queryset = self.filtrar_periodo(queryset)
 
         ativo_id = self.request.GET.get('ativo')
         tipo = self.request.GET.get('tipo')
@@ -46,21 +49,11 @@ class OperacaoListView(LoginRequiredMixin, ListView):
         """ Adiciona o TIPO_OPERACAO ao contexto do template """
         context = super().get_context_data(**kwargs)
         context['TIPO_OPERACAO'] = self.model.TIPO_OPERACAO
-        context["classes"] = (
-            Ativo.objects.filter(operacoes__usuario=self.request.user)
-            .values_list("classe", flat=True)
-            .distinct()
-        )
-        context["subclasses"] = (
-            Ativo.objects.filter(operacoes__usuario=self.request.user)
-            .values_list("subclasse", flat=True)
-            .distinct()
-        )
-        context["bancos"] = (
-            Ativo.objects.filter(operacoes__usuario=self.request.user)
-            .values_list("banco", flat=True)
-            .distinct()
-        )
+        # Opções dos filtros de Classe, Subclasse e Banco, com a quantidade de ativos de cada uma
+        facetas = Ativo.objects.facetas(self.request.user)
+        context["classes_disponiveis"] = facetas["classes"]
+        context["subclasses_disponiveis"] = facetas["subclasses"]
+        context["bancos_disponiveis"] = facetas["bancos"]
         return context
     
 import logging
@@ -123,51 +116,9 @@ class ImportarOperacoesView(LoginRequiredMixin, FormView):
             messages.error(self.request, "O arquivo deve estar no formato CSV.")
             return redirect("importar_operacoes")
 
-        try:
-            # Lê e processa o CSV
-            decoded_file = csv_file.read().decode("utf-8")
-            reader = list(csv.DictReader(io.StringIO(decoded_file), delimiter=";"))  # Convertendo para lista para depuração
-
-            if not reader:
-                messages.error(self.request, "O arquivo CSV está vazio ou mal formatado.")
-                return redirect("importar_operacoes")
-
-            linhas_importadas = 0
-            for row in reader:
-                try:
-                    ativo_nome = row["Ativo"]
-                    tipo = row["Tipo"]
-                    data = datetime.strptime(row["Data"], "%Y-%m-%d").date()
-                    valor = float(row["Valor"].replace("R$", "").replace(",", ".").strip())
-
-                    # Verifica se o ativo existe
-                    ativo = Ativo.objects.filter(nome=ativo_nome, usuario=self.request.user).first()
-                    if not ativo:
-                        messages.warning(self.request, f"Ativo '{ativo_nome}' não encontrado. Operação ignorada.")
-                        continue  # Pula esta linha se o ativo não for encontrado
-
-                    # Criar a operação no banco de dados
-                    Operacao.objects.create(
-                        usuario=self.request.user,
-                        ativo=ativo,
-                        tipo=tipo,
-                        data=data,
-                        valor=valor
-                    )
-                    linhas_importadas += 1  # Conta quantas operações foram importadas
-                except Exception as e:
-                    messages.error(self.request, f"Erro ao processar linha: {row}. Erro: {e}")
-
-            if linhas_importadas > 0:
-                messages.success(self.request, f"{linhas_importadas} operações importadas com sucesso!")
-            else:
-                messages.warning(self.request, "Nenhuma operação foi importada.")
-
-        except Exception as e:
-            messages.error(self.request, f"Erro ao processar o CSV: {e}")
-
-        # Consumir mensagens antes do redirecionamento
-        list(messages.get_messages(self.request))
-
-        return super().form_valid(form)
+        # Guarda o arquivo e processa a importação em segundo plano
+        importacao = Importacao.objects.create(usuario=self.request.user, tipo=Importacao.OPERACOES, arquivo=csv_file)
+        agendar_importacao(importacao)
+
+        return redirect("status_importacao", pk=importacao.pk)
 
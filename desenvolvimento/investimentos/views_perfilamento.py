@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.views.generic import TemplateView
+
+from .perfilamento import estatisticas_por_rota, requisicoes_registradas
+
+
+class PerfilamentoView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """Rotas e requisições mais lentas entre as últimas perfiladas neste processo. Apenas administradores."""
+
+    template_name = "perfilamento.html"
+    quantidade_mais_lentas = 20
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        perfis = requisicoes_registradas()
+        context["perfilamento_ativo"] = settings.PERFILAMENTO
+        context["quantidade_requisicoes"] = len(perfis)
+        context["rotas"] = estatisticas_por_rota(perfis)
+        context["mais_lentas"] = sorted(perfis, key=lambda perfil: perfil.total, reverse=True)[: self.quantidade_mais_lentas]
+        return context
@@ -47,6 +47,7 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    "investimentos.perfilamento.PerfilamentoMiddleware",  # Carregado apenas com PERFILAMENTO ligado
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -88,6 +89,34 @@ DATABASES = {
     }
 }
 
+# Perfilamento das requisições (tempo total, SQL, arquivo de índices, cache da carteira, buscas externas
+# e templates), enviado no cabeçalho Server-Timing e resumido em /perfilamento/ para administradores.
+# Guarda em memória as últimas PERFILAMENTO_HISTORICO requisições de cada processo
+PERFILAMENTO = config("PERFILAMENTO", default=False, cast=bool)
+PERFILAMENTO_HISTORICO = config("PERFILAMENTO_HISTORICO", default=1000, cast=int)
+
+# Cache dos dados da carteira e dos trechos renderizados das páginas de resumo. Em memória por padrão;
+# com vários processos (ex.: gunicorn com mais de um worker), definir CACHE_DIR para que todos
+# compartilhem o mesmo cache em arquivos e vejam as invalidações feitas pelos demais
+CACHE_DIR = config("CACHE_DIR", default="")
+
+if CACHE_DIR:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": CACHE_DIR,
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "sgpi",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -141,6 +170,29 @@ STATICFILES_DIRS = [
 # STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Diretório para arquivos estáticos coletados
 # MIDDLEWARE += ["whitenoise.middleware.WhiteNoiseMiddleware"]
 
+# Arquivos enviados pelos usuários (ex.: CSVs aguardando importação em segundo plano)
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Séries históricas de índices (CDI, IBOVESPA) já buscadas nas fontes externas
+INDICES_CACHE_FILE = os.path.join(BASE_DIR, 'indices_cache.json')
+
+# Índices de referência disponíveis para comparação nos gráficos: "nome" é o rótulo exibido e
+# "padrao" indica se o índice aparece marcado por padrão. Outras fontes possíveis:
+# {"fonte": "investimentos.indices.FonteCSV", "caminho": "<arquivo.csv>", "coluna_data": "Data",
+#  "coluna_valor": "Valor", "tipo": "preco"}  (ou "variacao", para taxas percentuais)
+# {"fonte": "investimentos.indices.FonteArquivo", "caminho": "<arquivo.json>", "serie": "CDI"}
+INDICES_FONTES = {
+    "CDI": {"fonte": "investimentos.indices.FonteSGS", "serie": 12, "nome": "CDI", "padrao": True},
+    "IBOVESPA": {"fonte": "investimentos.indices.FonteYahoo", "ticker": "^BVSP", "nome": "IBOVESPA", "padrao": True},
+    "SELIC": {"fonte": "investimentos.indices.FonteSGS", "serie": 11, "nome": "SELIC"},
+    "IPCA": {"fonte": "investimentos.indices.FonteSGS", "serie": 433, "nome": "IPCA"},
+    "IFIX": {"fonte": "investimentos.indices.FonteYahoo", "ticker": "IFIX.SA", "nome": "IFIX"},
+    "SP500": {"fonte": "investimentos.indices.FonteYahoo", "ticker": "^GSPC", "nome": "S&P 500"},
+}
+
+# Tempo máximo, em segundos, de cada busca de índices nas fontes externas
+INDICES_TEMPO_LIMITE = config("INDICES_TEMPO_LIMITE", default=10, cast=float)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
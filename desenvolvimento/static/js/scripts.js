@@ -1,75 +1,111 @@
 document.addEventListener("DOMContentLoaded", function () {
     /**
-     * Função para inicializar um gráfico de linha do Chart.js.
+     * Função para carregar os dados de um gráfico da URL indicada no atributo data-url do <canvas>.
+     * O navegador revalida a resposta com o ETag, de modo que um gráfico sem alterações custa um 304.
+     * @param {string} canvasId - ID do elemento <canvas> onde o gráfico será renderizado.
+     * @param {Function} montar - Função que recebe o <canvas> e os dados do gráfico e cria o gráfico.
+     */
+    function carregarGrafico(canvasId, montar) {
+        var canvas = document.getElementById(canvasId);
+        if (!canvas) return; // Evita erro caso o elemento não exista no template
+
+        fetch(canvas.dataset.url, { credentials: "same-origin" })
+            .then(function (resposta) { return resposta.json(); })
+            .then(function (grafico) { montar(canvas, grafico); });
+    }
+
+    /**
+     * Função para inicializar um gráfico de linha do Chart.js comparado aos índices de referência.
      * @param {string} canvasId - ID do elemento <canvas> onde o gráfico será renderizado.
      * @param {string} labelCarteira - Nome da primeira linha do gráfico (Rentabilidade da Carteira ou Ativo).
      */
     function inicializarGraficoLinha(canvasId, labelCarteira) {
-        var ctx = document.getElementById(canvasId);
-        if (!ctx) return; // Evita erro caso o elemento não exista no template
-
-        return new Chart(ctx.getContext("2d"), {
-            type: "line",
-            data: {
-                labels: labels,
-                datasets: [
-                    {
-                        label: labelCarteira,
-                        data: dataPerc,
-                        borderColor: "green",
-                        backgroundColor: "rgba(0, 128, 0, 0.1)",
-                        borderWidth: 2,
-                        fill: true,
-                        tension: 0.3
-                    },
-                    {
-                        label: "CDI Acumulado (%)",
-                        data: dataCdi,
-                        borderColor: "red",
-                        borderDash: [5, 5],
-                        backgroundColor: "rgba(255, 0, 0, 0.1)",
-                        borderWidth: 2,
-                        fill: false,
-                        tension: 0.3
+        carregarGrafico(canvasId, function (canvas, grafico) {
+            var chart = new Chart(canvas.getContext("2d"), {
+                type: "line",
+                data: {
+                    labels: grafico.labels,
+                    datasets: [
+                        {
+                            label: labelCarteira,
+                            data: grafico.dados,
+                            borderColor: "green",
+                            backgroundColor: "rgba(0, 128, 0, 0.1)",
+                            borderWidth: 2,
+                            fill: true,
+                            tension: 0.3
+                        },
+                        ...datasetsIndices(grafico.indices)
+                    ]
+                },
+                options: {
+                    responsive: true,
+                    scales: {
+                        x: { title: { display: true, text: "Mês" } },
+                        y: { title: { display: true, text: "Rentabilidade Acumulada (%)" }, beginAtZero: false }
                     }
-                ]
-            },
-            options: {
-                responsive: true,
-                scales: {
-                    x: { title: { display: true, text: "Mês" } },
-                    y: { title: { display: true, text: "Rentabilidade Acumulada (%)" }, beginAtZero: false }
                 }
-            }
+            });
+            conectarSeletorIndices(chart, grafico.indices);
         });
     }
 
+    // Cores das linhas dos índices de referência, na ordem em que aparecem no seletor
+    var coresIndices = ["red", "blue", "orange", "purple", "brown", "teal", "gray"];
+    var chaveSelecaoIndices = "indicesSelecionados";
+
     /**
-     * Função para alternar entre CDI e IBOVESPA no gráfico de rentabilidade.
+     * Função que retorna as chaves dos índices selecionados, salvas no navegador ou, na primeira visita, as marcadas por padrão.
+     */
+    function indicesSelecionados(indices) {
+        var salvos = localStorage.getItem(chaveSelecaoIndices);
+        if (salvos) return JSON.parse(salvos);
+        return indices.filter(function (indice) { return indice.padrao; }).map(function (indice) { return indice.chave; });
+    }
+
+    /**
+     * Função que monta uma linha do gráfico para cada índice de referência, ocultando as não selecionadas.
+     * @param {Array} indices - Séries dos índices de referência recebidas com o gráfico.
+     */
+    function datasetsIndices(indices) {
+        var selecionados = indicesSelecionados(indices);
+        return indices.map(function (indice, i) {
+            var cor = coresIndices[i % coresIndices.length];
+            return {
+                label: indice.nome + " Acumulado (%)",
+                data: indice.dados,
+                borderColor: cor,
+                borderDash: [5, 5],
+                backgroundColor: cor,
+                borderWidth: 2,
+                fill: false,
+                tension: 0.3,
+                hidden: selecionados.indexOf(indice.chave) === -1
+            };
+        });
+    }
+
+    /**
+     * Função para exibir ou ocultar os índices de referência conforme o seletor, salvando a escolha no navegador.
      * @param {Object} chart - Instância do Chart.js a ser atualizada.
+     * @param {Array} indices - Séries dos índices de referência exibidas no gráfico.
      */
-    function alternarIndice(chart) {
-        var toggle = document.getElementById("toggleIndice");
-        if (!toggle) return;
-    
-        toggle.addEventListener("change", function () {
-            var datasetIndex = 1; // Índice do conjunto de dados CDI/IBOVESPA
-    
-            if (this.checked) {
-                console.log("Alternando para IBOVESPA");
-                chart.data.datasets[datasetIndex].label = "IBOVESPA Acumulado (%)";
-                chart.data.datasets[datasetIndex].data = JSON.parse(JSON.stringify(dataIbov)); // Garantia de cópia correta
-                chart.data.datasets[datasetIndex].borderColor = "blue";
-                chart.data.datasets[datasetIndex].backgroundColor = "rgba(0, 0, 255, 0.1)";
-            } else {
-                console.log("Alternando para CDI");
-                chart.data.datasets[datasetIndex].label = "CDI Acumulado (%)";
-                chart.data.datasets[datasetIndex].data = JSON.parse(JSON.stringify(dataCdi)); // Garantia de cópia correta
-                chart.data.datasets[datasetIndex].borderColor = "red";
-                chart.data.datasets[datasetIndex].backgroundColor = "rgba(255, 0, 0, 0.1)";
-            }
-    
-            chart.update(); // Atualiza o gráfico após a mudança
+    function conectarSeletorIndices(chart, indices) {
+        var caixas = document.querySelectorAll(".seletor-indice");
+        var selecionados = indicesSelecionados(indices);
+
+        caixas.forEach(function (caixa) {
+            caixa.checked = selecionados.indexOf(caixa.value) !== -1;
+            caixa.addEventListener("change", function () {
+                var marcados = Array.from(caixas).filter(function (c) { return c.checked; }).map(function (c) { return c.value; });
+                localStorage.setItem(chaveSelecaoIndices, JSON.stringify(marcados));
+
+                // A primeira linha é a da carteira ou do ativo; as seguintes seguem a ordem de indices
+                indices.forEach(function (indice, i) {
+                    chart.data.datasets[i + 1].hidden = marcados.indexOf(indice.chave) === -1;
+                });
+                chart.update();
+            });
         });
     }
 
@@ -79,30 +115,29 @@ document.addEventListener("DOMContentLoaded", function () {
      * @param {string} label - Nome da linha do gráfico.
      */
     function inicializarGraficoEvolucao(canvasId, label) {
-        var ctx = document.getElementById(canvasId);
-        if (!ctx) return;
-
-        new Chart(ctx.getContext("2d"), {
-            type: "line",
-            data: {
-                labels: labels,
-                datasets: [{
-                    label: label,
-                    data: dataAbs,
-                    borderColor: "blue",
-                    backgroundColor: "rgba(0, 0, 255, 0.1)",
-                    borderWidth: 2,
-                    fill: true,
-                    tension: 0.3
-                }]
-            },
-            options: {
-                responsive: true,
-                scales: {
-                    x: { title: { display: true, text: "Mês" } },
-                    y: { title: { display: true, text: "Valor (R$)" }, beginAtZero: false }
+        carregarGrafico(canvasId, function (canvas, grafico) {
+            new Chart(canvas.getContext("2d"), {
+                type: "line",
+                data: {
+                    labels: grafico.labels,
+                    datasets: [{
+                        label: label,
+                        data: grafico.dados,
+                        borderColor: "blue",
+                        backgroundColor: "rgba(0, 0, 255, 0.1)",
+                        borderWidth: 2,
+                        fill: true,
+                        tension: 0.3
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    scales: {
+                        x: { title: { display: true, text: "Mês" } },
+                        y: { title: { display: true, text: "Valor (R$)" }, beginAtZero: false }
+                    }
                 }
-            }
+            });
         });
     }
 
@@ -135,42 +170,38 @@ document.addEventListener("DOMContentLoaded", function () {
      * Função para inicializar o gráfico de composição da carteira.
      */
     function inicializarGraficoComposicao() {
-        var ctx = document.getElementById("graficoComposicaoCarteira");
-        if (!ctx) return;
-
-        new Chart(ctx.getContext("2d"), {
-            type: "pie",
-            data: {
-                labels: labelsSubclasse,
-                datasets: [{
-                    data: dataSubclasse,
-                    backgroundColor: [
-                        "rgba(255, 99, 132, 0.6)",
-                        "rgba(54, 162, 235, 0.6)",
-                        "rgba(255, 206, 86, 0.6)",
-                        "rgba(75, 192, 192, 0.6)",
-                        "rgba(153, 102, 255, 0.6)",
-                        "rgba(255, 159, 64, 0.6)"
-                    ],
-                    borderWidth: 1
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {
-                    legend: { position: "bottom" }
+        carregarGrafico("graficoComposicaoCarteira", function (canvas, grafico) {
+            new Chart(canvas.getContext("2d"), {
+                type: "pie",
+                data: {
+                    labels: grafico.labels,
+                    datasets: [{
+                        data: grafico.dados,
+                        backgroundColor: [
+                            "rgba(255, 99, 132, 0.6)",
+                            "rgba(54, 162, 235, 0.6)",
+                            "rgba(255, 206, 86, 0.6)",
+                            "rgba(75, 192, 192, 0.6)",
+                            "rgba(153, 102, 255, 0.6)",
+                            "rgba(255, 159, 64, 0.6)"
+                        ],
+                        borderWidth: 1
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    plugins: {
+                        legend: { position: "bottom" }
+                    }
                 }
-            }
+            });
         });
     }
 
     // Inicialização dos gráficos e funcionalidades para diferentes templates
-    var chartRentabilidadeAtivo = inicializarGraficoLinha("graficoRentabilidadePerc", "Rentabilidade Percentual Acumulada do Ativo (%)");
-    var chartRentabilidadeCarteira = inicializarGraficoLinha("graficoRentabilidadePercCarteira", "Rentabilidade Percentual Acumulada da Carteira (%)");
-
-    if (chartRentabilidadeAtivo) alternarIndice(chartRentabilidadeAtivo);
-    if (chartRentabilidadeCarteira) alternarIndice(chartRentabilidadeCarteira);
+    inicializarGraficoLinha("graficoRentabilidadePerc", "Rentabilidade Percentual Acumulada do Ativo (%)");
+    inicializarGraficoLinha("graficoRentabilidadePercCarteira", "Rentabilidade Percentual Acumulada da Carteira (%)");
 
     inicializarGraficoEvolucao("graficoRentabilidadeAbs", "Evolução do Valor do Ativo (R$)");
     inicializarGraficoEvolucao("graficoRentabilidadeAbsCarteira", "Evolução do Patrimônio da Carteira (R$)");